@@ -0,0 +1,125 @@
+import time
+import statistics
+import threading
+from mpv_ipc import MpvError
+
+AUTO_FORMAT = "auto" # Значение ytdl_format в конфиге для режима "Авто"
+# Ступени качества сверху вниз: потолок битрейта в кбит/с (None — без ограничений)
+TIERS = [None, 160, 128, 96, 64, 48]
+TOP_KBPS = 256 # Сколько закладываем на "bestaudio" при оценке канала
+
+SAMPLE_INTERVAL = 2.0   # Как часто читаем cache-speed и demuxer-cache-duration во время игры
+SAFETY_FACTOR = 1.5     # Канал должен тянуть текущую ступень с таким запасом, иначе спускаемся
+UPGRADE_FACTOR = 3.0    # Подниматься только если канал тянет следующую ступень с таким запасом
+UPGRADE_TRACKS = 2      # ... и столько треков подряд прошли без просадок
+DROP_COOLDOWN = 300     # После спуска столько секунд не поднимаемся обратно
+LOW_BUFFER = 3.0        # Меньше стольких секунд в буфере два замера подряд — спускаемся, не дожидаясь заикания
+
+def tier_format(tier):
+    cap = TIERS[tier]
+    # Если на ролике нет дорожки под потолок — берем самую легкую, а не падаем с ошибкой
+    return "bestaudio" if cap is None else f"bestaudio[abr<={cap}]/worstaudio"
+
+def tier_kbps(tier):
+    return TIERS[tier] or TOP_KBPS
+
+def resolve_format(ytdl_format):
+    """Что отдавать mpv в --ytdl-format: для "auto" — верхняя ступень, дальше ведет контроллер"""
+    return tier_format(0) if ytdl_format == AUTO_FORMAT else ytdl_format
+
+class QualityController:
+    """Режим "Авто": выбирает формат для следующих треков по замерам канала и буфера.
+
+    Просадка (paused-for-cache) или пустеющий буфер сразу опускают ступень, текущий трек
+    доигрывает как есть. Подъем — осторожно: по итогам трека, с запасом и после паузы.
+    """
+
+    def __init__(self, resolver, start_tier=0):
+        self.resolver = resolver
+        self.tier = start_tier
+        self.client = None
+        self._lock = threading.Lock()
+        self._samples = []
+        self._low_samples = 0
+        self._clean_tracks = 0
+        self._track_stalled = False
+        self._dropped_at = 0.0
+        self._playing = threading.Event()
+
+    def attach(self, client):
+        self.client = client
+        client.on_event("start-file", self._on_start_file)
+        client.observe("paused-for-cache", self._on_paused_for_cache)
+        client.observe("core-idle", self._on_core_idle)
+        threading.Thread(target=self._sample_loop, daemon=True).start()
+        return self
+
+    def set_tier(self, tier):
+        tier = max(0, min(tier, len(TIERS) - 1))
+        with self._lock:
+            if tier == self.tier:
+                return
+            if tier > self.tier:
+                self._dropped_at = time.monotonic()
+            self.tier = tier
+            self._clean_tracks = 0
+        fmt = tier_format(tier)
+        self.resolver.set_format(fmt) # Уже разрезолвленные ссылки старого формата выкидываются
+        try:
+            self.client.set_property("ytdl-format", fmt)
+            self.resolver.prefetch_upcoming()
+        except MpvError:
+            pass
+
+    def _on_paused_for_cache(self, _name, stalled):
+        if stalled:
+            with self._lock: # _on_start_file забирает и сбрасывает флаг под этим же замком
+                self._track_stalled = True
+                tier = self.tier
+            self.set_tier(tier + 1)
+
+    def _on_core_idle(self, _name, idle):
+        if idle: self._playing.clear()
+        else: self._playing.set()
+
+    def _on_start_file(self, _event):
+        # Итоги прошлого трека: хватает ли канала на текущую ступень и на следующую сверху
+        with self._lock:
+            samples, self._samples = self._samples, []
+            stalled, self._track_stalled = self._track_stalled, False
+            self._low_samples = 0
+            if not stalled:
+                self._clean_tracks += 1
+            clean, tier, dropped_at = self._clean_tracks, self.tier, self._dropped_at
+        if not samples or stalled:
+            return
+        kbps = statistics.median(samples) * 8 / 1000
+        if kbps < tier_kbps(tier) * SAFETY_FACTOR:
+            self.set_tier(tier + 1)
+        elif (tier > 0 and clean >= UPGRADE_TRACKS
+              and time.monotonic() - dropped_at > DROP_COOLDOWN
+              and kbps > tier_kbps(tier - 1) * UPGRADE_FACTOR):
+            self.set_tier(tier - 1)
+
+    def _sample_loop(self):
+        while True:
+            self._playing.wait()
+            time.sleep(SAMPLE_INTERVAL)
+            if not self.client.connected.is_set():
+                self._playing.clear()
+                continue
+            # cache-speed ненулевой, только пока поток реально качается — нули не считаем
+            speed = self.client.get_property("cache-speed")
+            buffered = self.client.get_property("demuxer-cache-duration")
+            idle = self.client.get_property("demuxer-cache-idle")
+            with self._lock:
+                if speed:
+                    self._samples.append(speed)
+                low = buffered is not None and buffered < LOW_BUFFER and not idle
+                self._low_samples = self._low_samples + 1 if low else 0
+                drop = self._low_samples >= 2
+                if drop:
+                    self._low_samples = 0
+                tier = self.tier
+            if drop:
+                self.set_tier(tier + 1)
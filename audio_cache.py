@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import threading
+from mpv_ipc import MpvError
+from playlist_cache import video_id_from_url
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(ROOT_DIR, "cache", "audio")
+DEFAULT_BUDGET_MB = 2048
+AUDIO_EXT = ".mkv" # dump-cache пишет как --stream-record, mkv принимает и opus, и aac
+
+def enforce_budget(root, max_bytes, keep=()):
+    """LRU-чистка каталога: удаляем самые давно использованные файлы, пока не влезем в бюджет.
+    Файлы с одинаковым именем без расширения (трек + его .json) живут и умирают вместе."""
+    groups = {}
+    for dirpath, _dirs, files in os.walk(root):
+        for name in files:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stem = os.path.splitext(path)[0]
+            g = groups.setdefault(stem, [0, 0.0, []])
+            g[0] += st.st_size
+            g[1] = max(g[1], st.st_mtime)
+            g[2].append(path)
+    total = sum(g[0] for g in groups.values())
+    for stem, (size, _mtime, paths) in sorted(groups.items(), key=lambda kv: kv[1][1]):
+        if total <= max_bytes:
+            break
+        if os.path.basename(stem) in keep:
+            continue
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
+    return total
+
+class AudioCache:
+    """Локальное хранилище уже проигранных треков, по файлу на video ID"""
+
+    def __init__(self, cache_dir=CACHE_DIR, budget_mb=DEFAULT_BUDGET_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(budget_mb) * 1024 * 1024
+        self.client = None
+        self._current = None
+        self._lock = threading.Lock()
+
+    def _base(self, video_id):
+        # Раскладываем по подкаталогам, чтобы не держать тысячи файлов в одном
+        return os.path.join(self.cache_dir, video_id[:2], video_id)
+
+    def lookup(self, video_id):
+        """(путь к файлу, метаданные) или None. Попадание освежает запись для LRU."""
+        base = self._base(video_id)
+        path = base + AUDIO_EXT
+        if not os.path.isfile(path):
+            return None
+        meta = {}
+        try:
+            with open(base + ".json", 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            pass
+        now = time.time()
+        for p in (path, base + ".json"):
+            try:
+                os.utime(p, (now, now))
+            except OSError:
+                pass
+        return path, meta
+
+    def contains(self, video_id):
+        return os.path.isfile(self._base(video_id) + AUDIO_EXT)
+
+    # --- Сохранение из кэша mpv ---
+
+    def attach(self, client):
+        self.client = client
+        client.on_event("file-loaded", self._on_file_loaded)
+        client.observe("demuxer-cache-idle", self._on_cache_idle)
+        return self
+
+    def _on_file_loaded(self, _event):
+        path = self.client.get_property("path", "")
+        vid = video_id_from_url(path)
+        self._current = vid if vid and not self.contains(vid) else None
+
+    def _on_cache_idle(self, _name, idle):
+        # Демуксер докачал поток до конца — сохраняем то, что mpv уже скачал, без повторной загрузки
+        vid = self._current
+        if not idle or not vid:
+            return
+        state = self.client.get_property("demuxer-cache-state") or {}
+        ranges = state.get("seekable-ranges") or []
+        if not (state.get("bof-cached") and state.get("eof-cached") and len(ranges) == 1):
+            return # В кэше дырки (перемотка) — целиком трек не сохранить
+        self._current = None
+        threading.Thread(target=self._save, args=(vid,), daemon=True).start()
+
+    def _playing(self, video_id):
+        return video_id_from_url(self.client.get_property("path", "") or "") == video_id
+
+    def _save(self, video_id):
+        with self._lock:
+            base = self._base(video_id)
+            os.makedirs(os.path.dirname(base), exist_ok=True)
+            part = base + ".part" + AUDIO_EXT
+            try:
+                # Пока поток ждал замка, mpv мог перейти к другому треку — тогда в кэше уже не этот
+                if not self._playing(video_id):
+                    return
+                title = self.client.get_property("media-title", "")
+                self.client.command("dump-cache", 0, "no", part, timeout=120)
+                if os.path.getsize(part) == 0:
+                    raise OSError("empty dump")
+                if not self._playing(video_id):
+                    raise OSError("track changed during dump")
+                with open(base + ".json", 'w') as f:
+                    json.dump({"title": title, "saved_at": time.time()}, f, ensure_ascii=False)
+                os.replace(part, base + AUDIO_EXT)
+            except (MpvError, OSError):
+                try:
+                    os.remove(part)
+                except OSError:
+                    pass
+                return
+            enforce_budget(self.cache_dir, self.max_bytes, keep={video_id})
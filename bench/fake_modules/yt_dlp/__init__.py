@@ -0,0 +1,12 @@
+"""Поддельный модуль yt_dlp для бенчмарка: те же задержки, что и у fake_tools.py, без сети"""
+import time
+from fake_tools import LATENCY, log_event, video_info
+
+class YoutubeDL:
+    def __init__(self, params=None):
+        self.params = params or {}
+
+    def extract_info(self, url, download=False, process=True):
+        time.sleep(LATENCY["ytdl_video"])
+        log_event("ytdl_video", url=url, module=True)
+        return video_info(url)
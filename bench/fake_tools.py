@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""Поддельные mpv / yt-dlp / tmux / cava / socat / notify-send для бенчмарка.
+
+Один скрипт, роль определяется по имени, под которым он запущен (симлинки в bin/).
+Настройка через окружение:
+  FAKE_BENCH_DIR      — каталог состояния, туда же пишется events.jsonl
+  FAKE_LATENCY        — JSON с задержками в секундах (ключи см. DEFAULT_LATENCY)
+  FAKE_PLAYLIST_SIZE  — сколько записей в поддельном плейлисте
+  FAKE_TRACKS         — сколько треков mpv проигрывает перед выходом
+"""
+import os
+import sys
+import json
+import time
+import shlex
+import signal
+import socket
+import threading
+import subprocess
+
+DEFAULT_LATENCY = {
+    "proc": 0.05,              # Старт любого процесса
+    "tmux": 0.02,              # Одна команда tmux
+    "cava": 0.05,
+    "mpv_start": 0.15,         # От запуска mpv до готового IPC сокета
+    "ytdl_proc": 0.4,          # Старт интерпретатора yt-dlp
+    "ytdl_entry": 0.002,       # Плоское извлечение: на каждую запись плейлиста
+    "ytdl_page": 0.3,          # Плоское извлечение: на каждую страницу из 100 записей
+    "ytdl_video": 0.8,         # Резолв одного видео
+    "stream_open": 0.1,        # Открытие прямой ссылки и первый звук
+    "track_len": 0.3,          # Сколько "играет" трек
+}
+
+BENCH_DIR = os.environ.get("FAKE_BENCH_DIR", "/tmp/playlist-bench")
+LATENCY = dict(DEFAULT_LATENCY, **json.loads(os.environ.get("FAKE_LATENCY", "{}")))
+PLAYLIST_SIZE = int(os.environ.get("FAKE_PLAYLIST_SIZE", "50"))
+TRACKS = int(os.environ.get("FAKE_TRACKS", "4"))
+PAGE = 100
+
+def log_event(name, **data):
+    data.update(event=name, t=time.time(), pid=os.getpid())
+    with open(os.path.join(BENCH_DIR, "events.jsonl"), 'a') as f:
+        f.write(json.dumps(data) + "\n")
+
+def fake_id(i):
+    return f"vid{i:08d}"
+
+# --- yt-dlp ---
+
+def opt_value(argv, name, default=None):
+    return argv[argv.index(name) + 1] if name in argv else default
+
+def run_ytdlp(argv):
+    time.sleep(LATENCY["ytdl_proc"])
+    url = argv[-1]
+    if "--flat-playlist" in argv:
+        start = int(opt_value(argv, "--playlist-start", 1))
+        end = min(int(opt_value(argv, "--playlist-end", PLAYLIST_SIZE)), PLAYLIST_SIZE)
+        entries = [{"id": fake_id(i), "title": f"Track {i}", "duration": 180, "uploader": "Bench"}
+                   for i in range(start - 1, end)]
+        if "-j" in argv:
+            # Построчный вывод: записи появляются постранично
+            for i, e in enumerate(entries):
+                if i % PAGE == 0:
+                    time.sleep(LATENCY["ytdl_page"])
+                print(json.dumps(e), flush=True)
+            log_event("ytdl_playlist", entries=len(entries))
+            return 0
+        time.sleep(LATENCY["ytdl_page"] * (len(entries) // PAGE + 1) + LATENCY["ytdl_entry"] * len(entries))
+        log_event("ytdl_playlist", entries=len(entries))
+        print(json.dumps({"title": "Bench playlist", "playlist_count": PLAYLIST_SIZE, "entries": entries}))
+        return 0
+    time.sleep(LATENCY["ytdl_video"])
+    log_event("ytdl_video", url=url)
+    print(json.dumps(video_info(url)))
+    return 0
+
+def video_info(url):
+    vid = url.rsplit("=", 1)[-1]
+    return {"id": vid, "title": f"Title {vid}", "ext": "webm",
+            "url": f"https://rr1.googlevideo.com/videoplayback?expire={int(time.time()) + 21600}&id={vid}",
+            "http_headers": {"User-Agent": "bench"}}
+
+# --- mpv ---
+
+class FakeMpv:
+    def __init__(self, argv):
+        self.socket_path = None
+        self.fmt = "bestaudio"
+        self.playlist = []
+        self.idle = False
+        target = None
+        for arg in argv:
+            if arg.startswith("--input-ipc-server="): self.socket_path = arg.split("=", 1)[1]
+            elif arg.startswith("--ytdl-format="): self.fmt = arg.split("=", 1)[1]
+            elif arg in ("--idle", "--idle=yes", "--idle=once"): self.idle = True
+            elif not arg.startswith("-"): target = arg
+        self.target = target
+        self.props = {"playlist-pos": -1, "playlist-count": 0, "media-title": "", "volume": 70,
+                      "pause": False, "time-pos": 0.0, "paused-for-cache": False, "idle-active": False}
+        self.clients = []
+        self.hooks = []        # (conn, id, priority)
+        self.acks = {}
+        self.next_hook = 1
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        self.quit = False
+
+    def load_target(self):
+        if not self.target:
+            return
+        if self.target.endswith(".m3u"):
+            with open(self.target, 'r') as f:
+                self.playlist = [l.strip() for l in f if l.strip() and not l.startswith("#")]
+        elif "list=" in self.target:
+            # Как ytdl_hook: плоское извлечение всего плейлиста отдельным процессом
+            out = subprocess.run(["yt-dlp", "--flat-playlist", "-J", self.target], capture_output=True, text=True).stdout
+            self.playlist = [f"https://www.youtube.com/watch?v={e['id']}" for e in json.loads(out)["entries"]]
+        else:
+            self.playlist = [self.target]
+
+    def set_prop(self, name, value):
+        self.props[name] = value
+        for conn, observed in list(self.clients):
+            for oid, prop in observed.items():
+                if prop == name:
+                    self.send(conn, {"event": "property-change", "id": oid, "name": name, "data": value})
+
+    def send(self, conn, msg):
+        try:
+            conn.sendall((json.dumps(msg) + "\n").encode())
+        except OSError:
+            pass
+
+    def broadcast(self, msg):
+        for conn, _ in list(self.clients):
+            self.send(conn, msg)
+
+    def get(self, name):
+        if name.startswith("playlist/") and name.endswith("/filename"):
+            i = int(name.split("/")[1])
+            return self.playlist[i] if 0 <= i < len(self.playlist) else None
+        if name == "playlist":
+            return [{"filename": f} for f in self.playlist]
+        return self.props.get(name)
+
+    def handle(self, conn, observed, msg):
+        cmd = msg.get("command") or []
+        rid = msg.get("request_id", 0)
+        reply = {"error": "success", "request_id": rid}
+        name = cmd[0] if cmd else ""
+        if name == "get_property":
+            value = self.get(cmd[1])
+            if value is None:
+                reply["error"] = "property unavailable"
+            reply["data"] = value
+        elif name == "set_property":
+            self.set_prop(cmd[1], cmd[2])
+        elif name == "observe_property":
+            observed[cmd[1]] = cmd[2]
+            self.send(conn, reply)
+            self.send(conn, {"event": "property-change", "id": cmd[1], "name": cmd[2], "data": self.get(cmd[2])})
+            return
+        elif name == "hook-add":
+            with self.lock:
+                self.hooks.append((conn, cmd[2], cmd[3] if len(cmd) > 3 else 0))
+                self.hooks.sort(key=lambda h: h[2])
+        elif name == "hook-ack":
+            with self.lock:
+                self.acks[cmd[1]] = True
+                self.wake.notify_all()
+        elif name == "loadfile":
+            mode = cmd[2] if len(cmd) > 2 else "replace"
+            with self.lock:
+                if mode == "replace":
+                    self.playlist = [cmd[1]]
+                    self.props["playlist-pos"] = -1
+                else:
+                    self.playlist.append(cmd[1])
+                self.props["playlist-count"] = len(self.playlist)
+                self.wake.notify_all()
+        elif name == "playlist-remove":
+            with self.lock:
+                i = self.props["playlist-pos"] if cmd[1] == "current" else int(cmd[1])
+                if 0 <= i < len(self.playlist):
+                    self.playlist.pop(i)
+                    if i < self.props["playlist-pos"]:
+                        self.props["playlist-pos"] -= 1
+                self.props["playlist-count"] = len(self.playlist)
+        elif name == "quit":
+            self.quit = True
+        self.send(conn, reply)
+
+    def serve(self, conn):
+        observed = {}
+        entry = (conn, observed)
+        self.clients.append(entry)
+        buf = b""
+        try:
+            while True:
+                chunk = conn.recv(65536)
+                if not chunk:
+                    break
+                buf += chunk
+                while b"\n" in buf:
+                    line, buf = buf.split(b"\n", 1)
+                    if line.strip():
+                        self.handle(conn, observed, json.loads(line))
+        except OSError:
+            pass
+        self.clients.remove(entry)
+
+    def accept_loop(self, server):
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def run_hooks(self):
+        for conn, hid, _prio in list(self.hooks):
+            with self.lock:
+                hook_id = self.next_hook
+                self.next_hook += 1
+            self.send(conn, {"event": "hook", "id": hid, "hook_id": hook_id})
+            with self.lock:
+                self.wake.wait_for(lambda: hook_id in self.acks, timeout=5)
+
+    def play(self, index):
+        url = self.playlist[index]
+        self.set_prop("playlist-pos", index)
+        self.props["stream-open-filename"] = url
+        self.props["path"] = url
+        self.broadcast({"event": "start-file", "playlist_entry_id": index + 1})
+        t0 = time.time()
+        self.run_hooks()
+        opened = self.props["stream-open-filename"]
+        if "watch?v=" in opened:
+            # Ссылку никто не подготовил — ytdl_hook запускает yt-dlp
+            out = subprocess.run(["yt-dlp", "-J", "-f", self.fmt, opened], capture_output=True, text=True).stdout
+            self.set_prop("media-title", json.loads(out)["title"])
+        elif self.props.get("file-local-options/force-media-title"):
+            self.set_prop("media-title", self.props["file-local-options/force-media-title"])
+        time.sleep(LATENCY["stream_open"])
+        self.broadcast({"event": "file-loaded"})
+        log_event("audio", index=index, url=url, load=time.time() - t0)
+        time.sleep(LATENCY["track_len"])
+        self.set_prop("time-pos", LATENCY["track_len"])
+        self.broadcast({"event": "end-file", "reason": "eof"})
+        log_event("end_file", index=index)
+
+    def run(self):
+        log_event("mpv_start", target=self.target)
+        time.sleep(LATENCY["mpv_start"])
+        if self.socket_path:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(self.socket_path)
+            server.listen(16)
+            threading.Thread(target=self.accept_loop, args=(server,), daemon=True).start()
+        self.load_target()
+        self.props["playlist-count"] = len(self.playlist)
+        played = 0
+        index = 0
+        while played < TRACKS and not self.quit:
+            with self.lock:
+                if index >= len(self.playlist):
+                    if not self.idle:
+                        break
+                    # --idle: ждем, пока кто-нибудь докинет треки через IPC
+                    if not self.wake.wait_for(lambda: index < len(self.playlist) or self.quit, timeout=30):
+                        break
+                    if self.quit:
+                        break
+            self.play(index)
+            played += 1
+            index = self.props["playlist-pos"] + 1
+        log_event("mpv_exit", played=played)
+        if self.socket_path and os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        return 0
+
+# --- tmux ---
+
+TMUX_VALUE_FLAGS = {"-s", "-t", "-p", "-n", "-c", "-l", "-x", "-y", "-F", "-e"}
+
+def tmux_registry(session):
+    return os.path.join(BENCH_DIR, f"tmux-{session}.pids")
+
+def tmux_pids(session):
+    try:
+        with open(tmux_registry(session), 'r') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+def alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z" # Зомби уже не считаем
+    except (OSError, IndexError):
+        return False
+
+def split_command(args):
+    opts, positional, i = {}, [], 0
+    while i < len(args):
+        if args[i] in TMUX_VALUE_FLAGS and i + 1 < len(args):
+            opts[args[i]] = args[i + 1]
+            i += 2
+        elif args[i].startswith("-") and not positional:
+            opts[args[i]] = True
+            i += 1
+        else:
+            positional.append(args[i])
+            i += 1
+    return opts, " ".join(positional)
+
+def run_tmux(argv):
+    commands, current = [], []
+    for arg in argv:
+        if arg == ";":
+            commands.append(current)
+            current = []
+        else:
+            current.append(arg)
+    commands.append(current)
+    session = "default"
+    status = 0
+    for cmd in commands:
+        if not cmd:
+            continue
+        time.sleep(LATENCY["tmux"])
+        name, (opts, shell_cmd) = cmd[0], split_command(cmd[1:])
+        session = str(opts.get("-s") or opts.get("-t") or session).split(":")[0]
+        if name in ("new-session", "split-window", "respawn-pane", "new-window"):
+            if name == "new-session" and any(alive(p) for p in tmux_pids(session)):
+                print(f"duplicate session: {session}", file=sys.stderr)
+                return 1
+            if shell_cmd:
+                p = subprocess.Popen(["sh", "-c", shell_cmd], start_new_session=True)
+                with open(tmux_registry(session), 'a') as f:
+                    f.write(f"{p.pid}\n")
+            log_event("tmux_" + name, session=session, cmd=shell_cmd)
+        elif name == "kill-session":
+            pids = [p for p in tmux_pids(session) if alive(p)]
+            for pid in pids:
+                try:
+                    os.killpg(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+            if os.path.exists(tmux_registry(session)):
+                os.unlink(tmux_registry(session))
+            status = 0 if pids else 1
+        elif name == "has-session":
+            status = 0 if any(alive(p) for p in tmux_pids(session)) else 1
+        elif name in ("attach-session", "attach"):
+            log_event("tmux_attach", session=session)
+            # Отсоединение в бенчмарке = выход mpv: ждем, пока завершатся все панели, кроме визуализатора
+            while True:
+                live = [p for p in tmux_pids(session) if alive(p) and "cava" not in cmdline(p)]
+                if not live:
+                    break
+                time.sleep(0.02)
+            for pid in tmux_pids(session):
+                try:
+                    os.killpg(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+    return status
+
+def cmdline(pid):
+    try:
+        with open(f"/proc/{pid}/cmdline", 'rb') as f:
+            return f.read().replace(b"\0", b" ").decode(errors="replace")
+    except OSError:
+        return ""
+
+def main():
+    role = os.path.basename(sys.argv[0])
+    argv = sys.argv[1:]
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    time.sleep(LATENCY["proc"])
+    if role == "yt-dlp":
+        return run_ytdlp(argv)
+    if role == "mpv":
+        return FakeMpv(argv).run()
+    if role == "tmux":
+        return run_tmux(argv)
+    if role == "cava":
+        time.sleep(LATENCY["cava"])
+        log_event("cava_start")
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        while True:
+            time.sleep(1)
+    log_event(role, argv=shlex.join(argv))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
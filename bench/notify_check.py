@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Проверка notifier.Notifier через jeepney на своей dbus-daemon, не трогая сессионную шину.
+
+Поднимает временную dbus-daemon, на ней — поддельный org.freedesktop.Notifications,
+который запоминает вызовы Notify и отвечает растущими ID. Проверяем:
+  - пачка show() быстрее debounce дает одно уведомление, с последним треком;
+  - следующее уведомление заменяет предыдущее (replaces_id = ID из ответа);
+  - обложка уходит в hints как image-path.
+Нужны dbus-daemon и jeepney; без них проверка пропускается.
+
+  python3 bench/notify_check.py
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+import notifier
+
+BUS_CONFIG = """<!DOCTYPE busconfig PUBLIC "-//freedesktop//DTD D-Bus Bus Configuration 1.0//EN"
+ "http://www.freedesktop.org/standards/dbus/1.0/busconfig.dtd">
+<busconfig>
+  <type>session</type>
+  <listen>unix:dir={dir}</listen>
+  <auth>EXTERNAL</auth>
+  <policy context="default"><allow send_destination="*"/><allow receive_sender="*"/><allow own="*"/></policy>
+</busconfig>
+"""
+
+class FakeNotifications:
+    """Владеет org.freedesktop.Notifications на шине и записывает аргументы каждого Notify"""
+
+    def __init__(self, address):
+        from jeepney.io.blocking import open_dbus_connection
+        from jeepney.bus_messages import message_bus
+        self.conn = open_dbus_connection(bus=address)
+        self.conn.send_and_get_reply(message_bus.RequestName("org.freedesktop.Notifications"), timeout=5)
+        self.calls = []
+        self.next_id = 41
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        from jeepney import MessageType, HeaderFields, new_method_return
+        while True:
+            try:
+                msg = self.conn.receive()
+            except Exception:
+                return
+            if msg.header.message_type != MessageType.method_call or msg.header.fields.get(HeaderFields.member) != "Notify":
+                continue
+            self.calls.append(msg.body)
+            self.conn.send(new_method_return(msg, "u", (self.next_id,)))
+            self.next_id += 1
+
+class Thumbs:
+    def get(self, video_id):
+        return f"/tmp/{video_id}.jpg" if video_id else None
+
+def wait_calls(fake, n, timeout=5):
+    deadline = time.monotonic() + timeout
+    while len(fake.calls) < n and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.3) # Лишних вызовов тоже не должно прийти
+    return fake.calls
+
+def check(name, ok, detail):
+    print(("ok   " if ok else "FAIL ") + name)
+    if not ok:
+        print("     ", detail)
+    return ok
+
+def main():
+    if not notifier.open_dbus_connection or not shutil.which("dbus-daemon"):
+        print("skip: jeepney or dbus-daemon not available")
+        return
+    work = tempfile.mkdtemp(prefix="notify_check_")
+    conf = os.path.join(work, "bus.conf")
+    with open(conf, 'w') as f:
+        f.write(BUS_CONFIG.format(dir=work))
+    daemon = subprocess.Popen(["dbus-daemon", "--nofork", "--print-address", f"--config-file={conf}"],
+                              stdout=subprocess.PIPE, text=True)
+    results = []
+    try:
+        address = daemon.stdout.readline().strip()
+        fake = FakeNotifications(address)
+        n = notifier.Notifier(bus=address, thumbs=Thumbs(), debounce=0.3)
+
+        for i in range(3):
+            n.show(f"Track {i}", "Channel", f"vid{i}")
+            time.sleep(0.05)
+        calls = wait_calls(fake, 1)
+        results.append(check("debounce: one Notify for a burst", len(calls) == 1 and calls[0][3] == "Track 2", calls))
+        results.append(check("image-path hint", calls and calls[0][6].get("image-path") == ("s", "/tmp/vid2.jpg"), calls))
+        results.append(check("first Notify replaces nothing", calls and calls[0][1] == 0, calls))
+
+        n.show("Track 3", "Channel")
+        calls = wait_calls(fake, 2)
+        results.append(check("next Notify replaces the previous one", len(calls) == 2 and calls[1][1] == 41, calls))
+    finally:
+        daemon.terminate()
+        daemon.wait()
+        shutil.rmtree(work, ignore_errors=True)
+    sys.exit(0 if all(results) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Проверка shuffle_scheduler.ShuffleFeeder на поддельном mpv, без самого плеера.
+
+Поддельный клиент, как mpv, шлет изменение playlist-pos на каждую команду, которая его двигает
+(playlist-play-index, playlist-remove перед текущим), и события приходят по очереди уже после
+команд. Проверяем:
+  - подряд: в "played" с первого трека ровно сыгранные треки по порядку, окно и подрезка держат размер плейлиста;
+  - прыжок вперед на несколько записей: играет тот трек, на который прыгнули, и только он
+    записан сыгранным — запоздавшие позиции от подрезки ничего не сдвигают.
+Состояние пишется в файл отдельной зоны (PLAYLIST_INSTANCE) и удаляется в конце.
+
+  python3 bench/shuffle_check.py
+"""
+import os
+import sys
+
+os.environ["PLAYLIST_INSTANCE"] = "shufflecheck"
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+import tempfile
+import shuffle_scheduler as ss
+from playlist_health import HealthCache
+
+IDS = [f"v{i:010d}" for i in range(40)]
+CONF = {"playlist_id": "PLshufflecheck", "shuffle_seed": 7, "shuffle_horizon": 10}
+
+class Cache:
+    def load(self, _pid):
+        return {"entries": [{"id": v, "title": v} for v in IDS]}
+
+class FakeMpv:
+    """Плейлист из video ID и очередь событий playlist-pos, которые еще не доставлены"""
+
+    def __init__(self, ids):
+        self.pl, self.pos, self.events = list(ids), 0, []
+
+    def _move(self, pos):
+        if pos != self.pos:
+            self.pos = pos
+            self.events.append(pos)
+
+    def get_property(self, name, default=None):
+        if name == "playlist":
+            return [{"filename": ss.video_url(v)} for v in self.pl]
+        if name == "playlist-pos":
+            return self.pos
+        if name == "playlist-count":
+            return len(self.pl)
+        return default
+
+    def set_property(self, *args):
+        pass
+
+    def command(self, *args):
+        if args[0] == "loadfile":
+            self.pl.append(ss.video_id_from_url(args[1]))
+        elif args[0] == "playlist-remove":
+            self.pl.pop(args[1])
+            if args[1] < self.pos:
+                self._move(self.pos - 1)
+        elif args[0] == "playlist-clear":
+            self.pl = [self.pl[self.pos]]
+            self._move(0)
+        elif args[0] == "playlist-play-index":
+            self._move(args[1])
+
+def pump(feeder, mpv):
+    """Доставка событий в порядке прихода, как поток диспетчера MpvClient"""
+    while mpv.events:
+        feeder._on_pos("playlist-pos", mpv.events.pop(0))
+
+def start():
+    ss.save_state({})
+    path, _seed, _resumed = ss.start_order(CONF, Cache().load(None)["entries"], cache=ss.PlaylistCache(tempfile.mkdtemp()))
+    with open(path) as f:
+        first = ss.video_id_from_url(next(line for line in f if line.startswith("http")).strip())
+    feeder = ss.ShuffleFeeder(CONF, cache=Cache(), health=HealthCache(tempfile.mktemp()))
+    mpv = FakeMpv([first])
+    feeder.client = mpv
+    feeder.sync()
+    pump(feeder, mpv)
+    ref = ss.ShuffleOrder(lambda: IDS, CONF["shuffle_seed"], CONF["shuffle_horizon"])
+    return feeder, mpv, ref
+
+def check(name, ok, detail):
+    print(("ok   " if ok else "FAIL ") + name)
+    if not ok:
+        print("    ", detail)
+    return ok
+
+def main():
+    results = []
+    try:
+        # 1. Подряд, как по концу трека; первый трек нового порядка тоже сыгран
+        feeder, mpv, ref = start()
+        played = ss.load_state()["played"]
+        results.append(check("start: first track played", played == [ref.id_at(0)], played))
+        for _ in range(20):
+            mpv.command("playlist-play-index", mpv.pos + 1)
+            pump(feeder, mpv)
+        played = ss.load_state()["played"]
+        results.append(check("sequential: index", feeder.state["index"] == 20, feeder.state["index"]))
+        results.append(check("sequential: played in order", played[-10:] == [ref.id_at(i) for i in range(11, 21)], played))
+        results.append(check("sequential: window kept", len(mpv.pl) == ss.KEEP_BEHIND + 1 + ss.WINDOW, mpv.pl))
+
+        # 2. Прыжок вперед на 4 записи (playlist-play-index, поиск, POST /jump)
+        feeder, mpv, ref = start()
+        for _ in range(10):
+            mpv.command("playlist-play-index", mpv.pos + 1)
+            pump(feeder, mpv)
+        mpv.command("playlist-play-index", mpv.pos + 4)
+        pump(feeder, mpv)
+        played = ss.load_state()["played"]
+        results.append(check("jump: playing the target", mpv.pl[mpv.pos] == ref.id_at(14), (mpv.pos, mpv.pl)))
+        results.append(check("jump: index", feeder.state["index"] == 14, feeder.state["index"]))
+        results.append(check("jump: nothing past the target played", played[-1] == ref.id_at(14)
+                             and not set(played) & {ref.id_at(i) for i in range(15, 30)}, played))
+    finally:
+        if os.path.exists(ss.STATE_PATH):
+            os.remove(ss.STATE_PATH)
+    sys.exit(0 if all(results) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Бенчмарк "от запуска до звука" для run_mpv.run_stuff на поддельных mpv/yt-dlp/tmux/cava.
+
+Каждый прогон копирует текущие *.py плеера во временный каталог (свои configs/ и cache/),
+подкладывает fake_tools.py под именами внешних программ и запускает настоящий run_stuff.
+Результаты дописываются в JSONL (по умолчанию bench_output.txt) с ревизией git,
+чтобы потом сравнить два коммита через --compare.
+
+  python3 bench/startup_bench.py --sizes 50 500 2000 --runs 3
+  python3 bench/startup_bench.py --compare old.txt new.txt
+"""
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import signal
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_OUT = os.path.join(REPO_DIR, "bench_output.txt")
+TOOLS = ["mpv", "yt-dlp", "tmux", "cava", "socat", "notify-send"]
+PLAYLIST_ID = "PLbenchmark0000000000000000000000"
+# Что меряем внутри run_stuff (чего нет в конкретной ревизии — просто пропускаем)
+PHASE_FUNCS = ["load_config", "get_config", "send_notification", "start_background", "stop_background"]
+
+def git_rev():
+    try:
+        rev = subprocess.run(["git", "-C", REPO_DIR, "rev-parse", "--short", "HEAD"],
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "-C", REPO_DIR, "diff", "--quiet", "--", "*.py"]).returncode
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def prepare(workdir, conf):
+    app = os.path.join(workdir, "app")
+    os.makedirs(os.path.join(app, "configs"))
+    for path in glob.glob(os.path.join(REPO_DIR, "*.py")):
+        shutil.copy2(path, app)
+    with open(os.path.join(app, "configs", "config.json"), 'w') as f:
+        json.dump(conf, f)
+    bin_dir = os.path.join(workdir, "bin")
+    os.makedirs(bin_dir)
+    tool = os.path.join(BENCH_DIR, "fake_tools.py")
+    os.chmod(tool, 0o755)
+    for name in TOOLS:
+        os.symlink(tool, os.path.join(bin_dir, name))
+    return app, bin_dir
+
+def child(app_dir, warm):
+    """Выполняется в отдельном процессе: оборачивает фазы run_stuff таймерами и запускает его"""
+    sys.path.insert(0, app_dir)
+    import run_mpv
+    if warm:
+        try:
+            from playlist_cache import PlaylistCache
+            PlaylistCache().refresh(PLAYLIST_ID)
+        except ImportError:
+            pass # В этой ревизии кэша плейлистов еще нет
+    t0 = time.time()
+    phases = []
+
+    def timed(label, fn):
+        def wrapper(*args, **kwargs):
+            start = time.time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                phases.append({"name": label, "start": start - t0, "dur": time.time() - start})
+        return wrapper
+
+    for name in PHASE_FUNCS:
+        if hasattr(run_mpv, name):
+            setattr(run_mpv, name, timed(name, getattr(run_mpv, name)))
+
+    class TimedSubprocess:
+        def __getattr__(self, attr):
+            return getattr(subprocess, attr)
+
+        def run(self, cmd, *args, **kwargs):
+            label = " ".join(cmd[:2]) if isinstance(cmd, list) else str(cmd)[:20]
+            if isinstance(cmd, list) and "attach-session" in cmd:
+                label = "tmux session"
+            return timed(label, subprocess.run)(cmd, *args, **kwargs)
+
+    run_mpv.subprocess = TimedSubprocess()
+    timed("run_stuff", run_mpv.run_stuff)()
+    print("BENCH_RESULT " + json.dumps({"t0": t0, "phases": phases}), flush=True)
+
+def read_events(path):
+    events = []
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    pass
+    return events
+
+def kill_helpers(socket_path):
+    for pid_file in glob.glob(socket_path + "*.pid"):
+        try:
+            with open(pid_file, 'r') as f:
+                os.kill(int(f.read().strip()), signal.SIGTERM)
+        except (OSError, ValueError):
+            pass
+
+def run_once(args, workdir, app, bin_dir, size, scenario, run_no, rev):
+    state = os.path.join(workdir, "state")
+    shutil.rmtree(state, ignore_errors=True)
+    os.makedirs(state)
+    socket_path = os.path.join(workdir, "mpv.sock")
+    env = dict(os.environ)
+    env.update({
+        "PATH": bin_dir + os.pathsep + env.get("PATH", ""),
+        "PYTHONPATH": os.pathsep.join([os.path.join(BENCH_DIR, "fake_modules"), BENCH_DIR]),
+        "PLAYLIST_SOCKET": socket_path,
+        "FAKE_BENCH_DIR": state,
+        "FAKE_LATENCY": json.dumps(args.latency),
+        "FAKE_PLAYLIST_SIZE": str(size),
+        "FAKE_TRACKS": str(args.tracks),
+    })
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", app] + (["--warm"] if scenario == "warm" else []),
+                          env=env, capture_output=True, text=True, timeout=args.timeout)
+    kill_helpers(socket_path)
+    result = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH_RESULT "):
+            result = json.loads(line.split(" ", 1)[1])
+    if result is None:
+        print(proc.stdout + proc.stderr, file=sys.stderr)
+        return None
+
+    t0 = result["t0"]
+    events = read_events(os.path.join(state, "events.jsonl"))
+    audio = [e for e in events if e["event"] == "audio"]
+    ends = [e for e in events if e["event"] == "end_file"]
+    gaps = [a["t"] - e["t"] for e, a in zip(ends, audio[1:])]
+    first = {}
+    for e in events:
+        first.setdefault(e["event"], e["t"] - t0)
+    return {
+        "rev": rev, "size": size, "scenario": scenario, "run": run_no, "ts": time.time(),
+        "ttfa": audio[0]["t"] - t0 if audio else None,
+        "phases": {p["name"]: round(p["dur"], 4) for p in result["phases"]},
+        "milestones": {k: round(v, 4) for k, v in first.items()},
+        "gaps": [round(g, 4) for g in gaps],
+        "gap_mean": statistics.mean(gaps) if gaps else None,
+        "ytdl_calls": sum(1 for e in events if e["event"] in ("ytdl_video", "ytdl_playlist")),
+    }
+
+def median(values):
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+def summarize(records):
+    rows = {}
+    for r in records:
+        rows.setdefault((r["rev"], r["size"], r["scenario"]), []).append(r)
+    out = {}
+    for key, rs in rows.items():
+        out[key] = {"ttfa": median(r["ttfa"] for r in rs), "gap": median(r["gap_mean"] for r in rs), "n": len(rs)}
+    return out
+
+def fmt(v):
+    return f"{v:8.3f}" if v is not None else "       -"
+
+def print_summary(records):
+    print(f"{'rev':14} {'size':>6} {'cache':>6} {'ttfa,s':>8} {'gap,s':>8} {'runs':>5}")
+    for (rev, size, scenario), s in sorted(summarize(records).items(), key=lambda kv: (kv[0][1], kv[0][2], kv[0][0])):
+        print(f"{rev:14} {size:>6} {scenario:>6} {fmt(s['ttfa'])} {fmt(s['gap'])} {s['n']:>5}")
+
+def load_records(path):
+    with open(path, 'r') as f:
+        return [json.loads(l) for l in f if l.strip()]
+
+def compare(path_a, path_b):
+    a = {k[1:]: v for k, v in summarize(load_records(path_a)).items()}
+    b = {k[1:]: v for k, v in summarize(load_records(path_b)).items()}
+    print(f"{'size':>6} {'cache':>6} {'ttfa A':>8} {'ttfa B':>8} {'delta':>7} {'gap A':>8} {'gap B':>8} {'delta':>7}")
+    for key in sorted(set(a) & set(b)):
+        line = f"{key[0]:>6} {key[1]:>6}"
+        for metric in ("ttfa", "gap"):
+            va, vb = a[key][metric], b[key][metric]
+            delta = f"{(vb - va) / va * 100:+6.1f}%" if va and vb is not None else "      -"
+            line += f" {fmt(va)} {fmt(vb)} {delta}"
+        print(line)
+
+def parse_latency(items):
+    latency = {}
+    for item in items or []:
+        key, _, value = item.partition("=")
+        latency[key] = float(value)
+    return latency
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-to-first-audio benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 2000])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--tracks", type=int, default=4, help="сколько треков играть (для пауз между треками)")
+    parser.add_argument("--cache", choices=["cold", "warm", "both"], default="both")
+    parser.add_argument("--latency", nargs="*", metavar="KEY=SEC", help="задержки fake_tools, напр. ytdl_video=1.5")
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--compare", nargs=2, metavar="FILE")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--warm", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child, args.warm)
+    if args.compare:
+        return compare(*args.compare)
+
+    args.latency = parse_latency(args.latency)
+    conf = {"playlist_url": f"https://www.youtube.com/playlist?list={PLAYLIST_ID}", "playlist_id": PLAYLIST_ID,
+            "volume": 70, "shuffle": False, "loop": False, "prefetch": True, "ytdl_format": "bestaudio",
+            "allow_notifications": True}
+    scenarios = ["cold", "warm"] if args.cache == "both" else [args.cache]
+    rev = git_rev()
+    records = []
+    for size in args.sizes:
+        for scenario in scenarios:
+            for run_no in range(args.runs):
+                with tempfile.TemporaryDirectory(prefix="plp-bench-") as workdir:
+                    app, bin_dir = prepare(workdir, conf)
+                    r = run_once(args, workdir, app, bin_dir, size, scenario, run_no, rev)
+                if r is None:
+                    continue
+                records.append(r)
+                print(f"size={size} cache={scenario} run={run_no} ttfa={fmt(r['ttfa']).strip()}s gap={fmt(r['gap_mean']).strip()}s")
+                with open(args.out, 'a') as f:
+                    f.write(json.dumps(r) + "\n")
+    print_summary(records)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Проверка playlistupd на локальном http.server вместо GitHub.
+
+"Сервер" и "установка" — две копии текущих файлов во временном каталоге. На сервере меняем
+несколько файлов, пишем манифест и запускаем playlistupd из установки (PLAYLISTUPD_URL):
+  - качаются только version.json и изменившиеся файлы;
+  - если изменился сам playlistupd.py, он ставится первым и перезапускается;
+  - файл, не совпавший с манифестом, отменяет обновление целиком;
+  - прерванная установка доставляется следующим запуском.
+
+  python3 bench/update_check.py
+"""
+import os
+import sys
+import json
+import glob
+import shutil
+import tempfile
+import threading
+import subprocess
+import functools
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+class Handler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, как у GitHub
+    log = []
+
+    def do_GET(self):
+        Handler.log.append((self.client_address, self.path.lstrip("/")))
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+def copy_tree(dst):
+    os.makedirs(dst)
+    for path in glob.glob(os.path.join(REPO_DIR, "*.py")) + [os.path.join(REPO_DIR, "version.json")]:
+        shutil.copy2(path, dst)
+
+def publish(remote, changes, version):
+    """Меняет файлы на "сервере" и пишет туда манифест новой версии"""
+    for name in changes:
+        with open(os.path.join(remote, name), 'a') as f:
+            f.write(f"\n# {version}\n")
+    with open(os.path.join(remote, "version.json"), 'r') as f:
+        data = json.load(f)
+    data["version"] = version
+    with open(os.path.join(remote, "version.json"), 'w') as f:
+        json.dump(data, f)
+    subprocess.run([sys.executable, os.path.join(remote, "playlistupd.py"), "--manifest"], check=True,
+                   stdout=subprocess.DEVNULL)
+
+def run_update(install, url):
+    Handler.log.clear()
+    env = dict(os.environ, PLAYLISTUPD_URL=url, LANG="C")
+    env.pop("PLAYLISTUPD_BOOTSTRAPPED", None)
+    proc = subprocess.run([sys.executable, os.path.join(install, "playlistupd.py")], input="y\nn\n",
+                          capture_output=True, text=True, env=env, timeout=60)
+    return proc.stdout + proc.stderr
+
+def differing(install, remote):
+    return sorted(os.path.basename(p) for p in glob.glob(os.path.join(remote, "*"))
+                  if open(p, 'rb').read() != open(os.path.join(install, os.path.basename(p)), 'rb').read())
+
+def check(name, ok, out):
+    print(("ok   " if ok else "FAIL ") + name)
+    if not ok:
+        print(out)
+    return ok
+
+def main():
+    work = tempfile.mkdtemp(prefix="upd_check_")
+    remote, install = os.path.join(work, "remote"), os.path.join(work, "install")
+    copy_tree(remote)
+    copy_tree(install)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(Handler, directory=remote))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+    results = []
+    try:
+        # 1. Дельта: два файла из двадцати с лишним
+        publish(remote, ["run_mpv.py", "watchdog.py"], "9.1")
+        out = run_update(install, url)
+        fetched = sorted(p for _a, p in Handler.log)
+        results.append(check("delta: only changed files", fetched == ["run_mpv.py", "version.json", "watchdog.py"], out))
+        results.append(check("delta: installed", not differing(install, remote), out))
+
+        # 2. Новый апдейтер ставится первым и доделывает обновление сам
+        publish(remote, ["playlistupd.py", "mpv_ipc.py"], "9.2")
+        out = run_update(install, url)
+        fetched = [p for _a, p in Handler.log]
+        results.append(check("bootstrap: updater first, then re-exec",
+                             fetched[:2] == ["version.json", "playlistupd.py"] and fetched.count("playlistupd.py") == 1
+                             and fetched.count("version.json") == 2 and "mpv_ipc.py" in fetched, out))
+        results.append(check("bootstrap: installed", not differing(install, remote), out))
+
+        # 3. Битый файл на сервере — ничего не трогаем
+        publish(remote, ["notifier.py", "loudness.py"], "9.3")
+        with open(os.path.join(remote, "loudness.py"), 'a') as f:
+            f.write("# corrupted\n")
+        out = run_update(install, url)
+        results.append(check("bad hash: nothing installed",
+                             differing(install, remote) == ["loudness.py", "notifier.py", "version.json"], out))
+
+        # 4. Прерванная установка: журнал есть, loudness.py уже переставлен, notifier.py еще в staging.
+        # Дальше обычная проверка снова упрется в битый loudness.py на сервере
+        staging = os.path.join(install, ".update_staging")
+        os.makedirs(staging)
+        shutil.copy2(os.path.join(remote, "notifier.py"), staging)
+        with open(os.path.join(staging, "version.json"), 'w') as f:
+            f.write(open(os.path.join(install, "version.json")).read())
+        with open(os.path.join(staging, "pending.json"), 'w') as f:
+            json.dump(["loudness.py", "notifier.py"], f)
+        out = run_update(install, url)
+        results.append(check("resume: staged files installed, staging removed",
+                             differing(install, remote) == ["loudness.py", "version.json"]
+                             and not os.path.exists(staging), out))
+    finally:
+        server.server_close()
+        shutil.rmtree(work, ignore_errors=True)
+    sys.exit(0 if all(results) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+DEFAULT_PROFILE = "balanced"
+# budget_mb — сколько всего mpv может держать в кэше демуксера на плеер,
+# back — доля бюджета под уже проигранное (перемотка назад, кэш треков на диске),
+# readahead — сколько секунд вперед качать, pause_wait — сколько накопить после заикания
+PROFILES = {
+    "low-memory":   {"budget_mb": 48,  "back": 0.15, "readahead": 30,  "pause_wait": 1, "network_timeout": 30},
+    "balanced":     {"budget_mb": 150, "back": 0.25, "readahead": 120, "pause_wait": 2, "network_timeout": 30},
+    "high-latency": {"budget_mb": 400, "back": 0.2,  "readahead": 600, "pause_wait": 6, "network_timeout": 90},
+}
+MIN_BUDGET_MB = 16
+
+def profile_options(name, budget_mb=0, prefetch=False):
+    """Опции mpv для профиля. С --prefetch-playlist mpv держит открытыми два демуксера
+    (текущий и следующий трек), поэтому бюджет делится пополам — итоговый потолок тот же."""
+    p = PROFILES.get(name, PROFILES[DEFAULT_PROFILE])
+    budget = max(int(budget_mb or p["budget_mb"]), MIN_BUDGET_MB)
+    per_demuxer = budget / 2 if prefetch else budget
+    back = int(per_demuxer * p["back"])
+    return {
+        "demuxer-max-bytes": f"{int(per_demuxer) - back}MiB",
+        "demuxer-max-back-bytes": f"{back}MiB",
+        "cache-secs": p["readahead"],
+        "cache-pause-wait": p["pause_wait"],
+        "network-timeout": p["network_timeout"],
+    }
+
+def profile_args(name, budget_mb=0, prefetch=False):
+    return [f"--{k}={v}" for k, v in profile_options(name, budget_mb, prefetch).items()]
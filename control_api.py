@@ -0,0 +1,295 @@
+import os
+import json
+import base64
+import struct
+import asyncio
+import hashlib
+import threading
+from urllib.parse import urlsplit, parse_qs
+from mpv_ipc import MpvError, SOCKET_PATH
+from playlist_cache import video_id_from_url, video_url
+
+# Локальный HTTP + WebSocket пульт. Живет в фоновом процессе и ходит в mpv через его единственный
+# MpvClient: запросы всех клиентов расходятся по request_id, события mpv раздаются всем подписчикам.
+LOOPBACK = {"127.0.0.1", "localhost", "::1"}
+DEFAULT_UNIX = SOCKET_PATH + "-api.sock"
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+WS_QUEUE = 256          # Столько событий держим для медленного клиента, дальше он отключается
+MAX_BODY = 64 * 1024
+# Что транслируем в /events. time-pos сюда не входит: 20 раз в секунду каждому клиенту незачем
+WATCHED = ["media-title", "pause", "volume", "playlist-pos", "playlist-count", "paused-for-cache", "idle-active"]
+EVENTS = ["start-file", "file-loaded", "end-file"]
+NOW_PLAYING = ["media-title", "path", "time-pos", "duration", "pause", "volume", "playlist-pos", "playlist-count"]
+
+def parse_listen(value):
+    """'' — выключено; 'unix' или 'unix:/путь' — Unix-сокет; '8765' или 'host:8765' — TCP только на loopback"""
+    value = (value or "").strip()
+    if not value:
+        return None
+    if value == "unix":
+        return ("unix", DEFAULT_UNIX)
+    if value.startswith("unix:"):
+        return ("unix", value[5:] or DEFAULT_UNIX)
+    host, _, port = value.rpartition(":")
+    host = host.strip("[]") or "127.0.0.1"
+    try:
+        port = int(port)
+    except ValueError:
+        return None
+    return ("tcp", (host if host in LOOPBACK else "127.0.0.1", port))
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class ControlServer:
+    """HTTP: GET /now-playing, /queue; POST /play, /pause, /toggle, /next, /prev, /volume, /queue, /jump.
+    WebSocket: GET /events — JSON с property-change и событиями треков."""
+
+    def __init__(self, client, listen, feeder=None):
+        self.client = client
+        self.listen = listen
+        self.feeder = feeder # shuffle_scheduler.ShuffleFeeder: при нем в mpv лежит только окно порядка
+        self.loop = None
+        self.subscribers = set() # asyncio.Queue каждого WebSocket-клиента
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        # Подписки на mpv — одни на всех клиентов; колбэки приходят из потока клиента
+        for name in WATCHED:
+            self.client.observe(name, lambda n, v: self._publish({"event": "property-change", "name": n, "data": v}))
+        for name in EVENTS:
+            self.client.on_event(name, self._publish)
+        self.loop.run_until_complete(self._serve())
+        self.loop.run_forever()
+
+    async def _serve(self):
+        kind, addr = self.listen
+        if kind == "unix":
+            if os.path.exists(addr):
+                os.unlink(addr)
+            await asyncio.start_unix_server(self._handle, path=addr)
+            os.chmod(addr, 0o600)
+        else:
+            await asyncio.start_server(self._handle, host=addr[0], port=addr[1])
+
+    # --- События ---
+
+    def _publish(self, message):
+        if self.loop is not None and self.subscribers:
+            self.loop.call_soon_threadsafe(self._fan_out, json.dumps(message))
+
+    def _fan_out(self, text):
+        for q in list(self.subscribers):
+            try:
+                q.put_nowait(text)
+            except asyncio.QueueFull:
+                self.subscribers.discard(q)
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait(None)
+
+    # --- mpv ---
+
+    async def mpv(self, *args):
+        fut = asyncio.wrap_future(self.client.command_async(*args))
+        try:
+            return await asyncio.wait_for(fut, 5)
+        except asyncio.TimeoutError:
+            raise MpvError(f"timeout: {args[0]}")
+
+    async def prop(self, name):
+        try:
+            return await self.mpv("get_property", name)
+        except MpvError:
+            return None
+
+    # --- HTTP ---
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                url = urlsplit(path)
+                if not self._local_origin(headers):
+                    self._respond(writer, 403, {"error": "forbidden"}, True)
+                    break
+                if url.path == "/events" and headers.get("upgrade", "").lower() == "websocket":
+                    await self._websocket(reader, writer, headers)
+                    break
+                try:
+                    status, payload = 200, await self._route(method, url.path, parse_qs(url.query), body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except MpvError as e:
+                    status, payload = 503, {"error": str(e) or "mpv unavailable"}
+                self._respond(writer, status, payload, headers.get("connection", "").lower() == "close")
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _local_origin(self, headers):
+        """Страница из браузера с чужого сайта (или DNS rebinding) не должна управлять плеером"""
+        origin = headers.get("origin")
+        if origin and origin != "null" and urlsplit(origin).hostname not in LOOPBACK:
+            return False
+        host = headers.get("host")
+        return self.listen[0] == "unix" or not host or urlsplit("//" + host).hostname in LOOPBACK
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        method, path, _version = line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").rstrip("\r\n")
+            if not line:
+                break
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY:
+            raise ValueError("body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), path, headers, body
+
+    def _respond(self, writer, status, payload, close=False):
+        data = json.dumps(payload, ensure_ascii=False).encode()
+        reason = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+        writer.write((f"HTTP/1.1 {status} {reason.get(status, '')}\r\n"
+                      f"Content-Type: application/json; charset=utf-8\r\nContent-Length: {len(data)}\r\n"
+                      f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n").encode() + data)
+
+    async def _route(self, method, path, query, body):
+        try:
+            args = json.loads(body) if body else {}
+        except ValueError:
+            raise HttpError(400, "body is not JSON")
+        if not isinstance(args, dict):
+            raise HttpError(400, "body must be a JSON object")
+        args.update({k: v[0] for k, v in query.items()})
+        if method == "GET":
+            if path == "/now-playing":
+                return await self._now_playing()
+            if path == "/queue":
+                return await self._queue()
+        elif method == "POST":
+            if path == "/play":
+                await self.mpv("set_property", "pause", False)
+            elif path == "/pause":
+                await self.mpv("set_property", "pause", True)
+            elif path == "/toggle":
+                await self.mpv("cycle", "pause")
+            elif path == "/next":
+                await self.mpv("playlist-next")
+            elif path == "/prev":
+                await self.mpv("playlist-prev")
+            elif path == "/volume":
+                try:
+                    volume = max(0, min(int(args["volume"]), 100))
+                except (KeyError, TypeError, ValueError):
+                    raise HttpError(400, "volume must be 0..100")
+                await self.mpv("set_property", "volume", volume)
+            elif path == "/queue":
+                vid = args.get("video_id") or video_id_from_url(args.get("url", ""))
+                if not vid:
+                    raise HttpError(400, "video_id or url required")
+                if self.feeder:
+                    # Дописать в конец окна нельзя: планировщик примет чужую запись за рассинхрон и набьет окно заново
+                    await asyncio.get_running_loop().run_in_executor(None, self.feeder.queue, vid)
+                else:
+                    await self.mpv("loadfile", video_url(vid), "append")
+            elif path == "/jump":
+                try:
+                    await self.mpv("playlist-play-index", int(args["index"]))
+                except (KeyError, TypeError, ValueError):
+                    raise HttpError(400, "index required")
+            else:
+                raise HttpError(404, "not found")
+            return {"ok": True}
+        else:
+            raise HttpError(405, "method not allowed")
+        raise HttpError(404, "not found")
+
+    async def _now_playing(self):
+        values = await asyncio.gather(*(self.prop(n) for n in NOW_PLAYING))
+        state = dict(zip(NOW_PLAYING, values))
+        state["video_id"] = video_id_from_url(state.get("path") or "")
+        return state
+
+    async def _queue(self):
+        entries = await self.prop("playlist") or []
+        return [{"index": i, "video_id": video_id_from_url(e.get("filename", "")), "title": e.get("title"),
+                 "current": bool(e.get("current"))} for i, e in enumerate(entries)]
+
+    # --- WebSocket ---
+
+    async def _websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        q = asyncio.Queue(WS_QUEUE)
+        self.subscribers.add(q)
+        q.put_nowait(json.dumps({"event": "now-playing", "data": await self._now_playing()}))
+        reading = asyncio.ensure_future(self._ws_reader(reader, writer))
+        try:
+            while not reading.done():
+                getter = asyncio.ensure_future(q.get())
+                done, _ = await asyncio.wait({getter, reading}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    break
+                text = getter.result()
+                if text is None:
+                    break # Не успевал читать — отключаем, пусть переподключится и возьмет /now-playing
+                writer.write(ws_frame(0x1, text.encode()))
+                await writer.drain()
+            writer.write(ws_frame(0x8, b""))
+        finally:
+            self.subscribers.discard(q)
+            reading.cancel()
+
+    async def _ws_reader(self, reader, writer):
+        """Клиенту писать нам нечего — отвечаем на ping и ждем close"""
+        try:
+            while True:
+                head = await reader.readexactly(2)
+                opcode, length = head[0] & 0x0F, head[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack(">H", await reader.readexactly(2))[0]
+                elif length == 127:
+                    length = struct.unpack(">Q", await reader.readexactly(8))[0]
+                if length > MAX_BODY:
+                    return
+                mask = await reader.readexactly(4) if head[1] & 0x80 else b"\0\0\0\0"
+                data = bytes(b ^ mask[i % 4] for i, b in enumerate(await reader.readexactly(length)))
+                if opcode == 0x8:
+                    return
+                if opcode == 0x9:
+                    writer.write(ws_frame(0xA, data))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return # Ушли без close-кадра — обычный обрыв, иначе asyncio ругается на неполученное исключение задачи
+
+def ws_frame(opcode, data):
+    n = len(data)
+    if n < 126:
+        head = struct.pack(">BB", 0x80 | opcode, n)
+    elif n < 1 << 16:
+        head = struct.pack(">BBH", 0x80 | opcode, 126, n)
+    else:
+        head = struct.pack(">BBQ", 0x80 | opcode, 127, n)
+    return head + data
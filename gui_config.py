@@ -1,14 +1,22 @@
 import os
 import sys
 import json
-import re
 import math
+import time
 import locale
+import traceback
+import subprocess
 from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QLabel, 
                              QLineEdit, QSlider, QCheckBox, QPushButton, 
-                             QComboBox, QGridLayout, QHBoxLayout, QColorDialog, QDialog)
-from PyQt6.QtCore import Qt, QTimer
-from PyQt6.QtGui import QLinearGradient, QColor, QPalette, QBrush
+                             QComboBox, QGridLayout, QHBoxLayout, QColorDialog, QDialog, QListWidget, QListWidgetItem)
+from PyQt6.QtCore import Qt, QTimer, QEvent, QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QLinearGradient, QColor, QBrush, QPainter, QPixmap, QTransform
+from playlist_cache import PLAYLIST_ID_RE, PlaylistCache, playlist_url
+from playlist_health import HealthCache
+from adaptive_quality import AUTO_FORMAT
+from buffer_profiles import PROFILES, DEFAULT_PROFILE
+from search_index import SearchIndex, play_entry
+from mpv_ipc import MpvError
 
 # Пути к файлам
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -19,12 +27,20 @@ VERSION_PATH = os.path.join(ROOT_DIR, "version.json")
 
 os.makedirs(CONFIG_DIR, exist_ok=True)
 
+DEFAULT_ANIM_FPS = 30
+ANIM_LEVELS = 32 # Сколько разных положений градиента держим готовыми (дальше глаз разницы не видит)
+BG_DIAGONAL = (520, 700) # Градиент фона идет из (0, 0) сюда
+STRIP_WIDTH = 1024       # Длина полоски градиента в пикселях: на диагонали окна ступенек не видно
+PREVIEW_DELAY = 700 # мс тишины в поле ссылки, после которых смотрим плейлист
+PREVIEW_TITLES = 3
+
 # Локализация интерфейса
 STRINGS = {
     "ru": {
         "title": "Конфигурация плеера",
         "url_label": "Ссылка на плейлист YouTube",
         "quality_label": "Качество аудиопотока",
+        "buffer_label": "Профиль буфера",
         "vol_label": "Уровень громкости",
         "shuffle": "Случайный порядок",
         "loop": "Повтор плейлиста",
@@ -32,27 +48,60 @@ STRINGS = {
         "gapless": "Воспроизведение без пауз",
         "loudnorm": "Нормализация звука",
         "notifications": "Уведомления",
+        "audio_cache": "Кэш треков на диске",
+        "daemon_mode": "Играть в фоне",
+        "builtin_visualizer": "Свой визуализатор",
+        "resume": "Продолжать с места остановки",
         "save": "СОХРАНИТЬ ПАРАМЕТРЫ",
         "saved_msg": "КОНФИГУРАЦИЯ ОБНОВЛЕНА",
-        "custom_btn": "ДИЗАЙН"
+        "custom_btn": "ДИЗАЙН",
+        "search_btn": "ПОИСК",
+        "search_hint": "Название или канал...",
+        "search_empty": "Плейлист еще не загружен — запустите плеер хотя бы раз",
+        "search_offline": "Плеер не запущен",
+        "preview_loading": "Загружаем плейлист...",
+        "preview_summary": "{} треков · {}",
+        "preview_dead": " · недоступно: {}",
+        "preview_empty": "Плейлист пуст",
+        "preview_error": "Плейлист недоступен (приватный или удален?)",
+        "hours": "{} ч {} мин", "minutes": "{} мин"
     },
     "en": {
         "title": "Player Configuration",
         "url_label": "YouTube Playlist URL",
         "quality_label": "Audio Quality",
+        "buffer_label": "Buffer Profile",
         "vol_label": "Volume Level",
         "shuffle": "Shuffle Mode",
         "loop": "Loop Playlist",
         "prefetch": "Prefetching",
         "notifications": "Notifications",
+        "audio_cache": "Local Track Cache",
+        "daemon_mode": "Background Playback",
+        "builtin_visualizer": "Built-in Visualizer",
+        "resume": "Resume Where I Left Off",
         "gapless": "Gapless Playback",
         "loudnorm": "Loudness Normalization",
         "save": "SAVE CONFIGURATION",
         "saved_msg": "CONFIGURATION UPDATED",
-        "custom_btn": "DESIGN"
+        "custom_btn": "DESIGN",
+        "search_btn": "SEARCH",
+        "search_hint": "Title or channel...",
+        "search_empty": "The playlist is not loaded yet — start the player once",
+        "search_offline": "The player is not running",
+        "preview_loading": "Loading playlist...",
+        "preview_summary": "{} tracks · {}",
+        "preview_dead": " · unavailable: {}",
+        "preview_empty": "The playlist is empty",
+        "preview_error": "Playlist is unavailable (private or deleted?)",
+        "hours": "{} h {} min", "minutes": "{} min"
     }
 }
 
+# Ключи конфига под чекбоксами (в порядке self.cbs) и значения по умолчанию для них
+CB_KEYS = ["shuffle", "loop", "prefetch", "gapless", "loudnorm", "allow_notifications", "audio_cache", "daemon_mode", "builtin_visualizer", "resume"]
+CB_DEFAULTS = {"audio_cache": False, "daemon_mode": False, "builtin_visualizer": False}
+
 def get_version_info():
     """Чтение данных о версии из локального JSON"""
     try:
@@ -66,6 +115,46 @@ def get_version_info():
     except: pass
     return "vUnknown | Data missing"
 
+class PreviewSignals(QObject):
+    done = pyqtSignal(str, object, bool) # (playlist_id, сводка или None — не вышло, последний ли ответ)
+
+class PreviewTask(QRunnable):
+    """Содержимое плейлиста в пуле потоков: сначала то, что уже есть на диске, потом свежее из yt-dlp.
+    Кладем в тот же кэш, что читает плеер, — первый запуск после превью уже теплый."""
+
+    def __init__(self, playlist_id, signals):
+        super().__init__()
+        self.playlist_id = playlist_id
+        self.signals = signals
+
+    def run(self):
+        # Последний сигнал (final=True) уходит при любом исходе: по нему окно снимает плейлист из preview_running
+        summary = None
+        try:
+            cache = PlaylistCache()
+            data = cache.load(self.playlist_id)
+            if data is not None:
+                summary = self.summary(data)
+                if cache.is_fresh(data):
+                    return
+                self.signals.done.emit(self.playlist_id, summary, False)
+            try:
+                summary = self.summary(cache.refresh(self.playlist_id))
+            except (OSError, ValueError, subprocess.SubprocessError):
+                pass # Устаревший кэш (если он есть) все равно лучше, чем ничего
+        except Exception:
+            traceback.print_exc() # Исключение из QRunnable.run PyQt превращает в падение всего конфигуратора
+        finally:
+            self.signals.done.emit(self.playlist_id, summary, True)
+
+    @staticmethod
+    def summary(data):
+        """Все, что показываем, считаем здесь же, в пуле: на тысячах треков это уже заметно"""
+        entries = data["entries"]
+        return {"count": len(entries), "seconds": sum(e.get("duration") or 0 for e in entries),
+                "dead": len(entries) - len(HealthCache().playable(entries)),
+                "titles": [e["title"] for e in entries[:PREVIEW_TITLES]]}
+
 class ModernConfigApp(QWidget):
     def __init__(self):
         super().__init__()
@@ -78,10 +167,21 @@ class ModernConfigApp(QWidget):
         self.color1 = QColor("#11111b")
         self.color2 = QColor("#313244")
         self.anim_speed = 0
+        self.anim_fps = DEFAULT_ANIM_FPS
         self.anim_step = 0.0
+        self.anim_last = time.monotonic()
+        self.strips_key = None
+        self.strips = {}
+        self.search_index = SearchIndex() # Живет с окном: при повторном поиске докидываем только изменения
+        self.preview_id = None
+        self.preview_running = set()
+        self.preview_signals = PreviewSignals()
+        self.preview_signals.done.connect(self.show_preview)
+        self.preview_timer = QTimer(); self.preview_timer.setSingleShot(True)
+        self.preview_timer.timeout.connect(self.start_preview)
         
         self.setWindowTitle("Playlist Player Settings")
-        self.setFixedSize(520, 600)
+        self.setFixedSize(520, 650)
         self.setWindowOpacity(0.94) # Установка прозрачности окна
 
         self.load_custom_config()
@@ -91,8 +191,7 @@ class ModernConfigApp(QWidget):
         
         self.timer = QTimer()
         self.timer.timeout.connect(self.animate_bg)
-        if self.anim_speed > 0:
-            self.timer.start(16)
+        QApplication.instance().applicationStateChanged.connect(lambda _state: self.update_timer())
 
     def load_custom_config(self):
         if os.path.exists(CUSTOM_PATH):
@@ -102,10 +201,11 @@ class ModernConfigApp(QWidget):
                     self.color1 = QColor(c.get("color1", "#11111b"))
                     self.color2 = QColor(c.get("color2", "#313244"))
                     self.anim_speed = c.get("speed", 0)
+                    self.anim_fps = max(1, min(int(c.get("fps", DEFAULT_ANIM_FPS)), 120))
             except: pass
 
     def save_custom_config(self):
-        conf = {"color1": self.color1.name(), "color2": self.color2.name(), "speed": self.anim_speed}
+        conf = {"color1": self.color1.name(), "color2": self.color2.name(), "speed": self.anim_speed, "fps": self.anim_fps}
         with open(CUSTOM_PATH, 'w') as f:
             json.dump(conf, f, indent=4)
     def add_aliases(self):
@@ -137,20 +237,78 @@ class ModernConfigApp(QWidget):
         except Exception as e:
             print(f"Error adding aliases: {e}")
      
-    def animate_bg(self):
-        self.anim_step += self.anim_speed / 500
-        if self.anim_step > 1.0: self.anim_step = 0
+    # --- Фон ---
+    # Раньше каждый тик собирал новый градиент и делал setPalette, а это перерисовка всех
+    # дочерних виджетов. Градиент вдоль диагонали одномерный: на каждое положение храним полоску
+    # STRIP_WIDTH x 1 (4 КБ), а на окно ее растягивает кисть с поворотом — не кадры размером с окно.
+
+    def bg_strip(self, level):
+        key = (self.color1.rgb(), self.color2.rgb())
+        if key != self.strips_key: # Сменились цвета — старые полоски больше не нужны
+            self.strips_key, self.strips = key, {}
+        pix = self.strips.get(level)
+        if pix is None:
+            pix = QPixmap(STRIP_WIDTH, 1)
+            grad = QLinearGradient(0, 0, STRIP_WIDTH, 0)
+            grad.setColorAt(0, self.color1)
+            grad.setColorAt(level / (ANIM_LEVELS - 1), self.color2)
+            grad.setColorAt(1, self.color1)
+            p = QPainter(pix)
+            p.fillRect(0, 0, STRIP_WIDTH, 1, QBrush(grad))
+            p.end()
+            self.strips[level] = pix
+        return pix
+
+    @staticmethod
+    def bg_transform():
+        """Полоска -> окно: ее ось x ложится на диагональ BG_DIAGONAL, строка повторяется поперек нее"""
+        dx, dy = BG_DIAGONAL
+        length = math.hypot(dx, dy)
+        return QTransform(dx / STRIP_WIDTH, dy / STRIP_WIDTH, -dy / length, dx / length, 0, 0)
+
+    def bg_level(self):
         factor = (math.sin(self.anim_step * 2 * math.pi) + 1) / 2
-        grad = QLinearGradient(0, 0, 520, 700)
-        grad.setColorAt(0, self.color1)
-        grad.setColorAt(factor, self.color2)
-        grad.setColorAt(1, self.color1)
-        palette = self.palette()
-        palette.setBrush(QPalette.ColorRole.Window, QBrush(grad))
-        self.setPalette(palette)
+        return round(factor * (ANIM_LEVELS - 1))
+
+    def paintEvent(self, event):
+        brush = QBrush(self.bg_strip(self.bg_level()))
+        brush.setTransform(self.bg_transform())
+        p = QPainter(self) # Клип по event.rect() painter ставит сам
+        p.fillRect(self.rect(), brush)
+        p.end()
+
+    def animate_bg(self):
+        # Шаг считаем по реальному времени: скорость не зависит от fps и пропущенных тиков
+        now = time.monotonic()
+        level = self.bg_level()
+        self.anim_step = (self.anim_step + self.anim_speed / 8 * (now - self.anim_last)) % 1.0
+        self.anim_last = now
+        if self.bg_level() != level:
+            self.update()
+
+    def update_timer(self):
+        """Анимация крутится только когда ее видно: окно показано, не свернуто и приложение в фокусе"""
+        run = (self.anim_speed > 0 and self.isVisible() and not self.isMinimized()
+               and QApplication.applicationState() == Qt.ApplicationState.ApplicationActive)
+        if run and not self.timer.isActive():
+            self.anim_last = time.monotonic()
+            self.timer.start(1000 // self.anim_fps)
+        elif not run:
+            self.timer.stop()
+
+    def showEvent(self, event):
+        super().showEvent(event); self.update_timer()
+
+    def hideEvent(self, event):
+        super().hideEvent(event); self.update_timer()
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.Type.WindowStateChange:
+            self.update_timer()
 
     def init_ui(self):
-        self.setAutoFillBackground(True)
+        self.setAttribute(Qt.WidgetAttribute.WA_OpaquePaintEvent) # Фон целиком рисует paintEvent
         self.main_layout = QVBoxLayout()
         self.main_layout.setContentsMargins(35, 25, 35, 15)
         self.main_layout.setSpacing(12)
@@ -165,7 +323,11 @@ class ModernConfigApp(QWidget):
         self.custom_btn.clicked.connect(self.show_design_dialog)
         self.custom_btn.setStyleSheet("background: rgba(255,255,255,0.1); color: white; border-radius: 4px; padding: 5px 15px;")
         
-        top_bar.addWidget(self.lang_combo); top_bar.addStretch(); top_bar.addWidget(self.custom_btn)
+        self.search_btn = QPushButton()
+        self.search_btn.clicked.connect(self.show_search_dialog)
+        self.search_btn.setStyleSheet(self.custom_btn.styleSheet())
+
+        top_bar.addWidget(self.lang_combo); top_bar.addStretch(); top_bar.addWidget(self.search_btn); top_bar.addWidget(self.custom_btn)
         self.main_layout.addLayout(top_bar)
 
         # Заголовок
@@ -178,13 +340,27 @@ class ModernConfigApp(QWidget):
         self.url_input = QLineEdit()
         self.url_input.setStyleSheet("background: rgba(0,0,0,0.3); border-radius: 6px; padding: 12px; color: white; border: 1px solid rgba(88,101,242, 0.4);")
         self.main_layout.addWidget(self.url_input)
+        self.preview_label = QLabel()
+        self.preview_label.setWordWrap(True)
+        self.preview_label.setStyleSheet("color: rgba(255, 255, 255, 0.6); font-size: 11px;")
+        self.main_layout.addWidget(self.preview_label)
+        # Пока печатают, сеть не трогаем: таймер перезапускается на каждую букву
+        self.url_input.textChanged.connect(lambda _text: self.preview_timer.start(PREVIEW_DELAY))
 
-        self.l_qual = QLabel(); self.main_layout.addWidget(self.l_qual)
+        # Качество и профиль буфера — в одну строку
+        qual_grid = QGridLayout()
+        self.l_qual = QLabel(); self.l_buf = QLabel()
         self.quality_combo = QComboBox()
-        self.quality_map = {"Best": "bestaudio", "Balanced": "bestaudio[abr<=192]", "Potato": "worstaudio"}
+        # "Auto" в конце: без конфига комбобокс стоит на первом пункте, а по умолчанию у нас "Best"
+        self.quality_map = {"Best": "bestaudio", "Balanced": "bestaudio[abr<=192]", "Potato": "worstaudio", "Auto": AUTO_FORMAT}
         self.quality_combo.addItems(self.quality_map.keys())
-        self.quality_combo.setStyleSheet("background: rgba(0,0,0,0.2); color: white; padding: 8px; border-radius: 5px;")
-        self.main_layout.addWidget(self.quality_combo)
+        self.buffer_combo = QComboBox()
+        self.buffer_combo.addItems(PROFILES.keys())
+        self.buffer_combo.setCurrentText(DEFAULT_PROFILE)
+        for col, (label, combo) in enumerate([(self.l_qual, self.quality_combo), (self.l_buf, self.buffer_combo)]):
+            combo.setStyleSheet("background: rgba(0,0,0,0.2); color: white; padding: 8px; border-radius: 5px;")
+            qual_grid.addWidget(label, 0, col); qual_grid.addWidget(combo, 1, col)
+        self.main_layout.addLayout(qual_grid)
 
         self.vol_text = QLabel(); self.main_layout.addWidget(self.vol_text)
         self.vol_slider = QSlider(Qt.Orientation.Horizontal)
@@ -196,8 +372,8 @@ class ModernConfigApp(QWidget):
         grid = QGridLayout()
         self.shuffle_cb = QCheckBox(); self.loop_cb = QCheckBox()
         self.prefetch_cb = QCheckBox(); self.gapless_cb = QCheckBox(); self.norm_cb = QCheckBox()
-        self.notify_cb = QCheckBox()
-        self.cbs = [self.shuffle_cb, self.loop_cb, self.prefetch_cb, self.gapless_cb, self.norm_cb, self.notify_cb]
+        self.notify_cb = QCheckBox(); self.cache_cb = QCheckBox(); self.daemon_cb = QCheckBox(); self.vis_cb = QCheckBox(); self.resume_cb = QCheckBox()
+        self.cbs = [self.shuffle_cb, self.loop_cb, self.prefetch_cb, self.gapless_cb, self.norm_cb, self.notify_cb, self.cache_cb, self.daemon_cb, self.vis_cb, self.resume_cb]
         for i, cb in enumerate(self.cbs):
             cb.setStyleSheet("color: white; font-size: 13px;")
             grid.addWidget(cb, i // 2, i % 2)
@@ -245,17 +421,81 @@ class ModernConfigApp(QWidget):
         for w in [btn_c1, btn_c2, lbl_speed, sl_speed, btn_ok]: layout.addWidget(w)
         d.setLayout(layout); d.exec()
 
+    def show_search_dialog(self):
+        s = STRINGS[self.lang]
+        match = PLAYLIST_ID_RE.search(self.url_input.text())
+        d = QDialog(self)
+        d.setWindowTitle("Search")
+        d.setFixedSize(440, 420)
+        d.setStyleSheet("background: #181825; color: white;")
+        layout = QVBoxLayout()
+        query = QLineEdit(); query.setPlaceholderText(s["search_hint"])
+        results = QListWidget()
+        status = QLabel()
+        if not match or not (self.search_index.refresh(match.group(1)) or self.search_index.by_id):
+            status.setText(s["search_empty"])
+
+        def fill(text):
+            results.clear()
+            for vid, title, uploader, pos in self.search_index.search(text):
+                item = QListWidgetItem(f"{title} — {uploader}" if uploader else title)
+                item.setData(Qt.ItemDataRole.UserRole, vid)
+                results.addItem(item)
+
+        def play(item):
+            try:
+                play_entry(item.data(Qt.ItemDataRole.UserRole))
+                status.setText(item.text())
+            except (OSError, ValueError, MpvError):
+                status.setText(s["search_offline"])
+
+        query.textChanged.connect(fill) # Поиск быстрее миллисекунды — ищем на каждую букву
+        results.itemActivated.connect(play)
+        for w in [query, results, status]: layout.addWidget(w)
+        d.setLayout(layout); d.exec()
+
+    def start_preview(self):
+        match = PLAYLIST_ID_RE.search(self.url_input.text())
+        self.preview_id = match.group(1) if match else None
+        if not self.preview_id:
+            self.preview_label.clear()
+            return
+        self.preview_label.setText(STRINGS[self.lang]["preview_loading"])
+        if self.preview_id not in self.preview_running: # Этот плейлист уже тянется — дождемся его
+            self.preview_running.add(self.preview_id)
+            QThreadPool.globalInstance().start(PreviewTask(self.preview_id, self.preview_signals))
+
+    def show_preview(self, playlist_id, summary, final):
+        if final:
+            self.preview_running.discard(playlist_id)
+        if playlist_id != self.preview_id:
+            return # Ссылку успели поменять
+        s = STRINGS[self.lang]
+        if summary is None:
+            self.preview_label.setText(s["preview_error"])
+            return
+        if not summary["count"]:
+            self.preview_label.setText(s["preview_empty"])
+            return
+        minutes = int(summary["seconds"]) // 60
+        length = s["hours"].format(minutes // 60, minutes % 60) if minutes >= 60 else s["minutes"].format(minutes)
+        text = s["preview_summary"].format(summary["count"], length)
+        if summary["dead"]:
+            text += s["preview_dead"].format(summary["dead"])
+        titles = [t if len(t) <= 45 else t[:44] + "…" for t in summary["titles"]]
+        self.preview_label.setText(text + "\n" + "\n".join(f"{i}. {t}" for i, t in enumerate(titles, 1)))
+
     def pick_color(self, n, btn):
         color = QColorDialog.getColor()
         if color.isValid():
             if n == 1: self.color1 = color
             else: self.color2 = color
             btn.setText(f"Color {n}: {color.name()}"); self.save_custom_config()
+            self.update()
 
     def set_anim_speed(self, v, label):
         self.anim_speed = v; label.setText(f"Speed: {v}")
-        if v > 0: self.timer.start(16) if not self.timer.isActive() else None
-        else: self.timer.stop()
+        self.update_timer()
         self.save_custom_config()
 
     def update_vol_label(self, v): self.vol_text.setText(f"{STRINGS[self.lang]['vol_label']}: {v}%")
@@ -264,6 +504,7 @@ class ModernConfigApp(QWidget):
         s = STRINGS[self.lang]
         self.l_url.setText(s["url_label"])
         self.l_qual.setText(s["quality_label"])
+        self.l_buf.setText(s["buffer_label"])
         self.update_vol_label(self.vol_slider.value())
         self.shuffle_cb.setText(s["shuffle"])
         self.loop_cb.setText(s["loop"])
@@ -271,12 +512,18 @@ class ModernConfigApp(QWidget):
         self.gapless_cb.setText(s["gapless"])
         self.norm_cb.setText(s["loudnorm"])
         self.notify_cb.setText(s["notifications"]) # Добавь это!
+        self.cache_cb.setText(s["audio_cache"])
+        self.daemon_cb.setText(s["daemon_mode"])
+        self.vis_cb.setText(s["builtin_visualizer"])
+        self.resume_cb.setText(s["resume"])
         self.save_btn.setText(s["save"])
         self.custom_btn.setText(s["custom_btn"])
+        self.search_btn.setText(s["search_btn"])
 
     def change_lang(self, index): 
         self.lang = "ru" if index == 0 else "en"
         self.update_ui_text()
+        self.start_preview() # Свежий кэш читается с диска, в сеть снова не пойдем
 
     def load_settings(self):
         if os.path.exists(CONFIG_PATH):
@@ -287,21 +534,36 @@ class ModernConfigApp(QWidget):
                     self.lang_combo.setCurrentIndex(0 if self.lang == "ru" else 1)
                     self.url_input.setText(d.get("playlist_url", ""))
                     self.vol_slider.setValue(d.get("volume", 70))
-                    for cb, key in zip(self.cbs, ["shuffle", "loop", "prefetch", "gapless", "loudnorm", "allow_notifications"]):
-                        cb.setChecked(d.get(key, True))
+                    names = {v: k for k, v in self.quality_map.items()}
+                    self.quality_combo.setCurrentText(names.get(d.get("ytdl_format"), "Best"))
+                    self.buffer_combo.setCurrentText(d.get("buffer_profile", DEFAULT_PROFILE))
+                    for cb, key in zip(self.cbs, CB_KEYS):
+                        cb.setChecked(d.get(key, CB_DEFAULTS.get(key, True)))
             except: pass
 
     def save_settings(self):
-        match = re.search(r"list=([A-Za-z0-9_-]+)", self.url_input.text())
-        url = f"https://www.youtube.com/playlist?list={match.group(1)}" if match else self.url_input.text()
-        conf = {
-            "lang": self.lang, "playlist_url": url, "volume": self.vol_slider.value(),
+        match = PLAYLIST_ID_RE.search(self.url_input.text())
+        url = playlist_url(match.group(1)) if match else self.url_input.text()
+        # Ключи, которых нет в GUI (бюджет кэша и т.п.), не затираем
+        conf = {}
+        if os.path.exists(CONFIG_PATH):
+            try:
+                with open(CONFIG_PATH, 'r') as f: conf = json.load(f)
+            except: pass
+        conf.update({
+            "lang": self.lang, "playlist_url": url, "playlist_id": match.group(1) if match else "",
+            "volume": self.vol_slider.value(),
             "ytdl_format": self.quality_map[self.quality_combo.currentText()],
+            "buffer_profile": self.buffer_combo.currentText(),
             "allow_notifications": self.notify_cb.isChecked(),
             "shuffle": self.shuffle_cb.isChecked(), "loop": self.loop_cb.isChecked(),
-            "prefetch": self.prefetch_cb.isChecked(), "gapless": self.gapless_cb.isChecked(), "loudnorm": self.norm_cb.isChecked()
-        }
-        with open(CONFIG_PATH, 'w') as f: json.dump(conf, f, indent=4)
+            "prefetch": self.prefetch_cb.isChecked(), "gapless": self.gapless_cb.isChecked(), "loudnorm": self.norm_cb.isChecked(),
+            "audio_cache": self.cache_cb.isChecked(), "daemon_mode": self.daemon_cb.isChecked(),
+            "builtin_visualizer": self.vis_cb.isChecked(), "resume": self.resume_cb.isChecked()
+        })
+        # Через tmp + replace: запущенный плеер следит за файлом и не должен прочитать его наполовину
+        with open(CONFIG_PATH + ".tmp", 'w') as f: json.dump(conf, f, indent=4)
+        os.replace(CONFIG_PATH + ".tmp", CONFIG_PATH)
         self.save_btn.setText(STRINGS[self.lang]["saved_msg"])
 
 if __name__ == "__main__":
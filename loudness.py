@@ -0,0 +1,201 @@
+import os
+import json
+import queue
+import shutil
+import threading
+import subprocess
+from mpv_ipc import MpvError
+from playlist_cache import video_id_from_url
+
+try:
+    import numpy as np
+except ImportError:
+    np = None # Без numpy остается loudnorm в реальном времени
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(ROOT_DIR, "cache", "loudness.json")
+GAIN_LABEL = "plgain"
+GAIN_FILTER = f"@{GAIN_LABEL}:lavfi=[volume=volume=0dB]" # Статическое усиление, двигаем через af-command
+TARGET_LUFS = -14.0
+PEAK_CEILING_DB = -1.0   # Выше этого пика после усиления не поднимаем
+MAX_GAIN_DB = 12.0
+
+RATE = 48000
+BLOCK = RATE // 10       # 100 мс: из четырех таких собирается 400 мс блок BS.1770 с перекрытием 75%
+CHUNK_BLOCKS = 100       # Декодируем и считаем кусками по 10 с, память не растет с длиной трека
+ABS_GATE = -70.0
+REL_GATE = -10.0
+
+# K-фильтр BS.1770 для 48 кГц: high-shelf + RLB high-pass
+K_STAGES = [([1.53512485958697, -2.69169618940638, 1.19839281085285], [1.0, -1.69065929318241, 0.73248077421585]),
+            ([1.0, -2.0, 1.0], [1.0, -1.99004745483398, 0.99007225036621])]
+
+def available():
+    return np is not None and shutil.which("ffmpeg") is not None
+
+def k_weights(n=BLOCK):
+    """|H(f)|^2 K-фильтра на частотах rfft, сразу с множителями Парсеваля: sum(|X|^2 * w) = среднему квадрату блока"""
+    z = np.exp(-1j * np.pi * np.arange(n // 2 + 1) / (n // 2))
+    h = np.ones_like(z)
+    for b, a in K_STAGES:
+        h *= np.polyval(b[::-1], z) / np.polyval(a[::-1], z)
+    w = np.abs(h) ** 2 * 2 / (n * n)
+    w[0] /= 2
+    w[-1] /= 2
+    return w
+
+def block_powers(samples, weights):
+    """Средняя K-взвешенная мощность каждого 100 мс блока, суммированная по каналам. samples: (frames, channels)"""
+    n = len(samples) // BLOCK
+    blocks = samples[:n * BLOCK].reshape(n, BLOCK, samples.shape[1])
+    spec = np.fft.rfft(blocks, axis=1)
+    power = spec.real ** 2 + spec.imag ** 2
+    return np.einsum("bfc,f->b", power, weights)
+
+def integrated_loudness(powers):
+    """BS.1770: 400 мс блоки с шагом 100 мс, абсолютный гейт -70 LUFS, затем относительный -10 LU"""
+    if len(powers) < 4:
+        return None
+    z = np.convolve(powers, np.full(4, 0.25), mode="valid")
+    with np.errstate(divide="ignore"):
+        loud = -0.691 + 10 * np.log10(z)
+    z = z[loud > ABS_GATE]
+    if not len(z):
+        return None
+    rel = -0.691 + 10 * np.log10(z.mean()) + REL_GATE
+    z = z[-0.691 + 10 * np.log10(z) > rel]
+    return float(-0.691 + 10 * np.log10(z.mean())) if len(z) else None
+
+def analyze(source, headers=None, timeout=600):
+    """Декодирует источник ffmpeg'ом в f32 48 кГц и считает {"lufs", "peak_db"}"""
+    # Фоновая работа не должна мешать mpv. nice, а не preexec_fn: fork из многопоточного процесса
+    # с кодом Python в дочернем до exec может повиснуть на чужой блокировке
+    cmd = (["nice", "-n", "10"] if shutil.which("nice") else []) + ["ffmpeg", "-v", "error", "-nostdin"]
+    if headers:
+        cmd += ["-headers", "".join(f"{k}: {v}\r\n" for k, v in headers.items())]
+    cmd += ["-i", source, "-vn", "-ac", "2", "-ar", str(RATE), "-f", "f32le", "-"]
+    weights = k_weights()
+    chunk_bytes = CHUNK_BLOCKS * BLOCK * 2 * 4
+    powers, peak, tail = [], 0.0, b""
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            data = proc.stdout.read(chunk_bytes)
+            if not data:
+                break
+            data = tail + data
+            usable = len(data) - len(data) % (BLOCK * 8)
+            tail = data[usable:]
+            if not usable:
+                continue
+            samples = np.frombuffer(data, np.float32, usable // 4).reshape(-1, 2)
+            peak = max(peak, float(np.abs(samples).max()))
+            powers.append(block_powers(samples, weights))
+        proc.wait(timeout=timeout)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+    if proc.returncode != 0 or not powers:
+        return None
+    lufs = integrated_loudness(np.concatenate(powers))
+    if lufs is None:
+        return None
+    return {"lufs": round(lufs, 2), "peak_db": round(20 * np.log10(max(peak, 1e-9)), 2)}
+
+def gain_for(entry, target=TARGET_LUFS):
+    gain = target - entry["lufs"]
+    gain = min(gain, PEAK_CEILING_DB - entry["peak_db"], MAX_GAIN_DB) # Громче — только пока пик не упрется в потолок
+    return round(gain, 2)
+
+class LoudnessCache:
+    """video_id -> {"lufs", "peak_db"} в одном JSON. Значения не устаревают: громкость ролика не меняется."""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, video_id):
+        return self.data.get(video_id)
+
+    def put(self, video_id, entry):
+        with self._lock:
+            # Файл общий для всех зон: подхватываем, что посчитали они, иначе затрем их замеры своими
+            self.data = dict(self._load(), **self.data)
+            self.data[video_id] = entry
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.tmp{os.getpid()}"
+            with open(tmp, 'w') as f:
+                json.dump(self.data, f)
+            os.replace(tmp, self.path)
+
+    def typical_gain(self, target=TARGET_LUFS):
+        """Медианное усиление по уже известным трекам — для трека, который еще не посчитан"""
+        gains = sorted(gain_for(e, target) for e in list(self.data.values()))
+        return gains[len(gains) // 2] if gains else 0.0
+
+class LoudnessNormalizer:
+    """Считает громкость треков наперед в одном фоновом потоке и ставит статическое усиление при старте трека"""
+
+    def __init__(self, resolver, audio_cache=None, cache=None, target=TARGET_LUFS):
+        self.resolver = resolver
+        self.audio_cache = audio_cache
+        self.cache = cache or LoudnessCache()
+        self.target = target
+        self.client = None
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._failed = set() # Не смогли посчитать — до перезапуска больше не пробуем
+
+    def attach(self, client):
+        self.client = client
+        client.on_event("start-file", self._on_start_file)
+        threading.Thread(target=self._worker, daemon=True).start()
+        return self
+
+    def _on_start_file(self, _event):
+        vid = video_id_from_url(self.client.get_property("path", ""))
+        entry = self.cache.get(vid) if vid else None
+        gain = gain_for(entry, self.target) if entry else self.cache.typical_gain(self.target)
+        try:
+            self.client.command("af-command", GAIN_LABEL, "volume", f"{gain}dB")
+        except MpvError:
+            pass
+        for upcoming in ([vid] if vid else []) + self.resolver.upcoming_ids():
+            self.enqueue(upcoming)
+
+    def enqueue(self, video_id):
+        if (video_id and video_id not in self._queued and video_id not in self._failed
+                and self.cache.get(video_id) is None):
+            self._queued.add(video_id)
+            self._queue.put(video_id)
+
+    def _source(self, video_id):
+        # Уже скачанный трек читаем с диска, иначе берем прямую ссылку у резолвера
+        hit = self.audio_cache.lookup(video_id) if self.audio_cache else None
+        if hit:
+            return hit[0], None
+        entry = self.resolver.resolve(video_id)
+        return entry["url"], entry.get("headers")
+
+    def _worker(self):
+        while True:
+            vid = self._queue.get()
+            try:
+                source, headers = self._source(vid)
+                entry = analyze(source, headers)
+                if not entry:
+                    raise ValueError("no audio")
+                self.cache.put(vid, entry)
+            except Exception:
+                self._failed.add(vid) # Трек сыграет с типичным усилением
+            finally:
+                self._queued.discard(vid)
@@ -0,0 +1,267 @@
+import os
+import json
+import queue
+import socket
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+INSTANCE = os.environ.get("PLAYLIST_INSTANCE", "") # Имя зоны под супервизором; пусто — обычный одиночный плеер
+# Переопределяется для бенчмарка и тестовых стендов; у каждой зоны свой сокет, от него же — pid, FIFO и прочее рядом
+def socket_for(instance):
+    return "/tmp/mpv-socket" + (f"-{instance}" if instance else "")
+
+SOCKET_PATH = os.environ.get("PLAYLIST_SOCKET") or socket_for(INSTANCE)
+log = logging.getLogger(__name__)
+
+class MpvError(Exception):
+    """Ошибка, которую вернул mpv в ответ на команду (или обрыв соединения)"""
+
+def request(args, socket_path=SOCKET_PATH, timeout=1.0):
+    """Разовый запрос без постоянного клиента — для CLI-команд и проверки, жив ли плеер"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall((json.dumps({"command": list(args), "request_id": 1}) + "\n").encode())
+        buf = b""
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise MpvError("connection closed")
+            buf += chunk
+            while b"\n" in buf:
+                line, buf = buf.split(b"\n", 1)
+                msg = json.loads(line) if line.strip() else {}
+                if msg.get("request_id") == 1 and "event" not in msg:
+                    if msg.get("error", "success") != "success":
+                        raise MpvError(msg.get("error"))
+                    return msg.get("data")
+
+def is_alive(socket_path=SOCKET_PATH, timeout=0.5):
+    try:
+        request(["get_property", "pid"], socket_path, timeout)
+        return True
+    except (OSError, ValueError, MpvError):
+        return False
+
+class MpvClient:
+    """Одно долгоживущее соединение с JSON IPC сокетом mpv.
+
+    Команды отправляются с request_id и получают ответ через Future,
+    свойства отслеживаются через observe_property, события раздаются подписчикам.
+    При обрыве клиент сам переподключается и заново подписывается на свойства.
+    """
+
+    def __init__(self, socket_path=SOCKET_PATH, reconnect_delay=0.5, max_reconnect_delay=5.0):
+        self.socket_path = socket_path
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.connected = threading.Event()
+
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._next_id = 1
+        self._pending = {}      # request_id -> Future
+        self._observers = {}    # имя свойства -> [callback(name, value)]
+        self._observe_ids = {}  # имя свойства -> id для observe_property
+        self._events = {}       # имя события -> [callback(event)]
+        self._connect_handlers = []
+        self._closed = threading.Event()
+        self._dispatch_queue = queue.Queue()
+        self._threads = []
+
+    # --- Жизненный цикл ---
+
+    def start(self):
+        if self._threads:
+            return self
+        for target in (self._reader_loop, self._dispatch_loop):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def close(self):
+        self._closed.set()
+        self._drop_connection()
+        self._dispatch_queue.put(None)
+
+    def wait_connected(self, timeout=None):
+        return self.connected.wait(timeout)
+
+    # --- Подписки ---
+
+    def observe(self, name, callback):
+        """callback(name, value) вызывается при каждом изменении свойства"""
+        with self._state_lock:
+            first = name not in self._observers
+            self._observers.setdefault(name, []).append(callback)
+            if first:
+                self._observe_ids[name] = len(self._observe_ids) + 1
+            # Под тем же замком, под которым _connect подписывается заново: иначе подписка потеряется или удвоится
+            send_now = first and self.connected.is_set()
+        if send_now:
+            self._send(["observe_property", self._observe_ids[name], name])
+
+    def on_event(self, name, callback):
+        """callback(event) для событий mpv ("file-loaded", "end-file"...), "*" — все события"""
+        with self._state_lock:
+            self._events.setdefault(name, []).append(callback)
+
+    def on_connect(self, callback):
+        """callback() после каждого (пере)подключения — для hook-add и прочего состояния"""
+        with self._state_lock:
+            self._connect_handlers.append(callback)
+        if self.connected.is_set():
+            self._dispatch_queue.put((callback, ()))
+
+    # --- Команды ---
+
+    def command_async(self, *args):
+        fut = Future()
+        with self._state_lock:
+            request_id = self._next_id
+            self._next_id += 1
+            self._pending[request_id] = fut
+        try:
+            self._send(list(args), request_id)
+        except OSError as e:
+            with self._state_lock:
+                self._pending.pop(request_id, None)
+            fut.set_exception(MpvError(f"not connected: {e}"))
+        return fut
+
+    def command(self, *args, timeout=5.0):
+        try:
+            return self.command_async(*args).result(timeout)
+        except FutureTimeout:
+            raise MpvError(f"timeout: {args[0]}")
+
+    def get_property(self, name, default=None, timeout=5.0):
+        try:
+            return self.command("get_property", name, timeout=timeout)
+        except MpvError:
+            return default
+
+    def set_property(self, name, value, timeout=5.0):
+        return self.command("set_property", name, value, timeout=timeout)
+
+    # --- Внутренности ---
+
+    def _send(self, args, request_id=0):
+        payload = {"command": args}
+        if request_id:
+            payload["request_id"] = request_id
+        data = (json.dumps(payload) + "\n").encode()
+        with self._send_lock:
+            if self._sock is None:
+                raise OSError("socket is closed")
+            self._sock.sendall(data)
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        with self._send_lock:
+            self._sock = sock
+        # Подписки живут в mpv только пока живо соединение — восстанавливаем их до того, как объявить себя
+        # подключенными: иначе колбэки on_connect и чужие команды увидят mpv без подписок
+        try:
+            with self._state_lock:
+                for name, oid in self._observe_ids.items():
+                    self._send(["observe_property", oid, name])
+                self.connected.set()
+                handlers = list(self._connect_handlers)
+        except OSError:
+            self._drop_connection()
+            raise
+        for cb in handlers:
+            self._dispatch_queue.put((cb, ()))
+        return sock
+
+    def _drop_connection(self):
+        self.connected.clear()
+        with self._send_lock:
+            sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        with self._state_lock:
+            pending, self._pending = self._pending, {}
+        for fut in pending.values():
+            if not fut.done():
+                fut.set_exception(MpvError("connection lost"))
+
+    def _reader_loop(self):
+        delay = self.reconnect_delay
+        while not self._closed.is_set():
+            if not os.path.exists(self.socket_path):
+                self._closed.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+            try:
+                sock = self._connect()
+            except OSError:
+                self._closed.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+            delay = self.reconnect_delay
+            buf = b""
+            try:
+                while True:
+                    chunk = sock.recv(65536)
+                    if not chunk:
+                        break
+                    buf += chunk
+                    while b"\n" in buf:
+                        line, buf = buf.split(b"\n", 1)
+                        if line.strip():
+                            self._handle_line(line)
+            except OSError:
+                pass
+            self._drop_connection()
+
+    def _handle_line(self, line):
+        try:
+            msg = json.loads(line)
+        except ValueError:
+            return
+        event = msg.get("event")
+        if event is None:
+            with self._state_lock:
+                fut = self._pending.pop(msg.get("request_id", 0), None)
+            if fut is None or fut.done():
+                return
+            if msg.get("error", "success") == "success":
+                fut.set_result(msg.get("data"))
+            else:
+                fut.set_exception(MpvError(msg.get("error")))
+            return
+
+        with self._state_lock:
+            if event == "property-change":
+                callbacks = [(cb, (msg.get("name"), msg.get("data")))
+                             for cb in self._observers.get(msg.get("name"), [])]
+            else:
+                callbacks = [(cb, (msg,)) for cb in self._events.get(event, []) + self._events.get("*", [])]
+        for item in callbacks:
+            self._dispatch_queue.put(item)
+
+    def _dispatch_loop(self):
+        # Колбэки крутятся в отдельном потоке: внутри них можно спокойно звать command()
+        while True:
+            item = self._dispatch_queue.get()
+            if item is None:
+                return
+            cb, args = item
+            try:
+                cb(*args)
+            except Exception:
+                log.exception("mpv callback %r failed", cb) # Один упавший подписчик не должен останавливать остальных
@@ -0,0 +1,127 @@
+import os
+import time
+import threading
+import subprocess
+import urllib.request
+from audio_cache import enforce_budget
+
+try:
+    from jeepney import DBusAddress, new_method_call
+    from jeepney.io.blocking import open_dbus_connection
+    from jeepney.wrappers import unwrap_msg
+except ImportError:
+    open_dbus_connection = None # Без jeepney остается notify-send
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+THUMB_DIR = os.path.join(ROOT_DIR, "cache", "thumbs")
+THUMB_URL = "https://i.ytimg.com/vi/{}/mqdefault.jpg" # 320x180, ~15 КБ
+THUMB_BUDGET_MB = 16
+APP_NAME = "Playlist Player"
+DEFAULT_ICON = "audio-speakers"
+DEBOUNCE = 0.8 # Пока треки листают быстрее, показываем только тот, на котором остановились
+
+if open_dbus_connection:
+    NOTIFICATIONS = DBusAddress("/org/freedesktop/Notifications", bus_name="org.freedesktop.Notifications",
+                                interface="org.freedesktop.Notifications")
+
+class ThumbnailCache:
+    """Обложки треков на диске, по файлу на video ID, с LRU-чисткой по бюджету"""
+
+    def __init__(self, cache_dir=THUMB_DIR, budget_mb=THUMB_BUDGET_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(budget_mb) * 1024 * 1024
+
+    def get(self, video_id, timeout=5):
+        """Путь к обложке или None. Нет на диске — скачиваем."""
+        if not video_id:
+            return None
+        path = os.path.join(self.cache_dir, video_id + ".jpg")
+        if os.path.exists(path):
+            try:
+                os.utime(path) # Для LRU
+            except OSError:
+                pass
+            return path
+        try:
+            with urllib.request.urlopen(THUMB_URL.format(video_id), timeout=timeout) as r:
+                data = r.read()
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f"{path}.tmp{os.getpid()}" # Каталог общий для зон: одну обложку могут качать двое сразу
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except (OSError, ValueError):
+            return None
+        enforce_budget(self.cache_dir, self.max_bytes, keep={video_id})
+        return path
+
+class Notifier:
+    """Одно уведомление на сессию: каждое следующее заменяет предыдущее (replaces_id),
+    а не ложится стопкой. Через одно соединение с сессионной шиной; bus — адрес для своей dbus-daemon."""
+
+    def __init__(self, bus="SESSION", thumbs=None, debounce=DEBOUNCE):
+        self.bus = bus
+        self.thumbs = thumbs or ThumbnailCache()
+        self.debounce = debounce
+        self.conn = None
+        self.notification_id = 0
+        self._pending = None
+        self._changed = 0.0
+        self._cond = threading.Condition()
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def show(self, summary, body, video_id=None):
+        with self._cond:
+            self._pending = (summary, body, video_id)
+            self._changed = time.monotonic()
+            self._cond.notify()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                # Ждем, пока трек не простоит debounce секунд без смены
+                while True:
+                    left = self._changed + self.debounce - time.monotonic()
+                    if left <= 0:
+                        break
+                    self._cond.wait(left)
+                summary, body, video_id = self._pending
+                self._pending = None
+            self._send(summary, body, self.thumbs.get(video_id))
+
+    def _send(self, summary, body, image):
+        if open_dbus_connection:
+            try:
+                self._send_dbus(summary, body, image)
+                return
+            except Exception:
+                self._close() # Шина отвалилась — переподключимся на следующем уведомлении
+        self._send_cli(summary, body, image)
+
+    def _send_dbus(self, summary, body, image):
+        if self.conn is None:
+            self.conn = open_dbus_connection(bus=self.bus)
+        hints = {"image-path": ("s", image)} if image else {}
+        msg = new_method_call(NOTIFICATIONS, "Notify", "susssasa{sv}i",
+                              (APP_NAME, self.notification_id, DEFAULT_ICON, summary, body, [], hints, -1))
+        self.notification_id = unwrap_msg(self.conn.send_and_get_reply(msg, timeout=5))[0]
+
+    def _send_cli(self, summary, body, image):
+        cmd = ["notify-send", "-i", image or DEFAULT_ICON, "-p"]
+        if self.notification_id:
+            cmd += ["-r", str(self.notification_id)]
+        try:
+            out = subprocess.run(cmd + [summary, body], capture_output=True, text=True, timeout=5).stdout
+            self.notification_id = int(out.strip() or 0)
+        except (OSError, ValueError, subprocess.SubprocessError):
+            pass
+
+    def _close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except OSError:
+                pass
+        self.conn = None
@@ -0,0 +1,159 @@
+import os
+import json
+import threading
+from mpv_ipc import INSTANCE
+from audio_cache import DEFAULT_BUDGET_MB
+from adaptive_quality import resolve_format
+from buffer_profiles import PROFILES, DEFAULT_PROFILE
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(ROOT_DIR, "configs", "config.json")
+
+# Все ключи конфига с типами и значениями по умолчанию. Чего нет в файле или что битое — берем отсюда.
+DEFAULTS = {
+    "lang": "", "playlist_url": "", "playlist_id": "",
+    "volume": 70, "ytdl_format": "bestaudio",
+    "shuffle": False, "loop": False, "prefetch": False, "gapless": False, "loudnorm": False,
+    "allow_notifications": True, "audio_cache": False, "daemon_mode": False, "telemetry": True,
+    "audio_cache_mb": DEFAULT_BUDGET_MB, "resolver_lookahead": 3, "resolver_workers": 2, "metrics_dir": "",
+    "buffer_profile": DEFAULT_PROFILE, "buffer_budget_mb": 0,
+    "builtin_visualizer": False, "visualizer_fps": 30,
+    "shuffle_seed": 0, "shuffle_horizon": 100, # seed 0 — новый случайный порядок на каждый запуск
+    "resume": True,
+    "audio_device": "", # Пусто — выход mpv по умолчанию; у зон супервизора обычно свой
+    "control_api": "",  # Пусто — выключен; "unix", "unix:/путь" или "8765" (только 127.0.0.1)
+    "health_check": True, "health_workers": 2,
+    "watchdog": True,
+}
+LIMITS = {"volume": (0, 100), "audio_cache_mb": (64, 1 << 20), "resolver_lookahead": (0, 20), "resolver_workers": (1, 8),
+          "buffer_budget_mb": (0, 4096), "visualizer_fps": (5, 60), "health_workers": (1, 8),
+          "shuffle_seed": (0, 2 ** 31), "shuffle_horizon": (0, 10000)} # 0 — бюджет из профиля
+CHOICES = {"buffer_profile": PROFILES}
+
+# Что меняется в живом mpv по IPC: ключ -> (свойство, функция значения)
+LIVE_PROPS = {
+    "volume": ("volume", lambda v: v),
+    "shuffle": ("shuffle", lambda v: "yes" if v else "no"), # Для плейлистов, загруженных позже
+    "loop": ("loop-playlist", lambda v: "inf" if v else "no"),
+    "gapless": ("gapless-audio", lambda v: "yes" if v else "no"),
+    "prefetch": ("prefetch-playlist", lambda v: "yes" if v else "no"),
+    "ytdl_format": ("ytdl-format", resolve_format),
+    "audio_device": ("audio-device", lambda v: v or "auto"),
+}
+# Что нужно только фоновому процессу — его и перезапускаем, mpv играет дальше
+HELPER_KEYS = {"audio_cache", "audio_cache_mb", "resolver_lookahead", "resolver_workers", "telemetry", "metrics_dir", "control_api",
+               "health_check", "health_workers", "watchdog"}
+# Другой плейлист — это новый loadfile, остальное (lang, daemon_mode) влияет только на следующий запуск
+PLAYLIST_KEYS = {"playlist_url", "playlist_id"}
+# От этого зависят лимиты кэша демуксера (prefetch делит бюджет на два демуксера)
+BUFFER_KEYS = {"buffer_profile", "buffer_budget_mb", "prefetch"}
+# При своем перемешивании этим управляет планировщик в фоновом процессе, а не свойства mpv
+SCHEDULER_KEYS = {"shuffle", "loop", "shuffle_seed", "shuffle_horizon"}
+LOUDNORM_FILTER = "@loudnorm:loudnorm"
+
+def validate(raw):
+    """Приводит сырой JSON к DEFAULTS: неверные типы откатываются, числа зажимаются в LIMITS"""
+    conf = dict(DEFAULTS)
+    if not isinstance(raw, dict):
+        return conf
+    for key, default in DEFAULTS.items():
+        value = raw.get(key, default)
+        if isinstance(default, bool):
+            value = value if isinstance(value, bool) else default
+        elif isinstance(default, int):
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                value = default
+            lo, hi = LIMITS.get(key, (value, value))
+            value = max(lo, min(value, hi))
+        elif not isinstance(value, str) or (key in CHOICES and value not in CHOICES[key]):
+            value = default
+        conf[key] = value
+    # Ключи, о которых мы не знаем (ручные правки, новые версии), не теряем
+    for key, value in raw.items():
+        conf.setdefault(key, value)
+    return conf
+
+def instance_path(path):
+    """Файл состояния своей зоны: session.json -> session-kitchen.json. Кэши плейлистов и потоков общие."""
+    if not INSTANCE:
+        return path
+    base, ext = os.path.splitext(path)
+    return f"{base}-{INSTANCE}{ext}"
+
+def instance_section(raw, name=INSTANCE):
+    """Конфиг зоны: общие ключи, поверх — ее секция из "instances" """
+    if not name or not isinstance(raw, dict):
+        return raw
+    section = (raw.get("instances") or {}).get(name)
+    return dict(raw, **section) if isinstance(section, dict) else raw
+
+def diff(old, new):
+    return {k for k in set(old) | set(new) if old.get(k) != new.get(k)}
+
+class ConfigStore:
+    """Один закэшированный конфиг на процесс; файл перечитывается, только если сменился mtime/размер"""
+
+    def __init__(self, path=CONFIG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._conf = None
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def get(self):
+        """Текущий конфиг. Каждый перечитанный файл — новый dict, старые копии не меняются."""
+        with self._lock:
+            stamp = self._file_stamp()
+            if self._conf is not None and stamp == self._stamp:
+                return self._conf
+            raw = {}
+            if stamp is not None:
+                try:
+                    with open(self.path, 'r') as f:
+                        raw = json.load(f)
+                except (OSError, ValueError):
+                    if self._conf is not None:
+                        return self._conf # GUI дописывает файл прямо сейчас — подождем следующего раза
+            self._conf, self._stamp = validate(instance_section(raw)), stamp
+            return self._conf
+
+class ConfigWatcher:
+    """Опрос mtime раз в interval секунд; on_change(old, new, changed_keys) зовется из своего потока"""
+
+    def __init__(self, store, on_change, interval=1.0):
+        self.store = store
+        self.on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._last = None
+
+    def start(self):
+        self._last = self.store.get()
+        threading.Thread(target=self._loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            new = self.store.get()
+            if new is self._last:
+                continue
+            old, self._last = self._last, new
+            keys = diff(old, new)
+            if keys:
+                self.on_change(old, new, keys)
+
+CONFIG = ConfigStore()
+
+def load_config():
+    return CONFIG.get()
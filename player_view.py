@@ -0,0 +1,88 @@
+import curses
+import subprocess
+from mpv_ipc import MpvClient, MpvError, SOCKET_PATH
+
+LABELS = {
+    "ru": {"waiting": "Ожидание плеера...", "paused": "ПАУЗА", "volume": "Громкость", "track": "Трек",
+           "keys": "[пробел] пауза  [n/p] след/пред  [←/→] перемотка  [↑/↓] громкость  [q] свернуть  [Q] стоп"},
+    "en": {"waiting": "Waiting for player...", "paused": "PAUSED", "volume": "Volume", "track": "Track",
+           "keys": "[space] pause  [n/p] next/prev  [←/→] seek  [↑/↓] volume  [q] detach  [Q] stop"},
+}
+WATCHED = ["media-title", "pause", "volume", "playlist-pos", "playlist-count", "duration"]
+
+def fmt_time(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}" if seconds >= 3600 else f"{seconds // 60}:{seconds % 60:02d}"
+
+class PlayerView:
+    """Тонкий пульт в панели tmux: показывает, что играет, и шлет команды по IPC.
+    Сам mpv при этом крутится отдельно и не зависит от того, открыт ли пульт."""
+
+    def __init__(self, lang="en", socket_path=SOCKET_PATH):
+        self.text = LABELS.get(lang, LABELS["en"])
+        self.client = MpvClient(socket_path)
+        self.state = {}
+        for prop in WATCHED:
+            self.client.observe(prop, self._on_change)
+
+    def _on_change(self, name, value):
+        self.state[name] = value
+
+    def send(self, *args):
+        try:
+            self.client.command(*args, timeout=1.0)
+        except MpvError:
+            pass
+
+    def handle_key(self, key):
+        if key == ord(" "): self.send("cycle", "pause")
+        elif key in (ord("n"), ord(">")): self.send("playlist-next")
+        elif key in (ord("p"), ord("<")): self.send("playlist-prev")
+        elif key == curses.KEY_RIGHT: self.send("seek", 10)
+        elif key == curses.KEY_LEFT: self.send("seek", -10)
+        elif key == curses.KEY_UP: self.send("add", "volume", 5)
+        elif key == curses.KEY_DOWN: self.send("add", "volume", -5)
+        elif key == ord("Q"): self.send("quit")
+        elif key == ord("q"):
+            subprocess.run(["tmux", "detach-client"], capture_output=True)
+
+    def draw(self, scr):
+        scr.erase()
+        h, w = scr.getmaxyx()
+        s = self.state
+        def put(y, text, attr=0):
+            if 0 <= y < h:
+                scr.addnstr(y, 1, text, max(w - 2, 0), attr)
+        if not self.client.connected.is_set():
+            put(1, self.text["waiting"])
+        else:
+            put(1, s.get("media-title") or "", curses.A_BOLD)
+            pos = self.client.get_property("time-pos", timeout=0.5)
+            status = f"{fmt_time(pos)} / {fmt_time(s.get('duration'))}"
+            if s.get("pause"):
+                status += f"   {self.text['paused']}"
+            put(2, status)
+            track = (s.get("playlist-pos") or 0) + 1
+            put(3, f"{self.text['track']}: {track}/{s.get('playlist-count') or 0}   {self.text['volume']}: {int(s.get('volume') or 0)}%")
+        put(h - 1, self.text["keys"], curses.A_DIM)
+        scr.refresh()
+
+    def loop(self, scr):
+        curses.curs_set(0)
+        scr.timeout(1000) # Время на экране обновляем раз в секунду, остальное — по событиям
+        self.client.start()
+        while True:
+            self.draw(scr)
+            key = scr.getch()
+            if key != -1:
+                self.handle_key(key)
+
+    def run(self):
+        try:
+            curses.wrapper(self.loop)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.client.close()
@@ -0,0 +1,143 @@
+import os
+import re
+import json
+import time
+import threading
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(ROOT_DIR, "cache", "playlists")
+
+PLAYLIST_ID_RE = re.compile(r"list=([A-Za-z0-9_-]+)")
+VIDEO_ID_RE = re.compile(r"(?:v=|youtu\.be/|/shorts/)([A-Za-z0-9_-]{11})")
+DEFAULT_TTL = 6 * 3600  # Через сколько секунд кэш считается устаревшим
+HEAD_SIZE = 100         # Сколько первых записей сверяем при инкрементальной проверке
+
+def playlist_id_from_url(url):
+    match = PLAYLIST_ID_RE.search(url or "")
+    return match.group(1) if match else None
+
+def playlist_url(playlist_id):
+    return f"https://www.youtube.com/playlist?list={playlist_id}"
+
+def video_id_from_url(url):
+    match = VIDEO_ID_RE.search(url or "")
+    return match.group(1) if match else None
+
+def video_url(video_id):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+def _entry(raw):
+    return {
+        "id": raw.get("id"),
+        "title": raw.get("title") or "",
+        "duration": raw.get("duration"),
+        "uploader": raw.get("uploader") or raw.get("channel") or "",
+    }
+
+def extract_flat(url, start=None, end=None, timeout=300):
+    """Плоское извлечение плейлиста через yt-dlp (без резолва самих потоков)"""
+    cmd = ["yt-dlp", "--flat-playlist", "-J", "--no-warnings"]
+    if start: cmd += ["--playlist-start", str(start)]
+    if end: cmd += ["--playlist-end", str(end)]
+    cmd.append(url)
+    out = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout, check=True).stdout
+    info = json.loads(out)
+    entries = [_entry(e) for e in info.get("entries") or [] if e and e.get("id")]
+    return {"title": info.get("title") or "", "count": info.get("playlist_count"), "entries": entries}
+
+def stream_flat(url, timeout=600):
+    """То же плоское извлечение, но записи отдаются по мере того, как yt-dlp их получает (постранично).
+    Выдает (запись, название плейлиста)."""
+    cmd = ["yt-dlp", "--flat-playlist", "--lazy-playlist", "-j", "--no-warnings", url]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    deadline = time.time() + timeout
+    # Зависший yt-dlp может молчать совсем, и чтение строки не вернется — по сроку его просто убиваем
+    killer = threading.Timer(timeout, proc.kill)
+    killer.daemon = True
+    killer.start()
+    try:
+        for line in proc.stdout:
+            try:
+                raw = json.loads(line)
+            except ValueError:
+                continue
+            if raw.get("id"):
+                yield _entry(raw), raw.get("playlist_title") or ""
+            if time.time() > deadline:
+                raise subprocess.TimeoutExpired(cmd, timeout)
+        if time.time() > deadline:
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        if proc.wait(timeout=30) != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+    finally:
+        killer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+
+class PlaylistCache:
+    """Кэш плоского содержимого плейлистов на диске: id, названия и длительности"""
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl=DEFAULT_TTL):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def path(self, playlist_id):
+        return os.path.join(self.cache_dir, f"{playlist_id}.json")
+
+    def m3u_path(self, playlist_id):
+        return os.path.join(self.cache_dir, f"{playlist_id}.m3u")
+
+    def load(self, playlist_id):
+        try:
+            with open(self.path(playlist_id), 'r') as f:
+                data = json.load(f)
+            return data if isinstance(data.get("entries"), list) else None
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, data):
+        return bool(data) and time.time() - data.get("fetched_at", 0) < self.ttl
+
+    def save(self, playlist_id, data):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        data["fetched_at"] = time.time()
+        _atomic_write(self.path(playlist_id), json.dumps(data, ensure_ascii=False))
+        self.write_m3u(playlist_id, data["entries"])
+        return data
+
+    def write_m3u(self, playlist_id, entries, path=None):
+        """Готовый локальный плейлист для mpv, чтобы не ждать извлечения на старте"""
+        lines = ["#EXTM3U"]
+        for e in entries:
+            title = e.get("title", "").replace("\n", " ")
+            lines.append(f"#EXTINF:{int(e.get('duration') or -1)},{title}")
+            lines.append(video_url(e["id"]))
+        path = path or self.m3u_path(playlist_id)
+        _atomic_write(path, "\n".join(lines) + "\n")
+        return path
+
+    def refresh(self, playlist_id, extract=extract_flat):
+        """Обновляет кэш. Если начало плейлиста не поменялось — докачивает только хвост."""
+        url = playlist_url(playlist_id)
+        cached = self.load(playlist_id)
+        if cached and cached["entries"]:
+            old = cached["entries"]
+            head = extract(url, end=HEAD_SIZE)
+            same_head = [e["id"] for e in head["entries"]] == [e["id"] for e in old[:HEAD_SIZE]]
+            count = head["count"]
+            if same_head and count is not None and count >= len(old):
+                entries = head["entries"] + old[len(head["entries"]):]
+                if count > len(old):
+                    tail = extract(url, start=len(old) + 1)
+                    entries += tail["entries"]
+                return self.save(playlist_id, {"id": playlist_id, "title": head["title"] or cached.get("title", ""), "entries": entries})
+        full = extract(url)
+        return self.save(playlist_id, {"id": playlist_id, "title": full["title"], "entries": full["entries"]})
+
+def _atomic_write(path, text):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
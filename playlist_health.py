@@ -0,0 +1,251 @@
+import os
+import re
+import json
+import heapq
+import time
+import itertools
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from mpv_ipc import MpvError
+from playlist_cache import PlaylistCache, video_id_from_url, video_url
+
+try:
+    import yt_dlp
+except ImportError:
+    yt_dlp = None
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+HEALTH_PATH = os.path.join(ROOT_DIR, "cache", "health.json") # Общий для всех зон: видео умирает для всех сразу
+OK_TTL = 3 * 86400        # Рабочее видео перепроверяем раз в столько
+FORGET_AFTER = 30 * 86400 # Записи, которые давно никто не проверял, выкидываем из файла
+SAVE_EVERY = 20           # Сколько новых результатов копим перед записью на диск
+SCAN_INTERVAL = 600       # Как часто проходим по кэшу плейлиста в поисках того, что пора проверить
+LOOKAHEAD = 20            # Столько ближайших треков mpv проверяем вне очереди
+PROBE_PAUSE = 1.0         # Пауза потока между проверками — не долбим YouTube подряд
+# Плоский список сам выдает часть мертвых записей — их и проверять не надо
+DEAD_TITLES = {"[Private video]": "removed", "[Deleted video]": "removed"}
+# Сообщения yt-dlp -> (причина, через сколько секунд перепроверить). Чего здесь нет (сеть, 5xx) — не записываем вовсе
+FAILURES = [
+    (re.compile(r"private video|has been removed|account .*terminated|no longer available|does not exist", re.I), "removed", 7 * 86400),
+    (re.compile(r"in your country|geo.?restrict|not available from your location", re.I), "region", 86400),
+    (re.compile(r"members.only|join this channel|confirm your age|age.restricted|inappropriate", re.I), "restricted", 86400),
+    (re.compile(r"premieres in|live event will begin|video unavailable", re.I), "unavailable", 6 * 3600),
+]
+BAD_TTL = {reason: ttl for _re, reason, ttl in FAILURES}
+
+def classify(message):
+    """(причина, срок) для ошибки yt-dlp или None, если это не про само видео"""
+    for pattern, reason, ttl in FAILURES:
+        if pattern.search(message or ""):
+            return reason, ttl
+    return None
+
+class HealthCache:
+    """cache/health.json: video_id -> {"ok", "checked", "retry" (для плохих), "reason"}"""
+
+    def __init__(self, path=HEALTH_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = self._load()
+        self._dirty = 0
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def is_bad(self, video_id, now=None):
+        r = self._records.get(video_id)
+        return bool(r) and not r.get("ok") and r.get("retry", 0) > (now or time.time())
+
+    def playable(self, entries, fallback=False):
+        """Записи без известных мертвых. Плоский список заодно отдает приватные и удаленные по названию.
+        fallback — если отсеялось все, вернуть список как есть: пусть mpv споткнется сам, чем не сыграет ничего."""
+        now = time.time()
+        alive = [e for e in entries if e.get("title") not in DEAD_TITLES and not self.is_bad(e["id"], now)]
+        return alive if alive or not fallback else list(entries)
+
+    def due(self, video_id, now=None):
+        """Пора ли (пере)проверять"""
+        r = self._records.get(video_id)
+        now = now or time.time()
+        if not r:
+            return True
+        return r.get("retry", 0) <= now if not r.get("ok") else now - r.get("checked", 0) > OK_TTL
+
+    def record(self, video_id, failure=None):
+        now = time.time()
+        rec = {"ok": failure is None, "checked": now}
+        if failure:
+            rec["reason"], rec["retry"] = failure[0], now + failure[1]
+        with self._lock:
+            self._records[video_id] = rec
+            self._dirty += 1
+            if self._dirty >= SAVE_EVERY:
+                self._save()
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def _save(self):
+        # Файл общий с другими зонами: сливаем с тем, что на диске, берем более свежую проверку
+        now = time.time()
+        merged = self._load()
+        for vid, rec in self._records.items():
+            if rec.get("checked", 0) >= merged.get(vid, {}).get("checked", 0):
+                merged[vid] = rec
+        self._records = {v: r for v, r in merged.items() if now - r.get("checked", 0) < FORGET_AFTER}
+        self._dirty = 0
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(f"{self.path}.tmp{os.getpid()}", 'w') as f:
+                json.dump(self._records, f)
+            os.replace(f"{self.path}.tmp{os.getpid()}", self.path)
+        except OSError:
+            pass
+
+class HealthChecker:
+    """В фоновом процессе: проверяет записи плейлиста пулом из workers потоков и убирает мертвые из mpv,
+    пока тот до них не дошел. Ближайшие треки идут вне очереди, остальные — фоном по кэшу плейлиста."""
+
+    def __init__(self, conf, health=None, workers=2, cache=None):
+        self.pid = conf.get('playlist_id')
+        self.health = health or HealthCache()
+        self.cache = cache or PlaylistCache()
+        self.client = None
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._heap = []       # (приоритет, порядковый номер, video_id); 0 — ближайшие в mpv, 1 — фоновый обход
+        self._queued = {}     # video_id -> приоритет, с которым ждет
+        self._seq = itertools.count()
+        self._local = threading.local()
+
+    def attach(self, client):
+        self.client = client
+        client.observe("playlist-pos", lambda _n, _v: self._on_pos())
+        client.on_event("end-file", self._on_end_file)
+        threading.Thread(target=self._scan_loop, daemon=True).start()
+        return self
+
+    # --- Очередь ---
+
+    def enqueue(self, video_ids, priority=1, force=False):
+        now = time.time()
+        with self._lock:
+            for vid in video_ids:
+                if not vid or self._queued.get(vid, priority + 1) <= priority or not (force or self.health.due(vid, now)):
+                    continue
+                # Уже ждет в фоновом обходе, а теперь понадобился скоро — кладем еще раз, старую копию _work пропустит
+                self._queued[vid] = priority
+                heapq.heappush(self._heap, (priority, next(self._seq), vid))
+                # Задача пула не привязана к видео: берет лучшее из кучи на момент запуска
+                self._pool.submit(self._work)
+
+    def _work(self):
+        with self._lock:
+            while self._heap:
+                prio, _n, vid = heapq.heappop(self._heap)
+                if self._queued.get(vid) == prio:
+                    break
+            else:
+                return
+        try:
+            failure = self.probe(vid)
+        except Exception:
+            failure = False # Сеть, таймаут — про само видео ничего не узнали
+        finally:
+            with self._lock:
+                self._queued.pop(vid, None)
+        if failure is not False:
+            self.health.record(vid, failure)
+            if failure:
+                self.prune()
+        time.sleep(PROBE_PAUSE)
+
+    def _scan_loop(self):
+        while True:
+            data = self.cache.load(self.pid) if self.pid else None
+            if data:
+                for e in data["entries"]:
+                    if e.get("title") in DEAD_TITLES and self.health.due(e["id"]):
+                        self.health.record(e["id"], (DEAD_TITLES[e["title"]], BAD_TTL[DEAD_TITLES[e["title"]]]))
+                self.enqueue([e["id"] for e in data["entries"]])
+            self.health.flush()
+            time.sleep(SCAN_INTERVAL)
+
+    # --- Проверка ---
+
+    def probe(self, video_id):
+        """None — видео играется, (причина, срок) — нет; исключение — проверить не удалось"""
+        if yt_dlp is not None:
+            ydl = getattr(self._local, "ydl", None)
+            if ydl is None:
+                ydl = self._local.ydl = yt_dlp.YoutubeDL({"format": "bestaudio/best", "quiet": True, "no_warnings": True,
+                                                          "noplaylist": True, "skip_download": True})
+            try:
+                ydl.extract_info(video_url(video_id), download=False)
+                return None
+            except yt_dlp.utils.DownloadError as e:
+                message = str(e)
+        else:
+            proc = subprocess.run(["yt-dlp", "--simulate", "--no-playlist", "--no-warnings", "-f", "bestaudio/best",
+                                   video_url(video_id)], capture_output=True, text=True, timeout=120)
+            if proc.returncode == 0:
+                return None
+            message = proc.stderr
+        failure = classify(message)
+        if failure is None:
+            raise RuntimeError(message.strip())
+        return failure
+
+    # --- Связка с mpv ---
+
+    def _on_pos(self):
+        # Не в пуле: там может стоять весь плейлист, а ближайшие треки ждать не должны
+        threading.Thread(target=self._check_upcoming, daemon=True).start()
+
+    def _check_upcoming(self):
+        try:
+            pos = self.client.get_property("playlist-pos", -1)
+            count = self.client.get_property("playlist-count", 0) or 0
+            if pos is None or pos < 0:
+                return
+            ids = [video_id_from_url(self.client.get_property(f"playlist/{(pos + i) % count}/filename", ""))
+                   for i in range(1, min(LOOKAHEAD, count - 1) + 1)]
+        except MpvError:
+            return
+        self.enqueue(ids, priority=0)
+        self.prune()
+
+    def _on_end_file(self, event):
+        # mpv уже споткнулся об эту запись — выясняем почему, пока он не пришел к ней снова (loop)
+        if event.get("reason") == "error":
+            threading.Thread(target=self._check_failed, args=(event.get("playlist_entry_id"),), daemon=True).start()
+
+    def _check_failed(self, entry_id):
+        try:
+            entries = self.client.get_property("playlist") or []
+        except MpvError:
+            return
+        vid = next((video_id_from_url(e.get("filename", "")) for e in entries if e.get("id") == entry_id), None)
+        if vid and not self.health.is_bad(vid):
+            # Сама ошибка mpv еще ничего не значит (сеть, протухшая ссылка) — отметит только проверка
+            self.enqueue([vid], priority=0, force=True)
+
+    def prune(self):
+        """Убирает из плейлиста mpv все известные мертвые записи, кроме той, что играет сейчас"""
+        try:
+            entries = self.client.get_property("playlist") or []
+            now = time.time()
+            bad = [i for i, e in enumerate(entries)
+                   if not e.get("current") and self.health.is_bad(video_id_from_url(e.get("filename", "")), now)]
+            for i in reversed(bad): # С конца, чтобы номера еще не удаленных не съезжали
+                self.client.command("playlist-remove", i)
+        except MpvError:
+            pass
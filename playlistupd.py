@@ -1,20 +1,32 @@
 import os
+import sys
 import shutil
 import urllib.request
+import urllib.parse
+import http.client
+import threading
 import hashlib
 import locale
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 # Конфигурация путей
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_DIR = os.path.join(ROOT_DIR, "configs")
 TMP_DIR = "/tmp/playlist_update_check"
 GITHUB_RAW_URL = "https://raw.githubusercontent.com/andrew1284prod/playlistplayer/main/"
+# Можно подменить адрес (локальный сервер, зеркало)
+UPDATE_URL = os.environ.get("PLAYLISTUPD_URL", GITHUB_RAW_URL)
+STAGING_DIR = os.path.join(ROOT_DIR, ".update_staging") # Та же ФС, что и у плеера — os.replace атомарен
+PENDING_PATH = os.path.join(STAGING_DIR, "pending.json") # Журнал установки: есть — набор поставлен не до конца
+SELF_FILE = "playlistupd.py"
+BOOTSTRAP_ENV = "PLAYLISTUPD_BOOTSTRAPPED" # Нас уже перезапустил старый апдейтер, пользователь согласился
+MAX_PARALLEL = 4
 
 # Файлы
 VERSION_FILE = "version.json"
 LOCAL_VERSION_PATH = os.path.join(ROOT_DIR, VERSION_FILE)
-FILES_TO_CHECK = ["gui_config.py", "run_mpv.py", "playlistupd.py", "version.json"]
+FILES_TO_CHECK = ["gui_config.py", "run_mpv.py", "mpv_ipc.py", "playlist_cache.py", "stream_resolver.py", "audio_cache.py", "telemetry.py", "player_view.py", "player_config.py", "adaptive_quality.py", "buffer_profiles.py", "visualizer.py", "loudness.py", "shuffle_scheduler.py", "session_state.py", "notifier.py", "search_index.py", "supervisor.py", "control_api.py", "playlist_health.py", "watchdog.py", "playlistupd.py", "version.json"]
 
 def get_sys_lang():
     try:
@@ -41,7 +53,15 @@ MSG = {
         "alias_player": "Введите команду для запуска ПЛЕЕРА (по умолчанию playlist): ",
         "alias_config": "Введите команду для запуска КОНФИГУРАТОРА (по умолчанию playlistconfig): ",
         "alias_update": "Введите команду для запуска ОБНОВЛЕНИЯ (по умолчанию playlistupd): ",
-        "alias_done": "[Успех] Алиасы успешно обновлены в {}!"
+        "alias_done": "[Успех] Алиасы успешно обновлены в {}!",
+        "up_to_date": "[Информация] Все файлы совпадают с манифестом (v{}).",
+        "diff_found": "[Информация] Версии совпадают, но изменено файлов: {}. Восстановить? (y/n): ",
+        "downloading": "[Обновление] Загрузка {} файлов ({} КБ)...",
+        "bad_hash": "[Ошибка] Файл {} не совпал с манифестом. Обновление отменено, ничего не изменено.",
+        "manifest_done": "[Успех] Манифест записан в {} ({} файлов).",
+        "bootstrap": "[Обновление] Сначала обновляем сам апдейтер и передаем работу ему...",
+        "resume": "[Обновление] Прошлое обновление прервали — доустанавливаем файлов: {}...",
+        "error_resume": "[Ошибка] Не удалось доустановить прерванное обновление: {}"
     },
     "en": {
         "ver_check": "[Info] Comparing local version with repository...",
@@ -59,7 +79,15 @@ MSG = {
         "alias_player": "Enter alias for PLAYER (default: playlist): ",
         "alias_config": "Enter alias for CONFIGURATOR (default: playlistconfig): ",
         "alias_update": "Enter alias for UPDATE (default: playlistupd): ",
-        "alias_done": "[Success] Aliases successfully updated in {}!"
+        "alias_done": "[Success] Aliases successfully updated in {}!",
+        "up_to_date": "[Info] All files match the manifest (v{}).",
+        "diff_found": "[Info] Versions match, but {} file(s) differ. Repair? (y/n): ",
+        "downloading": "[Update] Downloading {} file(s) ({} KB)...",
+        "bad_hash": "[Error] File {} does not match the manifest. Update aborted, nothing changed.",
+        "manifest_done": "[Success] Manifest written to {} ({} files).",
+        "bootstrap": "[Update] Updating the updater itself first and handing over to it...",
+        "resume": "[Update] The previous update was interrupted, finishing {} file(s)...",
+        "error_resume": "[Error] Failed to finish the interrupted update: {}"
     }
 }
 
@@ -70,6 +98,173 @@ def get_file_hash(filepath):
             hasher.update(chunk)
     return hasher.hexdigest()
 
+def is_safe_path(name):
+    """Имена из удаленного манифеста не должны вылезать за пределы ROOT_DIR"""
+    norm = os.path.normpath(name)
+    return bool(name) and not os.path.isabs(norm) and not norm.startswith("..")
+
+class Fetcher:
+    """GET по keep-alive соединениям: у каждого потока свое, переиспользуется между файлами"""
+
+    def __init__(self, base_url, timeout=15):
+        parts = urllib.parse.urlsplit(base_url)
+        self.conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.base_path = parts.path if parts.path.endswith("/") else parts.path + "/"
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self, name):
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = self.conn_cls(self.netloc, timeout=self.timeout)
+            try:
+                conn.request("GET", self.base_path + urllib.parse.quote(name))
+                resp = conn.getresponse()
+                body = resp.read()
+            except (http.client.HTTPException, OSError):
+                # Сервер мог закрыть простаивающее соединение — пробуем еще раз с новым
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+                continue
+            if resp.status != 200:
+                raise OSError(f"HTTP {resp.status}: {name}")
+            return body
+
+def build_manifest():
+    """Хеши и размеры файлов для version.json (запускать перед публикацией)"""
+    files = {}
+    for filename in FILES_TO_CHECK:
+        path = os.path.join(ROOT_DIR, filename)
+        if filename == VERSION_FILE or not os.path.isfile(path):
+            continue
+        files[filename] = {"sha256": get_file_hash(path), "size": os.path.getsize(path)}
+    return files
+
+def write_manifest(m):
+    with open(LOCAL_VERSION_PATH, 'r') as f:
+        data = json.load(f)
+    data["files"] = build_manifest()
+    with open(LOCAL_VERSION_PATH, 'w') as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+        f.write("\n")
+    print(m["manifest_done"].format(VERSION_FILE, len(data["files"])))
+
+def changed_files(manifest):
+    changed = []
+    for name, meta in manifest.items():
+        if not is_safe_path(name):
+            continue
+        path = os.path.join(ROOT_DIR, name)
+        if not os.path.isfile(path) or os.path.getsize(path) != meta.get("size") or get_file_hash(path) != meta.get("sha256"):
+            changed.append(name)
+    return changed
+
+def download_changed(fetcher, manifest, changed):
+    """Параллельно качает изменившиеся файлы в STAGING_DIR и сверяет их с манифестом.
+    Возвращает имя первого битого файла или None."""
+    def fetch(name):
+        body = fetcher.get(name)
+        if hashlib.sha256(body).hexdigest() != manifest[name].get("sha256"):
+            return name
+        path = os.path.join(STAGING_DIR, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(body)
+        return None
+
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL) as pool:
+        for bad in pool.map(fetch, changed):
+            if bad:
+                return bad
+    return None
+
+def install_staged(changed, version_body):
+    """Весь набор уже лежит в STAGING_DIR и сверен. Сначала журнал, потом переименования:
+    если нас прервут посередине, следующий запуск доставит остаток (resume_install), а не оставит смесь версий"""
+    with open(os.path.join(STAGING_DIR, VERSION_FILE), 'wb') as f:
+        f.write(version_body)
+    with open(PENDING_PATH + ".tmp", 'w') as f:
+        json.dump(changed, f)
+    os.replace(PENDING_PATH + ".tmp", PENDING_PATH)
+    finish_install(changed)
+
+def finish_install(changed):
+    # version.json последним: пока он старый, проверка версий считает обновление неоконченным
+    for name in changed + [VERSION_FILE]:
+        staged = os.path.join(STAGING_DIR, name)
+        if not os.path.exists(staged):
+            continue # Переставлен еще до того, как нас прервали
+        target = os.path.join(ROOT_DIR, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(staged, target)
+    os.remove(PENDING_PATH)
+
+def resume_install(m):
+    try:
+        with open(PENDING_PATH, 'r') as f:
+            changed = json.load(f)
+    except (OSError, ValueError):
+        return
+    print(m["resume"].format(len(changed)))
+    finish_install(changed)
+    shutil.rmtree(STAGING_DIR, ignore_errors=True)
+
+def bootstrap(m, body):
+    """Новый апдейтер ставим первым и передаем работу ему: только он знает полный список файлов новой версии
+    (старый докачал бы свои, а новые модули плеера остались бы без импорта)"""
+    print(m["bootstrap"])
+    path = os.path.join(ROOT_DIR, SELF_FILE)
+    with open(path + ".tmp", 'wb') as f:
+        f.write(body)
+    os.replace(path + ".tmp", path)
+    sys.stdout.flush()
+    os.execve(sys.executable, [sys.executable, path] + sys.argv[1:], dict(os.environ, **{BOOTSTRAP_ENV: "1"}))
+
+def sync_manifest(m, fetcher, remote_data, version_body, remote_v, local_v):
+    manifest = remote_data["files"]
+    changed = changed_files(manifest)
+    if not changed and remote_v == local_v:
+        print(m["up_to_date"].format(local_v))
+        return
+    bootstrapped = os.environ.get(BOOTSTRAP_ENV)
+    if not bootstrapped and not ask_user(m["new_ver"].format(remote_v, local_v) if remote_v != local_v
+                                         else m["diff_found"].format(len(changed))):
+        return
+    if SELF_FILE in changed and not bootstrapped:
+        try:
+            body = fetcher.get(SELF_FILE)
+        except Exception as e:
+            print(m["error_net"].format(e))
+            return
+        if hashlib.sha256(body).hexdigest() != manifest[SELF_FILE].get("sha256"):
+            print(m["bad_hash"].format(SELF_FILE))
+            return
+        bootstrap(m, body)
+
+    total_kb = sum(manifest[n].get("size", 0) for n in changed) // 1024
+    print(m["downloading"].format(len(changed), total_kb))
+    if os.path.exists(STAGING_DIR):
+        shutil.rmtree(STAGING_DIR)
+    os.makedirs(STAGING_DIR)
+    try:
+        bad = download_changed(fetcher, manifest, changed)
+        if bad:
+            print(m["bad_hash"].format(bad))
+            return
+        for name in changed:
+            print(m["updating"].format(name))
+        install_staged(changed, version_body)
+        print(m["done"])
+    except Exception as e:
+        print(m["error_net"].format(e))
+    finally:
+        if not os.path.exists(PENDING_PATH): # Иначе установку прервали — остаток нужен resume_install
+            shutil.rmtree(STAGING_DIR, ignore_errors=True)
+
 def ask_user(text):
     ans = input(text).lower()
     return ans in ['y', 'yes', 'д', 'да']
@@ -128,47 +323,26 @@ def update_shell_aliases(m):
         
     print(m["alias_done"].format(os.path.basename(rc_file)))
 
-def run_update():
-    m = MSG.get(LANG, MSG["en"])
-    print(m["ver_check"])
-    
-    remote_v = "unknown"
-    local_v = "unknown"
-    should_deep_check = False
-
-    # 1. Получаем удаленную версию
-    try:
-        with urllib.request.urlopen(GITHUB_RAW_URL + VERSION_FILE, timeout=7) as response:
-            remote_data = json.loads(response.read().decode())
-            remote_v = str(remote_data.get("version", "0.0"))
-    except Exception as e:
-        print(m["error_net"].format(e))
-        if not ask_user(m["ver_match"].format("?")): 
-            should_deep_check = False
-        else:
-            should_deep_check = True
-
-    # 2. Получаем локальную версию
-    if os.path.exists(LOCAL_VERSION_PATH):
-        try:
-            with open(LOCAL_VERSION_PATH, 'r') as f:
-                local_data = json.load(f)
-                local_v = str(local_data.get("version", "0.0"))
-        except Exception: 
-            pass
-    else:
-        print(m["error_local"])
-        should_deep_check = True
-
+def legacy_check(m, remote_v, local_v, should_deep_check):
+    """Старая побайтовая проверка — для серверов без манифеста в version.json"""
+    bootstrapped = os.environ.get(BOOTSTRAP_ENV)
     # 3. Логика сравнения (если не ушли в форсированную проверку из-за ошибок)
-    if not should_deep_check:
+    if not should_deep_check and not bootstrapped:
         if remote_v == local_v and remote_v != "unknown":
             should_deep_check = ask_user(m["ver_match"].format(local_v))
         else:
             should_deep_check = ask_user(m["new_ver"].format(remote_v, local_v))
 
     # 4. Проверка через /tmp (RAM), только если нужно
-    if should_deep_check:
+    if should_deep_check or bootstrapped:
+        if not bootstrapped:
+            try:
+                body = urllib.request.urlopen(UPDATE_URL + SELF_FILE, timeout=15).read()
+            except Exception:
+                body = None
+            local_path = os.path.join(ROOT_DIR, SELF_FILE)
+            if body and (not os.path.exists(local_path) or hashlib.sha256(body).hexdigest() != get_file_hash(local_path)):
+                bootstrap(m, body)
         print(m["start"])
         if os.path.exists(TMP_DIR): 
             shutil.rmtree(TMP_DIR)
@@ -180,7 +354,7 @@ def run_update():
                 tmp_path = os.path.join(TMP_DIR, filename)
                 
                 try:
-                    urllib.request.urlretrieve(GITHUB_RAW_URL + filename, tmp_path)
+                    urllib.request.urlretrieve(UPDATE_URL + filename, tmp_path)
                 except Exception:
                     continue
 
@@ -198,9 +372,58 @@ def run_update():
             shutil.rmtree(TMP_DIR)
             print(m["done"])
 
+def run_update():
+    m = MSG.get(LANG, MSG["en"])
+    try:
+        resume_install(m)
+    except OSError as e:
+        print(m["error_resume"].format(e))
+        return
+    print(m["ver_check"])
+    
+    remote_v = "unknown"
+    local_v = "unknown"
+    remote_data = None
+    version_body = b""
+    should_deep_check = False
+    fetcher = Fetcher(UPDATE_URL)
+
+    # 1. Получаем удаленную версию (вместе с манифестом — один маленький запрос)
+    try:
+        version_body = fetcher.get(VERSION_FILE)
+        remote_data = json.loads(version_body.decode())
+        remote_v = str(remote_data.get("version", "0.0"))
+    except Exception as e:
+        print(m["error_net"].format(e))
+        if not ask_user(m["ver_match"].format("?")): 
+            should_deep_check = False
+        else:
+            should_deep_check = True
+
+    # 2. Получаем локальную версию
+    if os.path.exists(LOCAL_VERSION_PATH):
+        try:
+            with open(LOCAL_VERSION_PATH, 'r') as f:
+                local_data = json.load(f)
+                local_v = str(local_data.get("version", "0.0"))
+        except Exception: 
+            pass
+    else:
+        print(m["error_local"])
+        should_deep_check = True
+
+    # 3-4. С манифестом качаем только то, чьи хеши отличаются
+    if remote_data and isinstance(remote_data.get("files"), dict):
+        sync_manifest(m, fetcher, remote_data, version_body, remote_v, local_v)
+    else:
+        legacy_check(m, remote_v, local_v, should_deep_check)
+
     # 5. Секция управления алиасами в самом конце выполнения скрипта
     if ask_user(m["ask_alias"]):
         update_shell_aliases(m)
 
 if __name__ == "__main__":
-    run_update()
+    if "--manifest" in sys.argv:
+        write_manifest(MSG.get(LANG, MSG["en"]))
+    else:
+        run_update()
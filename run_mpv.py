@@ -1,13 +1,40 @@
 import os
-import json
+import sys
+import time
+import shlex
+import signal
+import argparse
+import random
 import subprocess
 import threading
-import time
 import locale
+from concurrent.futures import TimeoutError as FutureTimeout
+from mpv_ipc import MpvClient, MpvError, SOCKET_PATH, INSTANCE, request, is_alive
+from playlist_cache import PlaylistCache, playlist_id_from_url, video_url, video_id_from_url, stream_flat
+from stream_resolver import StreamResolver, YTDL_EXCLUDE
+from audio_cache import AudioCache
+from telemetry import PlaybackTelemetry, METRICS_DIR
+from player_view import PlayerView
+from adaptive_quality import QualityController, AUTO_FORMAT, resolve_format
+from buffer_profiles import profile_options, profile_args
+import visualizer
+import loudness
+import shuffle_scheduler
+from session_state import SessionRecorder, load_session, resume_point
+from notifier import Notifier
+from search_index import SearchIndex, play_entry
+from control_api import ControlServer, parse_listen
+from playlist_health import HealthCache, HealthChecker
+from watchdog import PlaybackWatchdog, kill_mpv
+from player_config import (CONFIG, ConfigWatcher, load_config, LIVE_PROPS, HELPER_KEYS, PLAYLIST_KEYS,
+                           BUFFER_KEYS, SCHEDULER_KEYS, LOUDNORM_FILTER)
 
-ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
-CONFIG_PATH = os.path.join(ROOT_DIR, "configs", "config.json")
-SOCKET_PATH = "/tmp/mpv-socket"
+HELPER_PID_PATH = SOCKET_PATH + "-helper.pid"
+HELPER_LOG_PATH = SOCKET_PATH + "-helper.log" # stderr фонового процесса: ошибки колбэков и прочее, с каждым запуском заново
+EXIT_PATH = SOCKET_PATH + "-exit" # Код выхода mpv без терминала: супервизор отличает конец плейлиста от падения
+HELPER_IDLE_EXIT = 30 # Сколько секунд фоновый процесс живет без mpv
+STREAM_BATCH = 50    # Сколькими записями докидываем плейлист в mpv, пока yt-dlp его тянет
+TMUX_SESSION = "playlist_session" + (f"-{INSTANCE}" if INSTANCE else "")
 
 def get_sys_lang():
     try:
@@ -20,86 +47,534 @@ MSG = {
     "ru": {
         "err_url": "[Ошибка] Ссылка не найдена. Запустите playlistconfig.",
         "playing": "Играет",
-        "start": "[Система] Запуск сессии (Управление: Клавиатура -> MPV)..."
+        "start": "[Система] Запуск сессии (Управление: Клавиатура -> MPV)...",
+        "cache_hit": "[Система] Плейлист из кэша: {} треков.",
+        "attach": "[Система] Плеер уже играет — подключаемся к сессии...",
+        "daemon_started": "[Система] Плеер запущен в фоне. Открыть: --attach, остановить: --stop.",
+        "not_running": "[Ошибка] Фоновый плеер не запущен.",
+        "stopped": "[Система] Плеер остановлен.",
+        "shuffle_seed": "[Система] Свое перемешивание, seed {} (повторить порядок: shuffle_seed в config.json).",
+        "buffer": "[Система] Буфер «{}»: {} вперед, {} назад, до {} с.",
+        "resume": "[Система] Продолжаем с трека {} с {}:{:02d}.",
+        "no_cache": "[Ошибка] Плейлист еще не загружен — запустите плеер хотя бы раз.",
+        "search_none": "Ничего не найдено.",
+        "search_pick": "Номер трека (Enter — отмена): ",
+        "search_playing": "[Система] Играет: {}"
     },
     "en": {
         "err_url": "[Error] URL not found. Run playlistconfig.",
         "playing": "Playing",
-        "start": "[System] Starting session (Focus: MPV Controls)..."
+        "start": "[System] Starting session (Focus: MPV Controls)...",
+        "cache_hit": "[System] Playlist loaded from cache: {} tracks.",
+        "attach": "[System] Player is already running — attaching...",
+        "daemon_started": "[System] Player started in background. Open: --attach, stop: --stop.",
+        "not_running": "[Error] Background player is not running.",
+        "stopped": "[System] Player stopped.",
+        "shuffle_seed": "[System] Scheduled shuffle, seed {} (set shuffle_seed in config.json to replay it).",
+        "buffer": "[System] Buffer profile \"{}\": {} ahead, {} back, up to {} s.",
+        "resume": "[System] Resuming track {} at {}:{:02d}.",
+        "no_cache": "[Error] The playlist is not loaded yet — start the player at least once.",
+        "search_none": "Nothing found.",
+        "search_pick": "Track number (Enter to cancel): ",
+        "search_playing": "[System] Playing: {}"
     }
 }
 
-def load_config():
-    if not os.path.isfile(CONFIG_PATH):
-        return {"volume": 70, "shuffle": True, "loop": True, "playlist_url": ""}
-    with open(CONFIG_PATH, 'r') as f: return json.load(f)
+def send_notification(client):
+    # Одно постоянное соединение вместо socat раз в 3 секунды:
+    # mpv сам присылает property-change, когда меняется media-title
+    state = {"loading": True, "last_title": ""}
+    notifier = Notifier()
 
-def send_notification():
-    conf = load_config()
-    if not conf.get('allow_notifications', True): # Если выключено — ливаем
+    def notify(title):
+        # Настройку смотрим каждый раз: ее могут переключить в GUI на ходу
+        if not title or title == state["last_title"] or not load_config()['allow_notifications']:
+            return
+        state["last_title"] = title
+        notifier.show("Playlist Player", f"{MSG[LANG]['playing']}: {title}",
+                      video_id_from_url(client.get_property("path", "") or ""))
+
+    def on_title(_name, title):
+        # Пока трек грузится, media-title — это просто URL, ждём file-loaded
+        if not state["loading"]:
+            notify(title)
+
+    def on_start_file(_event):
+        state["loading"] = True
+
+    def on_file_loaded(_event):
+        state["loading"] = False
+        notify(client.get_property("media-title"))
+
+    client.on_event("start-file", on_start_file)
+    client.on_event("file-loaded", on_file_loaded)
+    client.observe("media-title", on_title)
+
+def revalidate_playlist(client, conf):
+    """Фоновое обновление кэша плейлиста; новые треки сразу докидываем в mpv"""
+    cache = PlaylistCache()
+    playlist_id = conf.get('playlist_id') or playlist_id_from_url(conf.get('playlist_url'))
+    if not playlist_id:
+        return
+    cached = cache.load(playlist_id)
+    if cache.is_fresh(cached):
         return
+    try:
+        fresh = cache.refresh(playlist_id)
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return
+    if not cached:
+        return # mpv играет по ссылке напрямую, кэш пригодится в следующий раз
+    known = {e["id"] for e in cached["entries"]}
+    added = HealthCache().playable([e for e in fresh["entries"] if e["id"] not in known])
+    if not added or not client.wait_connected(30):
+        return
+    if shuffle_scheduler.load_state().get("active"):
+        return # Перемешанный порядок сам подхватит новые видео на следующем круге
+    try:
+        for e in added:
+            client.command("loadfile", video_url(e["id"]), "append")
+    except MpvError:
+        pass
 
-    time.sleep(5)
-    last_title = ""
-    while True:
-        try:
-            if os.path.exists(SOCKET_PATH):
-                cmd = f'echo \'{{"command": ["get_property", "media-title"]}}\' | socat - {SOCKET_PATH}'
-                res = subprocess.check_output(cmd, shell=True, text=True, stderr=subprocess.DEVNULL)
-                data = json.loads(res)
-                current_title = data.get("data", "")
-                if current_title and current_title != last_title:
-                    subprocess.run(["notify-send", "-i", "audio-speakers", "Playlist Player", f"{MSG[LANG]['playing']}: {current_title}"])
-                    last_title = current_title
-        except: pass
-        time.sleep(3)
-        
-def run_stuff():
-    conf = load_config()
-    if not conf.get('playlist_url'):
-        print(MSG[LANG]["err_url"])
+def stream_playlist(client, conf, first_mode="append-play", resume=None):
+    """Плейлиста нет в кэше: mpv стартует пустым (--idle=once), а записи мы докидываем пачками,
+    как только yt-dlp их отдает. Играть начинаем с первой же записи, в конце сохраняем кэш на следующий запуск."""
+    cache = PlaylistCache()
+    playlist_id = conf.get('playlist_id') or playlist_id_from_url(conf.get('playlist_url'))
+    if not client.wait_connected(30):
+        return
+    if first_mode == "append-play" and client.get_property("playlist-count", 0):
+        # Фоновый процесс перезапустился, а mpv уже играет — только дотягиваем кэш
+        if playlist_id:
+            try:
+                cache.refresh(playlist_id)
+            except (OSError, ValueError, subprocess.SubprocessError):
+                pass
         return
+    start, _ = resume or (0, 0)
+    rng = random.Random() if conf['shuffle'] else None # Тасуем пачками: весь список целиком еще неизвестен
+    health = HealthCache()
+    entries, batch, title = [], [], ""
+    sent = [0] # Номера в mpv — только по тому, что отправили: известные мертвые в mpv не попадают
+    def flush():
+        if rng:
+            rng.shuffle(batch)
+        # Все команды пачки уходят разом, ответы ждем потом — один круг IPC на пачку
+        futures = [client.command_async("loadfile", video_url(e["id"]), first_mode if sent[0] + i == start else "append")
+                   for i, e in enumerate(batch)]
+        for fut in futures:
+            fut.result(10)
+        sent[0] += len(batch)
+        batch.clear()
+    try:
+        for entry, title in stream_flat(conf['playlist_url']):
+            entries.append(entry) # В кэш идет весь плейлист: мертвые записи могут ожить
+            if not health.playable([entry]):
+                continue
+            batch.append(entry)
+            # Пока ничего не играет — отправляем сразу, дальше копим пачку
+            if len(batch) >= STREAM_BATCH or (not rng and sent[0] <= start < sent[0] + len(batch)):
+                flush()
+        if not sent[0] and not batch:
+            batch.extend(entries) # Проверка забраковала все — играем как есть, чем молчать
+        if batch:
+            flush()
+        if sent[0] <= start:
+            # Плейлист укоротился и места остановки в нем больше нет — играем сначала
+            client.set_property("start", "none")
+            client.command("playlist-play-index", 0)
+    except (OSError, ValueError, MpvError, subprocess.SubprocessError, FutureTimeout):
+        return
+    if playlist_id and entries:
+        cache.save(playlist_id, {"id": playlist_id, "title": title, "entries": entries})
 
-    print(MSG[LANG]["start"])
+def stop_background():
+    """Гасим фоновый процесс от прошлой сессии, если он еще жив"""
+    try:
+        with open(HELPER_PID_PATH, 'r') as f:
+            pid = int(f.read().strip())
+        with open(f"/proc/{pid}/cmdline", 'rb') as f:
+            if b"--background" not in f.read():
+                return # pid уже занят чужим процессом
+        os.kill(pid, signal.SIGTERM)
+    except (OSError, ValueError):
+        pass
+
+def start_background():
+    stop_background()
+    with open(HELPER_LOG_PATH, 'w') as log:
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "--background"],
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=log,
+                         start_new_session=True)
+
+def run_background():
+    """Резидентный процесс рядом с mpv: держит yt-dlp в памяти, резолвит треки наперед,
+    шлет уведомления и пишет телеметрию — все через одно IPC соединение"""
+    conf = load_config()
+    with open(HELPER_PID_PATH, 'w') as f:
+        f.write(str(os.getpid()))
+
+    client = MpvClient(SOCKET_PATH)
+    health = HealthCache() # Один на процесс: что нашла проверка, сразу видят резолвер и планировщик
+    audio_cache = None
+    if conf.get('audio_cache'):
+        audio_cache = AudioCache(budget_mb=conf['audio_cache_mb']).attach(client)
+    resolver = StreamResolver(resolve_format(conf['ytdl_format']), lookahead=conf['resolver_lookahead'],
+                              workers=conf['resolver_workers'], audio_cache=audio_cache, health=health).attach(client)
+    if use_builtin_visualizer(conf):
+        visualizer.PcmTap().start()
+    if conf['loudnorm'] and loudness.available():
+        loudness.LoudnessNormalizer(resolver, audio_cache).attach(client)
+    feeder = None
+    if shuffle_scheduler.scheduler_entries(conf):
+        feeder = shuffle_scheduler.ShuffleFeeder(conf, health=health).attach(client)
+    elif shuffle_scheduler.load_state().get("active"):
+        # Shuffle выключили на ходу — когда mpv будет на связи, возвращаем обычный порядок
+        cached = PlaylistCache().load(conf['playlist_id'])
+        if cached:
+            threading.Thread(target=lambda: client.wait_connected(30) and shuffle_scheduler.restore_order(
+                client, conf, health.playable(cached["entries"], fallback=True)), daemon=True).start()
+    if conf['ytdl_format'] == AUTO_FORMAT:
+        QualityController(resolver).attach(client)
+    if conf['telemetry']:
+        PlaybackTelemetry(conf['metrics_dir'] or METRICS_DIR).attach(client)
+    if conf['health_check']:
+        HealthChecker(conf, health, workers=conf['health_workers']).attach(client)
+    recorder = SessionRecorder().attach(client)
+    if conf['watchdog']:
+        def restart(pid, headless):
+            recorder.checkpoint()
+            target, resume = restart_mpv(conf, pid, headless)
+            if target is None: # Плейлист шел потоком — новому mpv докидываем его заново
+                threading.Thread(target=stream_playlist, args=(client, conf), kwargs={"resume": resume}, daemon=True).start()
+        PlaybackWatchdog(resolver, restart, conf['metrics_dir'] or METRICS_DIR).attach(client)
+    send_notification(client)
+    client.start()
+    listen = parse_listen(conf['control_api'])
+    if listen:
+        ControlServer(client, listen, feeder).start() # Все HTTP/WebSocket клиенты — через это же соединение с mpv
+    if streaming(conf):
+        threading.Thread(target=stream_playlist, args=(client, conf),
+                         kwargs={"resume": None if conf['shuffle'] else resume_point(conf)}, daemon=True).start()
+    else:
+        threading.Thread(target=revalidate_playlist, args=(client, conf), daemon=True).start()
+
+    restart = threading.Event()
+    def on_config_change(old, new, keys):
+        if apply_config(client, resolver, old, new, keys, feeder):
+            restart.set()
+    ConfigWatcher(CONFIG, on_config_change).start()
+
+    # Живем, пока жив mpv (плюс запас на его старт)
+    idle_since = time.time()
+    while time.time() - idle_since < HELPER_IDLE_EXIT and not restart.is_set():
+        time.sleep(1)
+        if client.connected.is_set():
+            idle_since = time.time()
+    client.close()
+    if restart.is_set():
+        # Кэш, телеметрия и резолвер собираются при старте — проще переродиться с новым конфигом
+        os.execv(sys.executable, [sys.executable, os.path.abspath(__file__), "--background"])
+
+def apply_config(client, resolver, old, new, keys, feeder=None):
+    """Переносит изменения конфига в живой mpv. True — нужен перезапуск фонового процесса."""
+    scheduled = shuffle_scheduler.load_state().get("active") or shuffle_scheduler.scheduler_entries(new)
+    if feeder and keys & (SCHEDULER_KEYS | PLAYLIST_KEYS):
+        feeder.stop() # Дальше порядок ведет уже следующий фоновый процесс, старый не должен писать состояние
+    live = keys & LIVE_PROPS.keys()
+    if scheduled:
+        live -= SCHEDULER_KEYS
+    try:
+        for key in live:
+            prop, convert = LIVE_PROPS[key]
+            client.set_property(prop, convert(new[key]))
+        if keys & BUFFER_KEYS:
+            # Новые лимиты mpv применит к следующему открытому демуксеру
+            for prop, value in profile_options(new["buffer_profile"], new["buffer_budget_mb"], new["prefetch"]).items():
+                client.set_property(prop, value)
+        if "ytdl_format" in keys:
+            resolver.set_format(resolve_format(new["ytdl_format"])) # Текущий трек доиграет как есть, следующие — в новом формате
+        if "shuffle" in keys and not scheduled:
+            client.command("playlist-shuffle" if new["shuffle"] else "playlist-unshuffle")
+        if "loudnorm" in keys:
+            if new["loudnorm"]: client.command("af", "add", norm_filter())
+            else: client.command("af", "remove", norm_filter().split(":")[0])
+        if keys & PLAYLIST_KEYS and new["playlist_url"]:
+            if streaming(new):
+                threading.Thread(target=stream_playlist, args=(client, new, "replace"), daemon=True).start()
+            else:
+                client.command("loadfile", playlist_target(new)[0], "replace")
+                threading.Thread(target=revalidate_playlist, args=(client, new), daemon=True).start()
+    except MpvError:
+        pass
+    # Включить/выключить "Авто" — это контроллер в фоновом процессе, его собираем заново
+    auto_toggled = "ytdl_format" in keys and AUTO_FORMAT in (old["ytdl_format"], new["ytdl_format"])
+    # Статическое усиление ставит анализатор громкости в фоновом процессе
+    norm_toggled = "loudnorm" in keys and loudness.available()
+    # Порядок ведет ShuffleFeeder — новый конфиг он получит, только родившись заново
+    reorder = scheduled and keys & (SCHEDULER_KEYS | PLAYLIST_KEYS)
+    return bool(keys & HELPER_KEYS) or auto_toggled or norm_toggled or bool(reorder)
+
+def restart_mpv(conf, pid=None, headless=True):
+    """Для сторожа: гасим зависший mpv и поднимаем новый с места остановки — в tmux, если старый играл там.
+    Возвращает (target, resume) нового mpv."""
+    kill_mpv(pid)
+    for _ in range(20): # Ждем, пока старый mpv освободит сокет
+        if not is_alive():
+            break
+        time.sleep(0.25)
+    target, scheduled, resume = playlist_target(dict(conf, resume=True)) # Продолжаем, даже если resume выключен
+    in_tmux = not headless and tmux_session_exists()
+    args = build_mpv_args(conf, target, headless=not in_tmux, scheduled=scheduled, resume=resume)
+    if in_tmux:
+        subprocess.run(["tmux", "split-window", "-v", "-p", "35", "-t", f"{TMUX_SESSION}:0.0", shlex.join(args)],
+                       capture_output=True)
+    else:
+        spawn_headless(args)
+    return target, resume
+
+def spawn_headless(mpv_args):
+    """mpv в своей сессии без терминала; обертка sh дожидается его и пишет код выхода в EXIT_PATH"""
+    try:
+        os.remove(EXIT_PATH)
+    except OSError:
+        pass
+    subprocess.Popen(["sh", "-c", '"$@"; echo $? > "$0"', EXIT_PATH, *mpv_args],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     start_new_session=True)
 
+def build_mpv_args(conf, target, headless=False, scheduled=False, resume=None):
     # Аргументы MPV
     mpv_args = [
         "mpv",
         "--no-video",
         f"--input-ipc-server={SOCKET_PATH}",
-        f"--volume={conf.get('volume', 70)}",
-        f"--ytdl-format={conf.get('ytdl_format', 'bestaudio')}",
-        "--term-osd-bar=yes"
+        f"--volume={conf['volume']}",
+        f"--ytdl-format={resolve_format(conf['ytdl_format'])}",
+        f"--script-opts=ytdl_hook-exclude={YTDL_EXCLUDE}",
+        "--no-terminal" if headless else "--term-osd-bar=yes"
     ]
 
-    if conf.get('shuffle'): mpv_args.append("--shuffle")
-    if conf.get('loop'): mpv_args.append("--loop-playlist=inf")
-    if conf.get('prefetch'): mpv_args.append("--prefetch-playlist=yes")
-    if conf.get('gapless'): mpv_args.append("--gapless-audio=yes")
-    if conf.get('loudnorm'): mpv_args.append("--af=loudnorm")
-    
-    mpv_args.append(f"\"{conf.get('playlist_url')}\"")
-    mpv_cmd_str = " ".join(mpv_args)
+    # Свой планировщик сам тасует и ходит по кругу — mpv получает только окно из нескольких треков
+    if conf['shuffle'] and not scheduled: mpv_args.append("--shuffle")
+    if conf['loop'] and not scheduled: mpv_args.append("--loop-playlist=inf")
+    if conf['prefetch']: mpv_args.append("--prefetch-playlist=yes")
+    if conf['gapless']: mpv_args.append("--gapless-audio=yes")
+    if conf['loudnorm']: mpv_args.append(f"--af={norm_filter()}") # С меткой, чтобы снимать его на ходу
 
-    threading.Thread(target=send_notification, daemon=True).start()
+    device = conf['audio_device']
+    if use_builtin_visualizer(conf):
+        visualizer.ensure_fifo() # До старта mpv: иначе ALSA создаст на этом месте обычный файл
+        mpv_args += visualizer.mpv_pcm_args(device.split("/", 1)[1] if device.startswith("alsa/") else "default")
+    elif device:
+        mpv_args.append(f"--audio-device={device}")
+    if resume:
+        # Сразу на нужный трек и секунду: mpv открывает только его, без разбора треков до него
+        index, start = resume
+        if target: # Без target плейлист докидывает фоновый процесс, он сам начнет с нужного трека
+            mpv_args.append(f"--playlist-start={index}")
+        mpv_args.append(f"--start={start:.1f}")
+        print(MSG[LANG]["resume"].format(index + 1, int(start) // 60, int(start) % 60))
+    mpv_args += profile_args(conf['buffer_profile'], conf['buffer_budget_mb'], conf['prefetch'])
+    o = profile_options(conf['buffer_profile'], conf['buffer_budget_mb'], conf['prefetch'])
+    print(MSG[LANG]["buffer"].format(conf['buffer_profile'], o["demuxer-max-bytes"], o["demuxer-max-back-bytes"], o["cache-secs"]))
+
+    # Пустой mpv ждет первую запись от фонового процесса, а доиграв плейлист, выходит как обычно
+    mpv_args.append(target if target else "--idle=once")
+    return mpv_args
+
+def norm_filter():
+    # Посчитанная заранее громкость + статическое усиление; без numpy/ffmpeg — loudnorm в реальном времени
+    return loudness.GAIN_FILTER if loudness.available() else LOUDNORM_FILTER
+
+def use_builtin_visualizer(conf):
+    # Без numpy тихо остаемся на cava. Копию звука снимаем только с ALSA-выхода
+    device = conf['audio_device']
+    return conf['builtin_visualizer'] and visualizer.available() and (not device or device.startswith("alsa/"))
+
+def visualizer_cmd(conf):
+    if use_builtin_visualizer(conf):
+        return shlex.join([sys.executable, os.path.abspath(__file__), "--visualizer"])
+    return "cava"
+
+def playlist_target(conf):
+    """(что открыть в mpv, ведет ли порядок наш планировщик, (трек, секунда) для продолжения или None).
+    Если плейлист уже в кэше — отдаем mpv готовый локальный m3u (ссылку сверит фоновый процесс)"""
+    target = conf.get('playlist_url')
+    cache = PlaylistCache()
+    health = HealthCache()
+    entries = shuffle_scheduler.scheduler_entries(conf, cache)
+    entries = entries and health.playable(entries, fallback=True)
+    if entries:
+        session = load_session() if conf.get('resume', True) else {}
+        resume_id = session.get("video_id") if session.get("playlist_id") == conf['playlist_id'] else None
+        path, seed, resumed = shuffle_scheduler.start_order(conf, entries, cache, resume_id)
+        print(MSG[LANG]["shuffle_seed"].format(seed))
+        point = resume_point(conf, entries) if resumed else None
+        return path, True, (0, point[1]) if point else None # m3u окна уже начинается с этого трека
+    shuffle_scheduler.deactivate()
+    playlist_id = conf.get('playlist_id') or playlist_id_from_url(target)
+    cached = cache.load(playlist_id) if playlist_id else None
+    if cached and cached["entries"]:
+        print(MSG[LANG]["cache_hit"].format(len(cached["entries"])))
+        # В m3u для mpv — без записей, которые проверка уже признала мертвыми; номер продолжения — по нему же
+        entries = health.playable(cached["entries"], fallback=True)
+        target = cache.write_m3u(playlist_id, entries)
+        # Со --shuffle mpv номер трека ничего не значит — тогда начинаем заново
+        return target, False, None if conf['shuffle'] else resume_point(conf, entries)
+    # Кэша нет — плейлист по мере извлечения докинет фоновый процесс (stream_playlist)
+    return None, False, None if conf['shuffle'] else resume_point(conf)
+
+def streaming(conf):
+    """Плейлиста нет в кэше — его потоком докидывает в mpv stream_playlist"""
+    playlist_id = conf.get('playlist_id') or playlist_id_from_url(conf.get('playlist_url'))
+    cached = PlaylistCache().load(playlist_id) if playlist_id else None
+    return not (cached and cached["entries"])
+
+def run_search(query):
+    """Поиск по названиям из кэша плейлиста; выбранный трек сразу включаем в mpv"""
+    conf = load_config()
+    index = SearchIndex()
+    if not conf.get('playlist_id') or not index.refresh(conf['playlist_id']):
+        print(MSG[LANG]["no_cache"])
+        return
+    results = index.search(query)
+    if not results:
+        print(MSG[LANG]["search_none"])
+        return
+    for n, (_vid, title, uploader, pos) in enumerate(results, 1):
+        print(f"{n:>3}. {title}" + (f" — {uploader}" if uploader else "") + (f"  [#{pos + 1}]" if pos is not None else ""))
+    if not is_alive() or not sys.stdin.isatty():
+        return
+    try:
+        choice = input(MSG[LANG]["search_pick"]).strip()
+    except (EOFError, KeyboardInterrupt):
+        return
+    if choice.isdigit() and 1 <= int(choice) <= len(results):
+        vid, title = results[int(choice) - 1][:2]
+        try:
+            play_entry(vid)
+            print(MSG[LANG]["search_playing"].format(title))
+        except (OSError, ValueError, MpvError):
+            print(MSG[LANG]["not_running"])
+
+def tmux_session_exists():
+    return subprocess.run(["tmux", "has-session", "-t", TMUX_SESSION], capture_output=True).returncode == 0
+
+def start_daemon(conf):
+    """mpv без терминала + фоновый процесс. Звук не зависит от того, открыт ли tmux."""
+    subprocess.run(["tmux", "kill-session", "-t", TMUX_SESSION], capture_output=True)
+    target, scheduled, resume = playlist_target(conf)
+    spawn_headless(build_mpv_args(conf, target, headless=True, scheduled=scheduled, resume=resume))
+    start_background()
+
+def attach_view():
+    """Подключает tmux с cava и пультом к уже играющему плееру"""
+    if tmux_session_exists():
+        subprocess.run(["tmux", "attach-session", "-t", TMUX_SESSION])
+        return
+    view_cmd = shlex.join([sys.executable, os.path.abspath(__file__), "--view"])
+    # Сессия одноразовая: после отсоединения tmux ее убивает вместе с визуализатором, mpv играет дальше
+    subprocess.run([
+        "tmux", "new-session", "-d", "-s", TMUX_SESSION, visualizer_cmd(load_config()), ";",
+        "split-window", "-v", "-p", "35", view_cmd, ";",
+        "select-pane", "-t", "1", ";",
+        "set-option", "-t", TMUX_SESSION, "destroy-unattached", "on", ";",
+        "attach-session", "-t", TMUX_SESSION
+    ])
+
+def stop_player():
+    try:
+        request(["quit"])
+    except (OSError, ValueError, MpvError):
+        pass
+    stop_background()
+    subprocess.run(["tmux", "kill-session", "-t", TMUX_SESSION], capture_output=True)
+
+def run_daemon_mode(conf):
+    if is_alive():
+        print(MSG[LANG]["attach"])
+    else:
+        print(MSG[LANG]["start"])
+        start_daemon(conf)
+    attach_view()
+
+def run_stuff():
+    conf = load_config()
+    if not conf.get('playlist_url'):
+        print(MSG[LANG]["err_url"])
+        return
+
+    if conf.get('daemon_mode'):
+        run_daemon_mode(conf)
+        return
+
+    # Живую сессию не трогаем — просто подключаемся к ней
+    if tmux_session_exists() and is_alive():
+        print(MSG[LANG]["attach"])
+        subprocess.run(["tmux", "attach-session", "-t", TMUX_SESSION])
+        return
+
+    print(MSG[LANG]["start"])
+    target, scheduled, resume = playlist_target(conf)
+    mpv_cmd_str = shlex.join(build_mpv_args(conf, target, scheduled=scheduled, resume=resume)) # tmux отдает строку в sh, а в форматах бывают < и []
 
     # Сборка команды TMUX:
-    # 1. Создаем сессию с CAVA (панель 0)
+    # 1. Создаем сессию с визуализатором — cava или встроенный (панель 0)
     # 2. Сплитим окно для MPV (панель 1)
     # 3. ВАЖНО: Выбираем панель 1 (select-pane -t 1), чтобы хоткеи летели в MPV
     tmux_cmd = [
-        "tmux", "new-session", "-d", "-s", "playlist_session", "cava", ";",
+        "tmux", "new-session", "-d", "-s", TMUX_SESSION, visualizer_cmd(conf), ";",
         "split-window", "-v", "-p", "35", mpv_cmd_str, ";",
         "select-pane", "-t", "1", ";", 
-        "attach-session", "-t", "playlist_session"
+        "attach-session", "-t", TMUX_SESSION
     ]
 
     try:
         # Убиваем старую сессию, если она зависла
-        subprocess.run(["tmux", "kill-session", "-t", "playlist_session"], capture_output=True)
+        subprocess.run(["tmux", "kill-session", "-t", TMUX_SESSION], capture_output=True)
+        start_background()
         subprocess.run(tmux_cmd)
     except Exception as e:
         print(f"[Критическая ошибка]: {e}")
 
 if __name__ == "__main__":
-    run_stuff()
+    parser = argparse.ArgumentParser(description="Playlist Player")
+    parser.add_argument("--daemon", action="store_true", help="start playback in the background without a terminal view")
+    parser.add_argument("--attach", action="store_true", help="open the tmux view of a running background player")
+    parser.add_argument("--stop", action="store_true", help="stop the background player")
+    parser.add_argument("--search", metavar="QUERY", help="find a track in the playlist by title or channel and play it")
+    parser.add_argument("--instance", metavar="NAME", help="act on a named zone from the \"instances\" config section")
+    parser.add_argument("--background", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--view", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--visualizer", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.instance is not None and args.instance != INSTANCE:
+        # Сокет, tmux-сессия и файлы состояния берутся из окружения при импорте — перезапускаемся уже в зоне
+        env = dict(os.environ, PLAYLIST_INSTANCE=args.instance)
+        env.pop("PLAYLIST_SOCKET", None)
+        os.execve(sys.executable, [sys.executable, os.path.abspath(__file__)] + sys.argv[1:], env)
+    if args.background:
+        run_background()
+    elif args.view:
+        PlayerView(LANG).run()
+    elif args.visualizer:
+        visualizer.SpectrumView(fps=load_config()['visualizer_fps']).run()
+    elif args.search is not None:
+        run_search(args.search)
+    elif args.stop:
+        stop_player()
+        print(MSG[LANG]["stopped"])
+    elif args.attach:
+        if is_alive(): attach_view()
+        else: print(MSG[LANG]["not_running"])
+    elif args.daemon:
+        conf = load_config()
+        if not conf.get('playlist_url'): print(MSG[LANG]["err_url"])
+        elif not is_alive():
+            start_daemon(conf)
+            print(MSG[LANG]["daemon_started"])
+        else: print(MSG[LANG]["attach"])
+    else:
+        run_stuff()
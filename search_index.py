@@ -0,0 +1,158 @@
+import os
+import re
+from mpv_ipc import request
+from playlist_cache import PlaylistCache, video_id_from_url, video_url
+
+WORD_RE = re.compile(r"\w+")
+MIN_MATCH = 0.6 # Какая доля триграмм запроса должна найтись в названии
+
+def normalize(text):
+    return " ".join(WORD_RE.findall((text or "").casefold()))
+
+def bits(mask):
+    """Номера единичных битов, младшие первыми"""
+    s = bin(mask)[:1:-1]
+    i = s.find("1")
+    while i >= 0:
+        yield i
+        i = s.find("1", i + 1)
+
+def trigrams(text):
+    """Триграммы каждого слова с пробелами по краям: начало слова весит больше, опечатка в середине не рушит поиск"""
+    grams = set()
+    for word in text.split():
+        w = f"  {word} "
+        grams.update(w[i:i + 3] for i in range(len(w) - 2))
+    return grams
+
+class SearchIndex:
+    """Триграммный индекс названий и авторов плейлиста в памяти.
+    Документы — номера в self.docs; удаленные превращаются в None, номера не переиспользуются.
+    Списки документов по триграмме — битовые маски в int: пересчет совпадений идет целыми словами, а не по документу."""
+
+    def __init__(self, entries=()):
+        self.docs = []       # doc -> (video_id, title, uploader, нормализованный текст)
+        self.by_id = {}      # video_id -> doc
+        self.postings = {}   # триграмма -> битовая маска документов
+        self.order = {}      # video_id -> номер в плейлисте
+        self.source = None   # (mtime_ns, size) кэша, из которого индекс собран
+        self.update(entries)
+
+    def add(self, entry):
+        text = normalize(f"{entry.get('title', '')} {entry.get('uploader', '')}")
+        doc = len(self.docs)
+        self.docs.append((entry["id"], entry.get("title", ""), entry.get("uploader", ""), text))
+        self.by_id[entry["id"]] = doc
+        bit = 1 << doc
+        for g in trigrams(text):
+            self.postings[g] = self.postings.get(g, 0) | bit
+
+    def remove(self, video_id):
+        doc = self.by_id.pop(video_id, None)
+        if doc is None:
+            return
+        bit = 1 << doc
+        for g in trigrams(self.docs[doc][3]):
+            docs = self.postings.get(g, 0) & ~bit
+            if docs:
+                self.postings[g] = docs
+            else:
+                self.postings.pop(g, None)
+        self.docs[doc] = None
+
+    def update(self, entries):
+        """Приводит индекс к новому списку: трогаем только добавленные, удаленные и переименованные записи"""
+        entries = [e for e in entries if e.get("id")]
+        fresh = {e["id"]: e for e in entries}
+        for vid in [v for v in self.by_id if v not in fresh]:
+            self.remove(vid)
+        for vid, e in fresh.items():
+            doc = self.by_id.get(vid)
+            if doc is not None and self.docs[doc][1:3] == (e.get("title", ""), e.get("uploader", "")):
+                continue
+            self.remove(vid)
+            self.add(e)
+        self.order = {e["id"]: i for i, e in enumerate(entries)}
+        if len(self.docs) > 2 * len(self.by_id) + 64:
+            self._compact()
+
+    def _compact(self):
+        live = [d for d in self.docs if d is not None]
+        self.docs, self.by_id, self.postings = [], {}, {}
+        for vid, title, uploader, _text in live:
+            self.add({"id": vid, "title": title, "uploader": uploader})
+
+    def search(self, query, limit=20):
+        """[(video_id, title, uploader, номер в плейлисте)] по убыванию релевантности"""
+        q = normalize(query)
+        grams = trigrams(q)
+        if not grams:
+            return []
+        # Побитовый счетчик: layers[k] — k-й разряд числа совпавших триграмм сразу у всех документов
+        layers = []
+        for g in grams:
+            carry = self.postings.get(g, 0)
+            for k in range(len(layers)):
+                layers[k], carry = layers[k] ^ carry, layers[k] & carry
+                if not carry:
+                    break
+            if carry:
+                layers.append(carry)
+        need = max(1, int(len(grams) * MIN_MATCH))
+        found, seen = [], 0
+        # Сначала документы с большим числом совпадений; внутри — целиком найденная подстрока, потом короче название
+        for n in range(len(grams), need - 1, -1):
+            tier = self._at_least(layers, n) & ~seen
+            if not tier:
+                continue
+            seen |= tier
+            docs = self.docs
+            found += sorted(bits(tier), key=lambda d: (q not in docs[d][3], len(docs[d][3])))[:limit - len(found)]
+            if len(found) >= limit:
+                break
+        return [(self.docs[d][0], self.docs[d][1], self.docs[d][2], self.order.get(self.docs[d][0])) for d in found]
+
+    @staticmethod
+    def _at_least(layers, n):
+        """Маска документов, у которых счетчик >= n: сравнение по разрядам от старшего"""
+        if n >> len(layers):
+            return 0
+        gt, eq = 0, -1
+        for k in range(len(layers) - 1, -1, -1):
+            if n >> k & 1:
+                eq &= layers[k]
+            else:
+                gt |= eq & layers[k]
+                eq &= ~layers[k]
+        return gt | eq
+
+    def refresh(self, playlist_id, cache=None):
+        """Подтягивает изменения из кэша плейлиста, если файл поменялся с прошлого раза"""
+        cache = cache or PlaylistCache()
+        try:
+            st = os.stat(cache.path(playlist_id))
+        except OSError:
+            return False
+        if (st.st_mtime_ns, st.st_size) == self.source:
+            return False
+        data = cache.load(playlist_id)
+        if data is None:
+            return False
+        self.update(data["entries"])
+        self.source = (st.st_mtime_ns, st.st_size)
+        return True
+
+def play_entry(video_id, send=request):
+    """Переключает mpv на трек. Если его нет в плейлисте mpv (окно перемешивания), вставляем следующим."""
+    entries = send(["get_property", "playlist"]) or []
+    for i, e in enumerate(entries):
+        if video_id_from_url(e.get("filename", "")) == video_id:
+            send(["playlist-play-index", i])
+            return i
+    pos = send(["get_property", "playlist-pos"])
+    pos = -1 if pos is None else pos
+    send(["loadfile", video_url(video_id), "append"])
+    if len(entries) != pos + 1:
+        send(["playlist-move", len(entries), pos + 1])
+    send(["playlist-play-index", pos + 1])
+    return pos + 1
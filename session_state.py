@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import threading
+from mpv_ipc import MpvError
+from playlist_cache import video_id_from_url
+from player_config import CONFIG, instance_path
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+SESSION_PATH = instance_path(os.path.join(ROOT_DIR, "cache", "session.json"))
+CHECKPOINT_INTERVAL = 5.0 # Больше этого после сбоя не потеряем
+REWIND = 2.0              # Продолжаем чуть раньше места остановки, чтобы не потерять слово на стыке
+
+def load_session(path=SESSION_PATH):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def resume_point(conf, entries=None, path=SESSION_PATH):
+    """(номер трека в плейлисте, секунда) для продолжения или None.
+    По записям из кэша ищем трек по ID: плейлист мог сдвинуться, пока плеер не работал."""
+    if not conf.get('resume', True):
+        return None
+    s = load_session(path)
+    pid = conf.get('playlist_id')
+    if not s or not pid or s.get("playlist_id") != pid:
+        return None
+    index = s.get("pos")
+    if entries is not None:
+        ids = [e["id"] for e in entries]
+        if s.get("video_id") not in ids:
+            return None
+        index = ids.index(s["video_id"])
+    if index is None or index < 0:
+        return None
+    return index, max(0.0, (s.get("time") or 0.0) - REWIND)
+
+class SessionRecorder:
+    """Пишет в session.json, что и с какой секунды играет. Раз в CHECKPOINT_INTERVAL и только если что-то поменялось."""
+
+    def __init__(self, path=SESSION_PATH):
+        self.path = path
+        self.resumed = False # Плеер запущен с --start: сбросим его, как только продолженный трек загрузится
+        self.client = None
+        self.video_id = None
+        self.pos = None
+        self.time = None
+        self._written = None
+
+    def attach(self, client):
+        self.client = client
+        client.on_connect(self._on_connect)
+        client.on_event("file-loaded", self._on_file_loaded)
+        client.on_event("end-file", self._on_end_file)
+        client.on_event("shutdown", lambda _e: self.checkpoint())
+        threading.Thread(target=self._loop, daemon=True).start()
+        return self
+
+    def _clear_start(self):
+        if not self.resumed:
+            return
+        self.resumed = False
+        try:
+            self.client.set_property("start", "none") # --start глобальный, остальные треки — с начала
+        except MpvError:
+            self.resumed = True
+
+    def _on_connect(self):
+        self.resumed = self.client.get_property("start", "none") not in ("none", "", None)
+        # Подключились, когда трек уже играет, — его загрузку с --start мы пропустили
+        if self.client.get_property("time-pos") is not None:
+            self._clear_start()
+
+    def _on_file_loaded(self, _event):
+        self._clear_start()
+        self.video_id = video_id_from_url(self.client.get_property("path", "") or "")
+        self.pos = self.client.get_property("playlist-pos")
+        self.time = 0.0
+        self.checkpoint()
+
+    def _on_end_file(self, event):
+        if event.get("reason") != "eof":
+            return
+        try:
+            entries = self.client.get_property("playlist") or []
+            loop = self.client.get_property("loop-playlist", False)
+        except MpvError:
+            return
+        if loop in (False, "no") and entries and entries[-1].get("id") == event.get("playlist_entry_id"):
+            # Доиграли последний трек плейлиста без повтора — в следующий раз начинаем сначала, а не с хвоста
+            self.video_id, self._written = None, None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def _loop(self):
+        while True:
+            time.sleep(CHECKPOINT_INTERVAL)
+            if not self.client.connected.is_set() or self.video_id is None:
+                continue
+            t = self.client.get_property("time-pos")
+            if t is not None:
+                self.time = round(t, 1)
+                self.checkpoint()
+
+    def checkpoint(self):
+        if not self.video_id:
+            return
+        # Плейлист меняют на ходу без перезапуска фонового процесса — берем тот, что в конфиге сейчас
+        record = {"playlist_id": CONFIG.get().get('playlist_id') or "", "video_id": self.video_id, "pos": self.pos, "time": self.time}
+        if record == self._written:
+            return # На паузе файл не трогаем
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + ".tmp", 'w') as f:
+                json.dump(dict(record, saved_at=time.time()), f)
+            os.replace(self.path + ".tmp", self.path)
+            self._written = record
+        except OSError:
+            pass
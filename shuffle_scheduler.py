@@ -0,0 +1,314 @@
+import os
+import json
+import random
+import threading
+from array import array
+from mpv_ipc import MpvError
+from playlist_cache import CACHE_DIR, PlaylistCache, video_id_from_url, video_url
+from player_config import instance_path
+from playlist_health import HealthCache
+
+STATE_PATH = instance_path(os.path.join(CACHE_DIR, "shuffle_state.json"))
+WINDOW = 8             # Сколько следующих треков лежит в mpv
+KEEP_BEHIND = 5        # Сколько сыгранных оставляем для playlist-prev, остальные убираем
+DEFAULT_HORIZON = 100  # Трек не повторится раньше, чем через столько других
+
+def new_seed():
+    return random.SystemRandom().randrange(1, 2 ** 31)
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+class ShuffleOrder:
+    """Порядок игры по кругам. Круг — перестановка Фишера-Йетса от (seed, номер круга), O(n),
+    индексы в array('I') по 4 байта. Начало круга чинится так, чтобы последние horizon
+    треков прошлого круга не встали в первые horizon позиций нового."""
+
+    def __init__(self, load_ids, seed, horizon=DEFAULT_HORIZON, loop=True,
+                 loop_no=0, loop_start=0, history=()):
+        self.load_ids = load_ids
+        self.seed = seed
+        self.horizon = horizon
+        self.repeat = loop
+        self._older = [] # Прошлые круги, в которых еще лежат треки окна: (loop_no, loop_start, history, ids, perm)
+        self._build(loop_no, loop_start, list(history))
+
+    def _build(self, loop_no, loop_start, history):
+        self.loop_no, self.loop_start, self.history = loop_no, loop_start, history[-self.horizon:] if self.horizon else []
+        ids = self.load_ids()
+        n = len(ids)
+        rng = random.Random(f"{self.seed}:{loop_no}")
+        perm = array('I', range(n))
+        for i in range(n - 1, 0, -1):
+            j = rng.randrange(i + 1)
+            perm[i], perm[j] = perm[j], perm[i]
+        h = min(self.horizon, n // 2)
+        recent = set(self.history[-h:]) if h else set()
+        for i in range(h):
+            if ids[perm[i]] not in recent:
+                continue
+            # Обычно хватает пары попыток; с повторами ID в списке подходящего может и не быть — тогда оставляем
+            for _ in range(4 * n):
+                k = rng.randrange(h, n)
+                if ids[perm[k]] not in recent:
+                    perm[i], perm[k] = perm[k], perm[i]
+                    break
+        self.ids, self.perm = ids, perm
+
+    def _next_loop(self):
+        self._older.append((self.loop_no, self.loop_start, self.history, self.ids, self.perm))
+        tail = [self.ids[p] for p in self.perm[-self.horizon:]] if self.horizon else []
+        self._build(self.loop_no + 1, self.loop_start + len(self.perm), self.history + tail)
+
+    def _loop_of(self, index):
+        """(loop_no, loop_start, history, ids, perm) круга с номером index, если он еще в памяти"""
+        if index >= self.loop_start:
+            return self.loop_no, self.loop_start, self.history, self.ids, self.perm
+        return next((loop for loop in reversed(self._older) if index >= loop[1]), None)
+
+    def id_at(self, index):
+        """video ID для глобального номера в порядке игры (через все круги); None — дальше играть нечего"""
+        while index >= self.loop_start + len(self.perm):
+            if not self.repeat or not self.perm:
+                return None
+            self._next_loop()
+        loop = self._loop_of(index)
+        if loop is None:
+            return None # Назад за забытые круги не ходим, это сыгранное — оно в mpv до KEEP_BEHIND
+        _no, start, _history, ids, perm = loop
+        return ids[perm[index - start]] if index - start < len(perm) else None
+
+    def forget_before(self, index):
+        """Прошлые круги, целиком лежащие до index, больше не нужны"""
+        self._older = [loop for loop in self._older if loop[1] + len(loop[4]) > index]
+
+    def state(self, index=None):
+        """Состояние круга, в котором лежит index: окно могло уже залезть в следующий круг, а после
+        перезапуска порядок строится заново с сохраненного круга — следующие выйдут те же"""
+        loop = self._loop_of(index) if index is not None else None
+        loop_no, loop_start, history = loop[:3] if loop else (self.loop_no, self.loop_start, self.history)
+        return {"seed": self.seed, "loop_no": loop_no, "loop_start": loop_start, "history": history}
+
+def scheduler_entries(conf, cache=None):
+    """Записи плейлиста из кэша, если можно тасовать сами: нужен shuffle и уже известный список"""
+    if not conf.get('shuffle'):
+        return None
+    pid = conf.get('playlist_id')
+    data = (cache or PlaylistCache()).load(pid) if pid else None
+    return data["entries"] if data and data["entries"] else None
+
+def start_order(conf, entries, cache=None, resume_id=None):
+    """Порядок на запуске плеера: m3u с первыми треками для mpv и состояние для фонового процесса.
+    Если resume_id — это трек, на котором прошлый порядок остановился, продолжаем тот же порядок с него.
+    Иначе новый, но история прошлой сессии переезжает, чтобы повторов не было и через перезапуск.
+    Возвращает (m3u, seed, продолжили ли)."""
+    cache = cache or PlaylistCache()
+    pid = conf['playlist_id']
+    horizon = conf.get('shuffle_horizon', DEFAULT_HORIZON)
+    prev = load_state()
+    same = prev.get("playlist_id") == pid
+    ids = [e["id"] for e in entries]
+    order, index = None, 0
+    if resume_id and same and prev.get("seed") and conf.get('shuffle_seed') in (0, None, prev["seed"]):
+        order = ShuffleOrder(lambda: ids, prev["seed"], horizon, conf.get('loop', True),
+                             prev.get("loop_no", 0), prev.get("loop_start", 0), prev.get("history", []))
+        index = prev.get("index", -1)
+        if index < 0 or order.id_at(index) != resume_id:
+            order, index = None, 0
+    resumed = order is not None
+    if not resumed:
+        history = prev.get("history", []) + prev.get("played", []) if same else []
+        order = ShuffleOrder(lambda: ids, conf.get('shuffle_seed') or new_seed(), horizon, conf.get('loop', True),
+                             history=history)
+    window = [order.id_at(i) for i in range(index, index + WINDOW + 1)]
+    by_id = {e["id"]: e for e in entries}
+    path = cache.write_m3u(pid, [by_id[v] for v in window if v], path=instance_path(os.path.join(cache.cache_dir, f"{pid}-shuffle.m3u")))
+    # Первый трек нового порядка mpv начнет сам, и _advance его не увидит: index уже на нем
+    save_state(dict(order.state(index), playlist_id=pid, index=index, active=True,
+                    played=prev.get("played", []) if resumed else window[:1]))
+    return path, order.seed, resumed
+
+class ShuffleFeeder:
+    """В фоновом процессе: держит в mpv окно из WINDOW следующих треков и KEEP_BEHIND сыгранных.
+    fed[i] — номер в порядке игры для i-й записи плейлиста mpv (None — запись не наша)."""
+
+    def __init__(self, conf, cache=None, health=None):
+        self.cache = cache or PlaylistCache()
+        self.health = health or HealthCache()
+        self.pid = conf['playlist_id']
+        self.horizon = conf.get('shuffle_horizon', DEFAULT_HORIZON)
+        st = load_state()
+        if st.get("playlist_id") != self.pid or not st.get("active"):
+            # Shuffle включили на ходу — новый порядок, текущий трек в него не входит
+            st = {"seed": conf.get('shuffle_seed') or new_seed(), "index": -1, "history": [], "played": []}
+        self.state = st
+        self.order = ShuffleOrder(self._ids, st["seed"], self.horizon, conf.get('loop', True),
+                                  st.get("loop_no", 0), st.get("loop_start", 0), st.get("history", []))
+        self.fed = []
+        self.synced = False
+        self.stopped = False
+        self.client = None
+        self._lock = threading.Lock()
+
+    def _ids(self):
+        # На каждом новом круге берем свежий список: новые видео из фонового обновления попадут туда
+        data = self.cache.load(self.pid)
+        return [e["id"] for e in self.health.playable(data["entries"], fallback=True)] if data else []
+
+    def attach(self, client):
+        self.client = client
+        client.on_connect(self._on_connect)
+        client.on_event("file-loaded", self._on_file_loaded)
+        client.observe("playlist-pos", self._on_pos)
+        return self
+
+    def _on_connect(self):
+        self.synced = False
+
+    def stop(self):
+        with self._lock:
+            self.stopped = True
+
+    def _on_file_loaded(self, _event):
+        # Сверяемся, когда уже играет настоящий трек: до этого в плейлисте может лежать неразвернутый m3u
+        if not self.synced:
+            self.synced = True
+            self.sync()
+
+    def _save(self):
+        save_state(dict(self.order.state(self.state["index"]), playlist_id=self.pid, index=self.state["index"], active=True,
+                        played=self.state.get("played", [])[-self.horizon:]))
+
+    def sync(self):
+        """Сверяет плейлист mpv с порядком; если не сходится — оставляет текущий трек и набирает окно заново"""
+        with self._lock:
+            if self.stopped:
+                return
+            try:
+                self._sync()
+            except MpvError:
+                pass
+
+    def _sync(self):
+        entries = self.client.get_property("playlist") or []
+        pos = max(self.client.get_property("playlist-pos", 0) or 0, 0)
+        if not entries:
+            return
+        cur = self.state["index"]
+        ids = [video_id_from_url(e.get("filename", "")) for e in entries]
+        self.fed = [None] * len(entries)
+        if cur >= 0 and ids[pos] == self.order.id_at(cur):
+            self.fed[pos] = cur
+        # Иначе играет что-то не из нашего порядка (например, выбрали поиском) — после него продолжаем с cur + 1
+        k, index = pos + 1, self._next(cur)
+        while k < len(entries) and ids[k] == self.order.id_at(index):
+            self.fed[k] = index
+            k, index = k + 1, self._next(index)
+        if k < len(entries):
+            self.client.command("playlist-clear") # Остается только текущий
+            self.fed = [self.fed[pos]]
+            pos = 0
+        self.client.set_property("loop-playlist", "no") # По кругу ходит порядок, а не окно
+        self._advance(pos)
+
+    def queue(self, video_id):
+        """Трек не из порядка (POST /queue пульта): встает после текущего и уже поставленных в очередь.
+        fed про него знает, так что сверка его не выкинет, а порядок продолжится после него."""
+        with self._lock:
+            if self.client.get_property("playlist-count") != len(self.fed):
+                self._sync()
+            pos = max(self.client.get_property("playlist-pos", 0) or 0, 0)
+            at = pos + 1
+            while at < len(self.fed) and self.fed[at] is None:
+                at += 1
+            self.client.command("loadfile", video_url(video_id), "append")
+            if at != len(self.fed):
+                self.client.command("playlist-move", len(self.fed), at)
+            self.fed.insert(at, None)
+
+    def _on_pos(self, _name, _pos):
+        with self._lock:
+            if self.stopped:
+                return
+            try:
+                # Значение из события не берем: каждое playlist-remove при подрезке шлет свое изменение
+                # playlist-pos, и приходят они, когда fed уже сдвинут. Верна только текущая позиция.
+                pos = self.client.get_property("playlist-pos")
+                if pos is None or pos < 0:
+                    return
+                if self.client.get_property("playlist-count") != len(self.fed):
+                    self._sync() # Плейлист менял кто-то кроме нас (вставили трек из поиска)
+                else:
+                    self._advance(pos)
+            except MpvError:
+                pass
+
+    def _advance(self, pos):
+        if pos >= len(self.fed):
+            return
+        idx = self.fed[pos]
+        if idx is not None and idx != self.state["index"]:
+            self.state["index"] = idx
+            played = self.order.id_at(idx)
+            if played:
+                history = self.state.setdefault("played", [])
+                history.append(played)
+                del history[:-self.horizon] # Помним только горизонт, не всю сессию
+            self._save()
+        # Добираем окно вперед
+        last = max((i for i in self.fed if i is not None), default=self.state["index"])
+        while len(self.fed) - 1 - pos < WINDOW:
+            last = self._next(last)
+            vid = self.order.id_at(last)
+            if vid is None:
+                break
+            self.client.command("loadfile", video_url(vid), "append")
+            self.fed.append(last)
+        # И подрезаем сыгранное, чтобы плейлист mpv не рос
+        while pos > KEEP_BEHIND:
+            self.client.command("playlist-remove", 0)
+            self.fed.pop(0)
+            pos -= 1
+        self.order.forget_before(min([i for i in self.fed if i is not None] + [self.state["index"]]))
+
+    def _next(self, index):
+        """Следующий номер в порядке после index. Записи, которые проверка признала мертвыми уже посреди круга,
+        пропускаем; на следующем круге их не будет в самом списке."""
+        for _ in range(len(self.order.perm) + 1):
+            index += 1
+            vid = self.order.id_at(index)
+            if vid is None or not self.health.is_bad(vid):
+                break
+        return index
+
+def deactivate():
+    """Плеер запускают без нашего порядка — фоновый процесс не должен ничего восстанавливать"""
+    st = load_state()
+    if st.get("active"):
+        st["active"] = False
+        save_state(st)
+
+def restore_order(client, conf, entries, cache=None):
+    """Shuffle выключили на ходу: вместо окна возвращаем в mpv остаток плейлиста по порядку"""
+    cache = cache or PlaylistCache()
+    try:
+        cur = video_id_from_url(client.get_property("path", "") or "")
+        ids = [e["id"] for e in entries]
+        rest = entries[ids.index(cur) + 1:] if cur in ids else entries
+        path = cache.write_m3u(conf['playlist_id'], rest, path=instance_path(os.path.join(cache.cache_dir, f"{conf['playlist_id']}-rest.m3u")))
+        client.command("playlist-clear")
+        client.command("loadfile", path, "append") # Вложенный m3u mpv развернет, когда до него дойдет
+        client.set_property("loop-playlist", "inf" if conf.get('loop') else "no")
+    except MpvError:
+        return
+    deactivate()
@@ -0,0 +1,273 @@
+import os
+import re
+import json
+import zlib
+import time
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+from mpv_ipc import MpvError
+from playlist_cache import video_id_from_url, video_url
+
+try:
+    import yt_dlp # Держим yt-dlp загруженным в памяти, без нового интерпретатора на каждый трек
+except ImportError:
+    yt_dlp = None
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+STREAM_CACHE_DIR = os.path.join(ROOT_DIR, "cache", "streams") # Общий для всех зон: один трек не резолвим дважды
+PRUNE_EVERY = 100       # Раз во столько записей выметаем протухшие ссылки из общего кэша
+EXPIRE_RE = re.compile(r"[?&/]expire[=/](\d+)")
+DEFAULT_TTL = 3 * 3600  # Если в ссылке нет expire — считаем, что живет 3 часа
+REFRESH_MARGIN = 600    # За сколько секунд до протухания ссылку резолвим заново
+HOOK_ID = 4211          # Наш id для hook-add, отличаем свои хуки от чужих
+HOOK_PRIORITY = 5       # Раньше ytdl_hook (у него 10)
+# Прямые ссылки на googlevideo ytdl_hook трогать не должен
+YTDL_EXCLUDE = "%.googlevideo%.com"
+DEAD_URL = "memory://"
+
+def url_expiry(url, now=None):
+    now = time.time() if now is None else now
+    match = EXPIRE_RE.search(url or "")
+    return int(match.group(1)) if match else now + DEFAULT_TTL
+
+class StreamResolver:
+    """Резолвит прямые ссылки на потоки заранее, на N треков вперед.
+
+    Подключается к mpv через on_load хук: если ссылка для трека уже готова,
+    mpv сразу получает прямой URL и не запускает yt-dlp сам.
+    """
+
+    def __init__(self, ytdl_format="bestaudio", lookahead=3, workers=2, audio_cache=None, shared_dir=STREAM_CACHE_DIR,
+                 health=None):
+        self.ytdl_format = ytdl_format
+        self.health = health # playlist_health.HealthCache: мертвые записи не резолвим
+        self.shared_dir = shared_dir
+        self._stored = 0
+        self.lookahead = lookahead
+        self.audio_cache = audio_cache
+        self.client = None
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._resolved = {}  # video_id -> {"url", "title", "headers", "expires", "format"}
+        self._inflight = {}  # video_id -> Future
+        self._local = threading.local()
+
+    # --- Резолв ---
+
+    def _ydl(self):
+        # YoutubeDL не потокобезопасен — по экземпляру на поток пула
+        ydl = getattr(self._local, "ydl", None)
+        if ydl is None or ydl.params.get("format") != self.ytdl_format:
+            ydl = yt_dlp.YoutubeDL({"format": self.ytdl_format, "quiet": True, "no_warnings": True,
+                                    "noplaylist": True, "skip_download": True})
+            self._local.ydl = ydl
+        return ydl
+
+    def _extract(self, video_id):
+        fmt = self.ytdl_format
+        if yt_dlp is not None:
+            info = self._ydl().extract_info(video_url(video_id), download=False)
+        else:
+            out = subprocess.run(["yt-dlp", "-J", "--no-playlist", "--no-warnings", "-f", fmt, video_url(video_id)],
+                                 capture_output=True, text=True, timeout=120, check=True).stdout
+            info = json.loads(out)
+        url = info.get("url")
+        headers = info.get("http_headers") or {}
+        if not url and info.get("requested_formats"):
+            url = info["requested_formats"][0].get("url")
+            headers = info["requested_formats"][0].get("http_headers") or headers
+        if not url:
+            raise ValueError(f"no stream url for {video_id}")
+        return {"url": url, "title": info.get("title") or "", "headers": headers,
+                "expires": url_expiry(url), "format": fmt}
+
+    def _shared_path(self, video_id, fmt):
+        return os.path.join(self.shared_dir, f"{video_id}.{zlib.crc32(fmt.encode()):08x}.json")
+
+    def _load_shared(self, video_id):
+        """Ссылка, которую уже достал другой плеер на этой машине"""
+        if not self.shared_dir:
+            return None
+        try:
+            with open(self._shared_path(video_id, self.ytdl_format), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if self._fresh(entry) else None
+
+    def _store_shared(self, video_id, entry):
+        if not self.shared_dir:
+            return
+        path = self._shared_path(video_id, entry["format"])
+        try:
+            os.makedirs(self.shared_dir, exist_ok=True)
+            with open(f"{path}.tmp{os.getpid()}", 'w') as f:
+                json.dump(entry, f)
+            os.replace(f"{path}.tmp{os.getpid()}", path)
+        except OSError:
+            return
+        self._stored += 1
+        if self._stored % PRUNE_EVERY == 0:
+            self._prune_shared()
+
+    def _prune_shared(self):
+        now = time.time()
+        try:
+            names = os.listdir(self.shared_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.shared_dir, name)
+            try:
+                with open(path, 'r') as f:
+                    expired = json.load(f)["expires"] < now
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+            if expired:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _fresh(self, entry):
+        return (entry is not None and entry["format"] == self.ytdl_format
+                and entry["expires"] - time.time() > REFRESH_MARGIN)
+
+    def _job(self, video_id, fut):
+        try:
+            entry = self._load_shared(video_id)
+            if entry is None:
+                entry = self._extract(video_id)
+                self._store_shared(video_id, entry)
+            with self._lock:
+                self._resolved[video_id] = entry
+            fut.set_result(entry)
+        except Exception as e:
+            fut.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(video_id, None)
+
+    def _claim(self, video_id):
+        """(future, новая_ли_задача) или (None, False), если свежая ссылка уже есть"""
+        with self._lock:
+            if self._fresh(self._resolved.get(video_id)):
+                return None, False
+            fut = self._inflight.get(video_id)
+            if fut is not None:
+                return fut, False
+            fut = self._inflight[video_id] = Future()
+            return fut, True
+
+    def resolve(self, video_id, timeout=60):
+        """Блокирующий резолв: из кэша, из уже запущенной задачи или прямо в этом потоке"""
+        fut, new = self._claim(video_id)
+        if new:
+            # Текущий трек не ждет в очереди за предзагрузкой
+            self._job(video_id, fut)
+        if fut is not None:
+            fut.result(timeout)
+        with self._lock:
+            return self._resolved.get(video_id)
+
+    def prefetch(self, video_ids):
+        for vid in video_ids:
+            if self.audio_cache and self.audio_cache.contains(vid):
+                continue # Трек и так лежит на диске
+            if self.health and self.health.is_bad(vid):
+                continue # Все равно не сыграет, а проверка скоро уберет его из mpv
+            fut, new = self._claim(vid)
+            if new:
+                self._pool.submit(self._job, vid, fut)
+
+    def invalidate(self, video_id):
+        """Забыть ссылку на трек (поток по ней встал): следующий on_load резолвит заново"""
+        with self._lock:
+            entry = self._resolved.pop(video_id, None)
+        if self.shared_dir:
+            try:
+                os.remove(self._shared_path(video_id, entry["format"] if entry else self.ytdl_format))
+            except OSError:
+                pass
+
+    def set_format(self, ytdl_format):
+        with self._lock:
+            self.ytdl_format = ytdl_format
+            self._resolved.clear()
+
+    # --- Связка с mpv ---
+
+    def attach(self, client):
+        self.client = client
+        client.on_connect(self._on_connect)
+        client.on_event("hook", self._on_hook)
+        client.observe("playlist-pos", lambda _n, _v: self.prefetch_upcoming())
+        threading.Thread(target=self._refresh_loop, daemon=True).start()
+        return self
+
+    def _on_connect(self):
+        try:
+            self.client.command("hook-add", "on_load", HOOK_ID, HOOK_PRIORITY)
+        except MpvError:
+            pass
+
+    def _on_hook(self, event):
+        if event.get("id") != HOOK_ID:
+            return
+        # Резолв может занять время — не держим поток событий клиента
+        threading.Thread(target=self._handle_load, args=(event.get("hook_id"),), daemon=True).start()
+
+    def _handle_load(self, hook_id):
+        try:
+            vid = video_id_from_url(self.client.get_property("stream-open-filename", ""))
+            local = self.audio_cache.lookup(vid) if vid and self.audio_cache else None
+            if local:
+                path, meta = local
+                self._apply({"url": path, "title": meta.get("title", ""), "headers": {}})
+            elif vid and self.health and self.health.is_bad(vid):
+                # Проверка не успела убрать запись из mpv: пустой поток падает сразу, без секунд на yt-dlp
+                self.client.set_property("stream-open-filename", DEAD_URL)
+            elif vid:
+                entry = self.resolve(vid)
+                if entry:
+                    self._apply(entry)
+        except Exception:
+            pass # Не вышло — пусть ytdl_hook разбирается сам
+        finally:
+            try:
+                self.client.command("hook-ack", hook_id)
+            except MpvError:
+                pass
+
+    def _apply(self, entry):
+        if entry.get("title"):
+            self.client.set_property("file-local-options/force-media-title", entry["title"])
+        ua = entry["headers"].get("User-Agent")
+        if ua:
+            self.client.set_property("file-local-options/user-agent", ua)
+        self.client.set_property("stream-open-filename", entry["url"])
+
+    def upcoming_ids(self):
+        pos = self.client.get_property("playlist-pos", -1)
+        count = self.client.get_property("playlist-count", 0)
+        if pos is None or pos < 0 or not count:
+            return []
+        ids = []
+        for i in range(1, min(self.lookahead, count - 1) + 1):
+            vid = video_id_from_url(self.client.get_property(f"playlist/{(pos + i) % count}/filename", ""))
+            if vid: ids.append(vid)
+        return ids
+
+    def prefetch_upcoming(self):
+        try:
+            self.prefetch(self.upcoming_ids())
+        except MpvError:
+            pass
+
+    def _refresh_loop(self):
+        # Подписанные ссылки протухают — периодически освежаем то, что скоро заиграет
+        while True:
+            time.sleep(60)
+            if self.client.connected.is_set():
+                self.prefetch_upcoming()
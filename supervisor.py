@@ -0,0 +1,155 @@
+import os
+import re
+import sys
+import time
+import json
+import signal
+import locale
+import argparse
+import subprocess
+from mpv_ipc import is_alive, socket_for
+from player_config import CONFIG_PATH
+
+# Несколько плееров (зон) на одной машине. Зона — секция в config.json:
+#   "instances": {"kitchen": {"audio_device": "alsa/hw:1", "playlist_url": "..."}, "bedroom": {}}
+# Каждая зона — обычный run_mpv.py --daemon со своим PLAYLIST_INSTANCE: свой сокет, tmux-сессия,
+# session/shuffle-состояние и аудиовыход. Кэши плейлистов, ссылок и треков общие.
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+RUN_MPV = os.path.join(ROOT_DIR, "run_mpv.py")
+NAME_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+CHECK_INTERVAL = 2.0
+START_GRACE = 20.0     # Столько ждем, пока только что запущенная зона поднимет сокет
+BACKOFF_MIN, BACKOFF_MAX = 2.0, 120.0
+STABLE_AFTER = 300.0   # Проработала столько без падений — задержка перезапуска снова минимальная
+
+MSG = {
+    "ru": {
+        "no_instances": "[Ошибка] В config.json нет секции \"instances\" с зонами.",
+        "bad_name": "[Ошибка] Недопустимое имя зоны: {}",
+        "started": "[Супервизор] {}: запущена.",
+        "crashed": "[Супервизор] {}: упала, перезапуск через {:.0f} с.",
+        "finished": "[Супервизор] {}: mpv завершился сам (плейлист доигран или --stop), не перезапускаем.",
+        "stopping": "[Супервизор] Останавливаем зоны..."
+    },
+    "en": {
+        "no_instances": "[Error] config.json has no \"instances\" section with zones.",
+        "bad_name": "[Error] Invalid zone name: {}",
+        "started": "[Supervisor] {}: started.",
+        "crashed": "[Supervisor] {}: crashed, restarting in {:.0f} s.",
+        "finished": "[Supervisor] {}: mpv exited normally (playlist finished or --stop), not restarting.",
+        "stopping": "[Supervisor] Stopping zones..."
+    }
+}
+
+def get_sys_lang():
+    try:
+        lang = locale.getlocale()[0][:2]
+        return lang if lang in MSG else "en"
+    except Exception:
+        return "en"
+
+LANG = get_sys_lang()
+
+def instance_names(path=CONFIG_PATH):
+    try:
+        with open(path, 'r') as f:
+            section = json.load(f).get("instances")
+    except (OSError, ValueError, AttributeError):
+        return []
+    return list(section) if isinstance(section, dict) else []
+
+class Instance:
+    """Одна зона: запуск, остановка и счетчик перезапусков с экспоненциальной задержкой"""
+
+    def __init__(self, name):
+        self.name = name
+        self.env = dict(os.environ, PLAYLIST_INSTANCE=name)
+        self.env.pop("PLAYLIST_SOCKET", None)
+        self.socket_path = socket_for(name)
+        self.exit_path = self.socket_path + "-exit" # Туда run_mpv пишет код выхода mpv
+        self.done = False
+        self.backoff = BACKOFF_MIN
+        self.started_at = 0.0
+        self.next_check = 0.0
+
+    def run_mpv(self, *args):
+        subprocess.run([sys.executable, RUN_MPV, *args], env=self.env,
+                       stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def alive(self):
+        return is_alive(self.socket_path)
+
+    def start(self):
+        self.run_mpv("--daemon")
+        self.started_at = time.time()
+        self.next_check = self.started_at + START_GRACE
+
+    def stop(self):
+        self.run_mpv("--stop")
+
+    def exit_code(self):
+        try:
+            with open(self.exit_path, 'r') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None # mpv еще жив, убит сигналом вместе с оберткой или запущен не нами
+
+class Supervisor:
+    def __init__(self, names):
+        self.instances = [Instance(n) for n in names]
+        self.stopping = False
+
+    def check(self, inst):
+        now = time.time()
+        if inst.done or now < inst.next_check:
+            return
+        if inst.alive():
+            if now - inst.started_at > STABLE_AFTER:
+                inst.backoff = BACKOFF_MIN
+            return
+        if inst.started_at and inst.exit_code() == 0:
+            # Доиграла плейлист (--idle=once, без loop) или ее остановили — это не падение
+            print(MSG[LANG]["finished"].format(inst.name), flush=True)
+            inst.done = True
+            return
+        if inst.started_at:
+            # Упала: ждем backoff, и следующая задержка вдвое больше
+            print(MSG[LANG]["crashed"].format(inst.name, inst.backoff), flush=True)
+            inst.next_check = now + inst.backoff
+            inst.backoff = min(inst.backoff * 2, BACKOFF_MAX)
+            inst.started_at = 0.0
+            return
+        inst.start()
+        print(MSG[LANG]["started"].format(inst.name), flush=True)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        signal.signal(signal.SIGINT, lambda *_: self.stop())
+        for inst in self.instances:
+            if inst.alive():
+                inst.started_at = time.time() # Зона уже играет (супервизор перезапускали) — просто следим
+        while not self.stopping and not all(inst.done for inst in self.instances):
+            for inst in self.instances:
+                if not self.stopping:
+                    self.check(inst)
+            time.sleep(CHECK_INTERVAL)
+        print(MSG[LANG]["stopping"], flush=True)
+        for inst in self.instances:
+            inst.stop()
+
+    def stop(self):
+        self.stopping = True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Playlist Player zone supervisor")
+    parser.add_argument("names", nargs="*", help="zones to run (default: all from the \"instances\" config section)")
+    args = parser.parse_args()
+    names = args.names or instance_names()
+    if not names:
+        print(MSG[LANG]["no_instances"])
+        sys.exit(1)
+    for n in names:
+        if not NAME_RE.match(n):
+            print(MSG[LANG]["bad_name"].format(n))
+            sys.exit(1)
+    Supervisor(names).run()
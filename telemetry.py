@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import threading
+from mpv_ipc import INSTANCE
+from player_config import instance_path
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICS_DIR = os.path.join(ROOT_DIR, "cache", "metrics")
+PROM_FILE = "playlist_player.prom" # Имя для textfile-коллектора node_exporter
+JSONL_FILE = "playback.jsonl"
+JSONL_MAX_BYTES = 1024 * 1024      # Дальше ротация в .1
+UNDERRUN_SECONDS = 2.0             # Меньше стольких секунд в буфере во время игры — считаем просадкой
+# Зоны пишут каждая в свой файл, но коллектор читает их вместе — метрики различаем меткой
+ZONE_LABEL = f'zone="{INSTANCE}"' if INSTANCE else ""
+
+LOAD_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16)
+STALL_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def prom_lines(self, name, label=""):
+        pre, labels = (label + ",") if label else "", f"{{{label}}}" if label else ""
+        lines = [f'{name}_bucket{{{pre}le="{b}"}} {c}' for b, c in zip(self.buckets, self.counts)]
+        lines.append(f'{name}_bucket{{{pre}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{labels} {self.sum:.3f}")
+        lines.append(f"{name}_count{labels} {self.count}")
+        return lines
+
+    def snapshot(self):
+        return {"count": self.count, "sum": round(self.sum, 3), "buckets": dict(zip(map(str, self.buckets), self.counts))}
+
+class PlaybackTelemetry:
+    """Счетчики и гистограммы качества воспроизведения по событиям mpv.
+
+    Почти все приходит через observe_property/события, опрашивается только
+    demuxer-cache-duration (он меняется постоянно), и то лишь во время игры.
+    """
+
+    def __init__(self, metrics_dir=METRICS_DIR, flush_interval=30, sample_interval=5):
+        self.metrics_dir = metrics_dir
+        self.flush_interval = flush_interval
+        self.sample_interval = sample_interval
+        self.client = None
+        self.counters = {"tracks": 0, "stalls": 0, "cache_underruns": 0, "playback_errors": 0}
+        self.gauges = {"demuxer_cache_seconds": 0.0, "cache_buffering_percent": 100, "paused": 0}
+        self.load_time = Histogram(LOAD_BUCKETS)
+        self.stall_time = Histogram(STALL_BUCKETS)
+        self._lock = threading.Lock()
+        self._load_started = None
+        self._stall_started = None
+        self._underrun = False
+        self._playing = threading.Event()
+        self._dirty = False
+
+    def attach(self, client):
+        self.client = client
+        client.on_event("start-file", self._on_start_file)
+        client.on_event("file-loaded", self._on_file_loaded)
+        client.on_event("end-file", self._on_end_file)
+        client.observe("paused-for-cache", self._on_paused_for_cache)
+        client.observe("cache-buffering-state", self._on_buffering)
+        client.observe("core-idle", self._on_core_idle)
+        threading.Thread(target=self._sample_loop, daemon=True).start()
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+        return self
+
+    # --- События ---
+
+    def _on_start_file(self, _event):
+        self._load_started = time.monotonic()
+
+    def _on_file_loaded(self, _event):
+        with self._lock:
+            self.counters["tracks"] += 1
+            if self._load_started is not None:
+                self.load_time.observe(time.monotonic() - self._load_started)
+                self._load_started = None
+            self._dirty = True
+
+    def _on_end_file(self, event):
+        if event.get("reason") != "error":
+            return
+        with self._lock:
+            self.counters["playback_errors"] += 1
+            self._dirty = True
+        self._log({"event": "error", "detail": event.get("file_error", "")})
+
+    def _on_paused_for_cache(self, _name, stalled):
+        with self._lock:
+            if stalled and self._stall_started is None:
+                self._stall_started = time.monotonic()
+                self.counters["stalls"] += 1
+            elif not stalled and self._stall_started is not None:
+                duration = time.monotonic() - self._stall_started
+                self.stall_time.observe(duration)
+                self._stall_started = None
+                self._log({"event": "stall", "seconds": round(duration, 3)})
+            self._dirty = True
+
+    def _on_buffering(self, _name, value):
+        with self._lock:
+            self.gauges["cache_buffering_percent"] = value if value is not None else 100
+            self._dirty = True
+
+    def _on_core_idle(self, _name, idle):
+        self.gauges["paused"] = 1 if idle else 0
+        if idle: self._playing.clear()
+        else: self._playing.set()
+
+    def _sample_loop(self):
+        # На паузе и без mpv поток просто спит на Event, ничего не опрашивая
+        while True:
+            self._playing.wait()
+            time.sleep(self.sample_interval)
+            if not self.client.connected.is_set():
+                self._playing.clear()
+                continue
+            cached = self.client.get_property("demuxer-cache-duration")
+            if cached is None:
+                continue
+            with self._lock:
+                self.gauges["demuxer_cache_seconds"] = cached
+                self._dirty = True
+                low = cached < UNDERRUN_SECONDS
+                if low and not self._underrun:
+                    self.counters["cache_underruns"] += 1
+                self._underrun = low
+
+    # --- Выгрузка ---
+
+    def snapshot(self):
+        with self._lock:
+            return {"ts": time.time(), "counters": dict(self.counters), "gauges": dict(self.gauges),
+                    "track_load_seconds": self.load_time.snapshot(), "stall_seconds": self.stall_time.snapshot()}
+
+    def prom_text(self):
+        labels = f"{{{ZONE_LABEL}}}" if ZONE_LABEL else ""
+        with self._lock:
+            lines = []
+            for name, value in self.counters.items():
+                lines += [f"# TYPE playlist_player_{name}_total counter", f"playlist_player_{name}_total{labels} {value}"]
+            for name, value in self.gauges.items():
+                lines += [f"# TYPE playlist_player_{name} gauge", f"playlist_player_{name}{labels} {value}"]
+            for name, hist in (("track_load_seconds", self.load_time), ("stall_seconds", self.stall_time)):
+                lines.append(f"# TYPE playlist_player_{name} histogram")
+                lines += hist.prom_lines(f"playlist_player_{name}", ZONE_LABEL)
+            return "\n".join(lines) + "\n"
+
+    def _log(self, record):
+        record.setdefault("ts", time.time())
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        path = instance_path(os.path.join(self.metrics_dir, JSONL_FILE))
+        try:
+            if os.path.exists(path) and os.path.getsize(path) > JSONL_MAX_BYTES:
+                os.replace(path, path + ".1")
+            with open(path, 'a') as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError:
+            pass
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return # Ничего не поменялось — диск не трогаем
+            self._dirty = False
+        self._log(dict(self.snapshot(), event="snapshot"))
+        path = instance_path(os.path.join(self.metrics_dir, PROM_FILE))
+        try:
+            with open(path + ".tmp", 'w') as f:
+                f.write(self.prom_text())
+            os.replace(path + ".tmp", path) # node_exporter не должен увидеть файл наполовину
+        except OSError:
+            pass
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
@@ -0,0 +1,249 @@
+import os
+import sys
+import mmap
+import time
+import errno
+import select
+import signal
+import struct
+import shutil
+import threading
+import subprocess
+from mpv_ipc import SOCKET_PATH
+
+try:
+    import numpy as np
+except ImportError:
+    np = None # Без numpy остается cava
+
+# mpv отдает копию звука через alsa-lib плагин tee в FIFO, фоновый процесс перекладывает ее
+# в кольцевой буфер в памяти, а панель визуализатора читает оттуда последние N сэмплов.
+PCM_FIFO = SOCKET_PATH + "-pcm.fifo"
+PCM_RING = SOCKET_PATH + "-pcm.ring"
+RATE = 48000
+CHANNELS = 2
+FRAME_BYTES = 2 * CHANNELS   # s16le
+RING_BYTES = 1 << 16         # ~0.34 с звука, визуализатору больше не надо
+HEADER = struct.Struct("<Q") # Сколько байт записано всего (позиция записи)
+
+FFT_SIZE = 2048
+MIN_HZ, MAX_HZ = 50, 16000
+DEFAULT_FPS = 30
+DECAY = 0.85                 # Насколько плавно падают столбики
+RANGE_DB = 60                # Динамический диапазон под автоусилением
+VISIBILITY_CHECK = 2.0       # Как часто спрашиваем tmux, видно ли панель
+EIGHTHS = " ▁▂▃▄▅▆▇█"
+
+def available():
+    return np is not None
+
+def mpv_pcm_args(device="default"):
+    """Звук идет как обычно в ALSA-устройство, плюс сырая копия в FIFO. Формат фиксируем, чтобы читать без заголовков."""
+    # Имя устройства в кавычках: в "hw:1,0" запятая иначе разрежет аргументы плагина tee
+    return ["--ao=alsa", f"--audio-device=alsa/tee:'{device}','{PCM_FIFO}',raw",
+            "--audio-format=s16", f"--audio-samplerate={RATE}", "--audio-channels=stereo"]
+
+def ensure_fifo():
+    try:
+        os.mkfifo(PCM_FIFO, 0o600)
+    except FileExistsError:
+        pass
+
+class PcmTap:
+    """Живет в фоновом процессе рядом с mpv: все время вычитывает FIFO, чтобы mpv никогда
+    не блокировался на записи, даже если панель визуализатора закрыта."""
+
+    def __init__(self, fifo_path=PCM_FIFO, ring_path=PCM_RING):
+        self.fifo_path = fifo_path
+        self.ring_path = ring_path
+
+    def start(self):
+        ensure_fifo()
+        with open(self.ring_path, 'wb') as f:
+            f.truncate(HEADER.size + RING_BYTES)
+        threading.Thread(target=self._loop, daemon=True).start()
+        return self
+
+    def _loop(self):
+        rfd = os.open(self.fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+        # Свой писатель держит FIFO открытой: между треками mpv закрывает устройство, и без него read отдавал бы EOF в цикле
+        wfd = os.open(self.fifo_path, os.O_WRONLY)
+        fd = os.open(self.ring_path, os.O_RDWR)
+        ring = mmap.mmap(fd, HEADER.size + RING_BYTES)
+        os.close(fd)
+        pos = 0
+        try:
+            while True:
+                select.select([rfd], [], [])
+                try:
+                    chunk = os.read(rfd, 16384)
+                except OSError as e:
+                    if e.errno == errno.EAGAIN:
+                        continue
+                    raise
+                off = pos % RING_BYTES
+                first = min(len(chunk), RING_BYTES - off)
+                ring[HEADER.size + off:HEADER.size + off + first] = chunk[:first]
+                if first < len(chunk):
+                    ring[HEADER.size:HEADER.size + len(chunk) - first] = chunk[first:]
+                pos += len(chunk)
+                ring[:HEADER.size] = HEADER.pack(pos)
+        finally:
+            ring.close(); os.close(rfd); os.close(wfd)
+
+class SpectrumView:
+    """Столбики спектра в панели tmux на ANSI-кодах: перерисовываются только изменившиеся клетки"""
+
+    def __init__(self, ring_path=PCM_RING, fps=DEFAULT_FPS):
+        self.ring_path = ring_path
+        self.frame_time = 1.0 / max(1, fps)
+        self.ring = None
+        # Буферы под FFT выделяются один раз
+        self.window = np.hanning(FFT_SIZE).astype(np.float32)
+        self.raw = np.zeros(FFT_SIZE * CHANNELS, dtype=np.int16)
+        self.mono = np.zeros(FFT_SIZE, dtype=np.float32)
+        self.mag = np.zeros(FFT_SIZE // 2 + 1, dtype=np.float32)
+        self.spec = np.zeros(FFT_SIZE // 2 + 1, dtype=np.complex64)
+        try:
+            np.fft.rfft(self.mono, out=self.spec)
+            self.rfft_out = True
+        except (TypeError, ValueError):
+            # numpy < 2: out у fft нет, спектр — новый массив на 16 КБ за кадр; на 30 fps это мелочь рядом с самим FFT
+            self.rfft_out = False
+        self.size = None
+        self.edges = None
+        self.levels = None
+        self.cells = None # Высота каждого столбика на экране (в восьмушках клетки)
+        self.peak = 1e-3
+        self.last_pos = 0
+        self.resized = True
+        self.visible = True
+        self.visible_checked = 0.0
+
+    # --- Данные ---
+
+    def _open_ring(self):
+        try:
+            fd = os.open(self.ring_path, os.O_RDONLY)
+        except OSError:
+            return False
+        try:
+            self.ring = mmap.mmap(fd, HEADER.size + RING_BYTES, prot=mmap.PROT_READ)
+        except (OSError, ValueError):
+            return False
+        finally:
+            os.close(fd)
+        return True
+
+    def _read_pcm(self):
+        """Копирует последние FFT_SIZE кадров в self.raw. False — нового звука нет (пауза)."""
+        if self.ring is None and not self._open_ring():
+            return False
+        pos = HEADER.unpack_from(self.ring, 0)[0]
+        if pos == self.last_pos:
+            return False
+        self.last_pos = pos
+        need = FFT_SIZE * FRAME_BYTES
+        end = (pos - pos % FRAME_BYTES) % RING_BYTES
+        start = (end - need) % RING_BYTES
+        dst = self.raw.view(np.uint8)
+        base = HEADER.size
+        if start < end:
+            dst[:] = np.frombuffer(self.ring, np.uint8, need, base + start)
+        else:
+            head = RING_BYTES - start
+            dst[:head] = np.frombuffer(self.ring, np.uint8, head, base + start)
+            dst[head:] = np.frombuffer(self.ring, np.uint8, need - head, base)
+        return True
+
+    def _layout(self, width, height):
+        bars = max(1, width // 2)
+        lo = int(MIN_HZ * FFT_SIZE / RATE) + 1
+        hi = min(int(MAX_HZ * FFT_SIZE / RATE), FFT_SIZE // 2)
+        self.edges = np.unique(np.geomspace(lo, hi, bars + 1).astype(np.int64))
+        n = len(self.edges) - 1
+        self.levels = np.zeros(n, dtype=np.float32)
+        self.cells = np.zeros(n, dtype=np.int64)
+        self.size = (width, height)
+
+    def _analyze(self, fresh):
+        if fresh:
+            frames = self.raw.reshape(FFT_SIZE, CHANNELS)
+            np.mean(frames, axis=1, out=self.mono)
+            np.multiply(self.mono, self.window, out=self.mono)
+            spec = np.fft.rfft(self.mono, out=self.spec) if self.rfft_out else np.fft.rfft(self.mono)
+            np.abs(spec, out=self.mag)
+            bands = np.maximum.reduceat(self.mag[:self.edges[-1]], self.edges[:-1])
+            # Автоусиление: шкала от текущего пика, пик медленно отпускаем
+            self.peak = max(float(bands.max()), self.peak * 0.995, 1e-3)
+            db = 20 * np.log10(np.maximum(bands / self.peak, 1e-9))
+            target = np.clip(1 + db / RANGE_DB, 0, 1)
+            np.maximum(target, self.levels * DECAY, out=self.levels)
+        else:
+            self.levels *= DECAY # На паузе столбики просто опадают
+
+    # --- Экран ---
+
+    def _check_visible(self):
+        """Панель видна, только если к сессии кто-то подключен и ее окно активно"""
+        now = time.monotonic()
+        if now - self.visible_checked < VISIBILITY_CHECK or "TMUX" not in os.environ:
+            return self.visible
+        self.visible_checked = now
+        try:
+            out = subprocess.run(["tmux", "display-message", "-p", "-t", os.environ.get("TMUX_PANE", ""),
+                                  "#{session_attached} #{window_active}"], capture_output=True, text=True).stdout.split()
+            visible = len(out) == 2 and out[0] != "0" and out[1] == "1"
+        except OSError:
+            visible = True
+        if visible and not self.visible:
+            self.resized = True # Пока нас не было видно, экран мог поменяться
+        self.visible = visible
+        return visible
+
+    def _draw(self, out):
+        width, height = shutil.get_terminal_size()
+        if self.resized or self.size != (width, height):
+            self._layout(width, height)
+            self.resized = False
+            out.write("\x1b[2J\x1b[36m")
+        new = (self.levels * height * 8).astype(np.int64)
+        parts = []
+        for i in np.nonzero(new != self.cells)[0]:
+            old, cur = int(self.cells[i]), int(new[i])
+            x = i * 2 + 1
+            # Переписываем только строки между старой и новой верхушкой столбика
+            for row in range(min(old, cur) // 8, min(max(old, cur) // 8, height - 1) + 1):
+                fill = cur - row * 8
+                ch = EIGHTHS[8] if fill >= 8 else EIGHTHS[max(fill, 0)]
+                parts.append(f"\x1b[{height - row};{x}H{ch}")
+        self.cells = new
+        if parts:
+            out.write("".join(parts))
+            out.flush()
+
+    def _on_resize(self, _sig, _frame):
+        self.resized = True
+
+    def run(self):
+        out = sys.stdout
+        signal.signal(signal.SIGWINCH, self._on_resize)
+        out.write("\x1b[?25l")
+        try:
+            while True:
+                started = time.monotonic()
+                if not self._check_visible():
+                    time.sleep(0.5) # Панель не видно — ни FFT, ни отрисовки
+                    continue
+                fresh = self._read_pcm()
+                if self.size is not None:
+                    self._analyze(fresh)
+                self._draw(out)
+                if not fresh and not self.cells.any():
+                    time.sleep(0.25) # Тишина и все столбики уже лежат — просыпаемся реже
+                time.sleep(max(0.0, self.frame_time - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            out.write("\x1b[0m\x1b[?25h")
+            out.flush()
@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import signal
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+from mpv_ipc import MpvError, INSTANCE
+from playlist_cache import video_id_from_url
+from telemetry import METRICS_DIR
+
+RECOVERY_FILE = "recoveries.jsonl"
+CHECK_INTERVAL = 2.0
+STALL_AFTER = 15.0       # time-pos стоит на месте столько секунд во время игры — трек завис
+BUFFERING_AFTER = 30.0   # Столько секунд в paused-for-cache — поток не идет
+LOAD_AFTER = 45.0        # start-file без file-loaded дольше этого — застряли на открытии
+UNRESPONSIVE_POLLS = 3   # Столько опросов подряд без ответа по IPC — mpv повис целиком
+GONE_AFTER = 5.0         # Соединение пропало без shutdown — mpv упал (или убили его панель tmux)
+ACTION_GRACE = 15.0      # Сколько ждем после шага, прежде чем переходить к следующему
+MAX_RESTARTS, RESTART_WINDOW = 3, 600 # Больше перезапусков за окно — не крутимся в петле, сдаемся
+ACTIONS = ["reresolve", "skip", "restart"]
+
+class PlaybackWatchdog:
+    """Следит, что звук идет: time-pos растет, а paused-for-cache не затянулся.
+    Если встали — по шагам: переоткрыть трек с новой ссылкой, пропустить его, перезапустить mpv
+    с места остановки. Каждый случай пишется в recoveries.jsonl с временем восстановления."""
+
+    def __init__(self, resolver, restart, metrics_dir=METRICS_DIR):
+        self.resolver = resolver
+        self.restart = restart  # restart(pid, headless) — убить mpv, если он жив, и запустить заново с места остановки
+        self.metrics_dir = metrics_dir
+        self.client = None
+        self._lock = threading.Lock()
+        self.pid = None
+        self.seen = False       # mpv хоть раз был на связи
+        self.headless = True    # mpv без терминала (--daemon) или в панели tmux
+        self.shutdown = False   # mpv закрылся сам (q, --stop, конец плейлиста) — это не сбой
+        self.loading_since = None
+        self.progress_at = time.monotonic()
+        self.last_time = None
+        self.video_id = None
+        self.gone_since = None
+        self.unanswered = 0
+        self.seek_to = None     # Куда встать после переоткрытия трека
+        self.incident = None    # {"reason", "started", "video_id", "actions", "next_at"}
+        self.restarts = []
+        # Среднее время восстановления — по всему журналу зоны, а не с последнего перерождения процесса
+        self.recoveries, self.mttr_total = self._load_totals()
+
+    def attach(self, client):
+        self.client = client
+        client.on_connect(self._on_connect)
+        client.on_event("start-file", self._on_start_file)
+        client.on_event("file-loaded", self._on_file_loaded)
+        client.on_event("shutdown", self._on_shutdown)
+        threading.Thread(target=self._loop, daemon=True).start()
+        return self
+
+    # --- События ---
+
+    def _on_connect(self):
+        opening = self.client.get_property("time-pos") is None and not self.client.get_property("idle-active", True)
+        with self._lock:
+            self.shutdown = False
+            self.seen = True
+            self.gone_since = None
+            self.unanswered = 0
+            self.progress_at = time.monotonic()
+            # mpv мог начать открывать трек еще до нашего подключения — start-file мы тогда не видели
+            self.loading_since = self.progress_at if opening else None
+        self.pid = self.client.get_property("pid")
+        self.headless = not self.client.get_property("options/terminal", False)
+
+    def _on_start_file(self, _event):
+        with self._lock:
+            self.loading_since = time.monotonic()
+
+    def _on_file_loaded(self, _event):
+        with self._lock:
+            self.loading_since = None
+            self.progress_at = time.monotonic()
+            seek, self.seek_to = self.seek_to, None
+        if seek:
+            try:
+                self.client.command("seek", seek, "absolute")
+            except MpvError:
+                pass
+
+    def _on_shutdown(self, _event):
+        with self._lock:
+            self.shutdown = True
+
+    # --- Проверка ---
+
+    def _loop(self):
+        while True:
+            time.sleep(CHECK_INTERVAL)
+            try:
+                self.check()
+            except Exception:
+                pass # Сторож не должен падать сам
+
+    def _poll(self):
+        """(time-pos, pause, paused-for-cache, idle-active, path) одним кругом IPC; mpv молчит — TimeoutError"""
+        names = ["time-pos", "pause", "paused-for-cache", "idle-active", "path"]
+        futures = [self.client.command_async("get_property", n) for n in names]
+        values = []
+        for fut in futures:
+            try:
+                values.append(fut.result(5))
+            except MpvError:
+                values.append(None) # Свойства нет (например, time-pos между треками)
+        return values
+
+    def check(self):
+        now = time.monotonic()
+        if not self.client.connected.is_set():
+            with self._lock:
+                if self.shutdown or not self.seen:
+                    return # Сам закрылся или еще не стартовал — это не наше дело
+                self.gone_since = self.gone_since or now
+                gone = now - self.gone_since
+            if gone > GONE_AFTER:
+                self._stalled("gone", now, first="restart")
+            return
+        try:
+            t, paused, buffering, idle, path = self._poll()
+            self.unanswered = 0
+        except (FutureTimeout, OSError):
+            self.unanswered += 1
+            if self.unanswered >= UNRESPONSIVE_POLLS:
+                self._stalled("unresponsive", now, first="restart")
+            return
+        with self._lock:
+            moved = t is not None and t != self.last_time
+            if moved or paused or idle or (self.loading_since is None and t is None):
+                # Играет, на паузе у пользователя или ничего не открыто — все в порядке
+                self.progress_at = now
+            if t is not None:
+                self.last_time = t
+                self.video_id = video_id_from_url(path or "")
+            loading = self.loading_since
+        if moved and self.incident:
+            self._recovered(now)
+            return
+        if loading is not None and now - loading > LOAD_AFTER:
+            self._stalled("load", now)
+        elif buffering and now - self.progress_at > BUFFERING_AFTER:
+            self._stalled("buffering", now)
+        elif not buffering and now - self.progress_at > STALL_AFTER:
+            self._stalled("frozen", now)
+
+    # --- Восстановление ---
+
+    def _stalled(self, reason, now, first=None):
+        inc = self.incident
+        if inc is None:
+            inc = self.incident = {"reason": reason, "started": now, "wall": time.time(), "video_id": self.video_id,
+                                   "time": self.last_time, "actions": [], "next_at": now}
+        if now < inc["next_at"]:
+            return
+        step = min(len(inc["actions"]), len(ACTIONS) - 1) # Последний шаг (перезапуск) повторяем
+        if first:
+            step = max(step, ACTIONS.index(first)) # mpv нет или он не отвечает — переоткрывать трек некому
+        action = ACTIONS[step]
+        if action == "restart" and not self._may_restart(now):
+            if not inc.get("gave_up"):
+                inc["gave_up"] = True
+                self._log(dict(self._record(inc, now), event="gave_up"))
+            return
+        inc["actions"].append(action)
+        inc["next_at"] = now + ACTION_GRACE
+        with self._lock:
+            self.progress_at = now # Отсчет следующего шага — с этого момента
+        try:
+            getattr(self, "_" + action)()
+        except (MpvError, OSError):
+            pass # Не вышло — через ACTION_GRACE попробуем следующий шаг
+
+    def _may_restart(self, now):
+        self.restarts = [t for t in self.restarts if now - t < RESTART_WINDOW]
+        if len(self.restarts) >= MAX_RESTARTS:
+            return False
+        self.restarts.append(now)
+        return True
+
+    def _reresolve(self):
+        """Ссылка могла протухнуть или сервер перестал отдавать поток — резолвим заново и встаем на то же место"""
+        if self.video_id:
+            self.resolver.invalidate(self.video_id)
+        self.seek_to = self.last_time
+        self.client.command("playlist-play-index", "current")
+
+    def _skip(self):
+        self.seek_to = None
+        self.client.command("playlist-next", "force")
+
+    def _restart(self):
+        with self._lock:
+            self.gone_since = None # Не поднимется за ACTION_GRACE — следующий перезапуск
+        pid, self.pid = self.pid, None
+        self.restart(pid, self.headless)
+
+    def _recovered(self, now):
+        inc, self.incident = self.incident, None
+        seconds = now - inc["started"]
+        self.recoveries += 1
+        self.mttr_total += seconds
+        self._log(dict(self._record(inc, now), event="recovered"))
+
+    def _record(self, inc, now):
+        return {"ts": inc["wall"], "instance": INSTANCE, "reason": inc["reason"], "video_id": inc["video_id"], "time": inc["time"],
+                "actions": inc["actions"], "seconds": round(now - inc["started"], 3),
+                "mttr_mean": round(self.mttr_total / self.recoveries, 3) if self.recoveries else None}
+
+    def _load_totals(self):
+        count, total = 0, 0.0
+        try:
+            with open(os.path.join(self.metrics_dir, RECOVERY_FILE), 'r') as f:
+                for line in f:
+                    try:
+                        r = json.loads(line)
+                    except ValueError:
+                        continue
+                    if r.get("event") == "recovered" and r.get("instance", "") == INSTANCE:
+                        count, total = count + 1, total + (r.get("seconds") or 0.0)
+        except OSError:
+            pass
+        return count, total
+
+    def _log(self, record):
+        try:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            with open(os.path.join(self.metrics_dir, RECOVERY_FILE), 'a') as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError:
+            pass
+
+def kill_mpv(pid):
+    """Повисший mpv quit по IPC не услышит — только сигнал"""
+    if not pid:
+        return
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except OSError:
+        pass